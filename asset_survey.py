@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asset Survey
+Đọc nhanh header của hàng nghìn file .uasset (vài KB mỗi file) và lưu chỉ mục SQLite để chọn file có text trước khi extract
+"""
+
+import os
+import re
+import sqlite3
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from uasset_text_extractor import SIZE_FIELD_OFFSET, expected_size_field, iter_text_entries
+
+INDEX_FILE = "asset_index.sqlite"
+PROBE_BYTES = 4096  # Số byte đọc ngay sau size_offset_position để dò bảng text
+PROBE_ENTRIES = 16  # Đủ từng này entry thì dừng dò
+TAIL_MAGIC = bytes([0xC1, 0x83, 0x2A, 0x9E])
+
+COLUMNS = ('path', 'size', 'mtime_ns', 'size_offset_position', 'size_field', 'size_field_ok', 'tail_magic',
+           'probe_entries', 'utf16_entries', 'first_entry_position', 'first_text', 'signature', 'error', 'surveyed_at')
+
+def read_at(fd: int, size: int, offset: int) -> bytes:
+    """Đọc size byte tại offset mà không đọc cả file (pread; seek + read nếu hệ điều hành không có pread)"""
+    if hasattr(os, 'pread'):
+        return os.pread(fd, size, offset)
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+def survey_asset(path: str, probe_bytes: int = PROBE_BYTES) -> Dict:
+    """
+    Đọc header, trường kích thước, 4 byte cuối và đoạn đầu bảng text của một file
+
+    Returns:
+        Dict: một dòng của chỉ mục (xem COLUMNS)
+    """
+    record = {column: None for column in COLUMNS}
+    record.update({'path': path, 'probe_entries': 0, 'utf16_entries': 0, 'surveyed_at': time.time()})
+    try:
+        fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            stat = os.fstat(fd)
+            record['size'], record['mtime_ns'] = stat.st_size, stat.st_mtime_ns
+            header = read_at(fd, 0x24, 0)
+            size_offset_position = struct.unpack_from('<I', header, 0x20)[0] if len(header) >= 0x24 else 0
+            valid = 0 < size_offset_position < stat.st_size
+            probe_start = size_offset_position if valid else 0
+            probe = read_at(fd, probe_bytes, probe_start)
+            tail = read_at(fd, 4, stat.st_size - 4) if stat.st_size >= 4 else b''
+        finally:
+            os.close(fd)
+    except OSError as e:
+        record['error'] = str(e)
+        return record
+
+    record['tail_magic'] = tail == TAIL_MAGIC
+    if valid:
+        record['size_offset_position'] = size_offset_position
+        if len(probe) >= SIZE_FIELD_OFFSET + 4:
+            # Trường kích thước tại size_offset_position + 8, nằm trong đoạn vừa đọc
+            record['size_field'] = struct.unpack_from('<I', probe, SIZE_FIELD_OFFSET)[0]
+            record['size_field_ok'] = record['size_field'] == expected_size_field(
+                stat.st_size, size_offset_position + SIZE_FIELD_OFFSET)
+
+    entries = list(islice(iter_text_entries(probe), PROBE_ENTRIES))
+    record['probe_entries'] = len(entries)
+    record['utf16_entries'] = sum(1 for entry in entries if entry['key'].startswith('utf16'))
+    if entries:
+        record['first_entry_position'] = probe_start + entries[0]['position']
+        record['first_text'] = entries[0]['original_text'][:80]
+        # Dấu hiệu bảng text: số entry utf8/utf16 trong đoạn dò và khoảng cách từ đầu vùng tới entry đầu tiên
+        record['signature'] = (f"utf8:{len(entries) - record['utf16_entries']}/utf16:{record['utf16_entries']}"
+                               f"@+{entries[0]['position']}")
+    return record
+
+def find_survey_paths(source: str, root: str = None) -> Tuple[List[str], int]:
+    """
+    Danh sách file .uasset từ một thư mục (duyệt cả cây) hoặc file danh sách
+
+    File danh sách có thể là output của `UnrealPak -List` (đường dẫn trong ngoặc kép) hoặc mỗi dòng một đường dẫn;
+    đường dẫn tương đối được tính từ root (mặc định thư mục chứa file danh sách), tức thư mục đã giải nén pak.
+
+    Returns:
+        tuple: (các file tồn tại, số file trong danh sách không tìm thấy)
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(folder, name) for folder, _, names in os.walk(source)
+                 for name in names if name.endswith('.uasset')]
+        return sorted(paths), 0
+
+    root = root if root is not None else os.path.dirname(source)
+    paths, missing = [], 0
+    with open(source, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            quoted = re.search(r'"([^"]+\.uasset)"', line)
+            path = quoted.group(1) if quoted else line.strip()
+            if not path.endswith('.uasset'):
+                continue
+            # Bỏ mount point kiểu ../../../ của pak, còn lại tính từ root
+            path = re.sub(r'^(\.\./)+', '', path.replace('\\', '/')).lstrip('/')
+            path = os.path.normpath(os.path.join(root, path))
+            if os.path.isfile(path):
+                paths.append(path)
+            else:
+                missing += 1
+    return paths, missing
+
+class AssetIndex:
+    def __init__(self, index_path: str = INDEX_FILE):
+        """Chỉ mục SQLite của các file đã survey, mỗi file một dòng theo đường dẫn"""
+        self.index_path = index_path
+        self.connection = sqlite3.connect(index_path)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS assets (
+                path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, size_offset_position INTEGER,
+                size_field INTEGER, size_field_ok INTEGER, tail_magic INTEGER, probe_entries INTEGER,
+                utf16_entries INTEGER, first_entry_position INTEGER, first_text TEXT, signature TEXT,
+                error TEXT, surveyed_at REAL)""")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS assets_probe ON assets (probe_entries)")
+
+    def stamps(self) -> Dict[str, Tuple[int, int]]:
+        """path -> (size, mtime_ns) của các dòng đã có, để bỏ qua file không đổi"""
+        return {path: (size, mtime_ns) for path, size, mtime_ns
+                in self.connection.execute("SELECT path, size, mtime_ns FROM assets WHERE error IS NULL")}
+
+    def upsert(self, records: List[Dict]):
+        placeholders = ', '.join('?' for _ in COLUMNS)
+        with self.connection:
+            self.connection.executemany(f"INSERT OR REPLACE INTO assets ({', '.join(COLUMNS)}) VALUES ({placeholders})",
+                                        [tuple(record[column] for column in COLUMNS) for record in records])
+
+    def text_assets(self, min_entries: int = 1) -> List[str]:
+        """Các file có ít nhất min_entries text entry trong đoạn dò, nhiều entry trước"""
+        rows = self.connection.execute("SELECT path FROM assets WHERE probe_entries >= ? "
+                                       "ORDER BY probe_entries DESC, path", (min_entries,))
+        return [path for path, in rows]
+
+    def close(self):
+        self.connection.close()
+
+def survey(source: str, index_path: str = INDEX_FILE, workers: int = 16, probe_bytes: int = PROBE_BYTES,
+           root: str = None, force: bool = False) -> Dict:
+    """
+    Survey mọi file .uasset trong source (thư mục hoặc file danh sách) và cập nhật chỉ mục
+
+    File đã có trong chỉ mục với cùng kích thước và mtime được bỏ qua (trừ khi force). Việc đọc file
+    chạy trên thread pool, chỉ thread chính ghi SQLite.
+
+    Returns:
+        Dict: thống kê (files, surveyed, reused, missing, with_text, errors, seconds)
+    """
+    started = time.perf_counter()
+    paths, missing = find_survey_paths(source, root)
+    index = AssetIndex(index_path)
+    known = {} if force else index.stamps()
+
+    def work(path: str) -> Optional[Dict]:
+        try:
+            stat = os.stat(path)
+            if known.get(path) == (stat.st_size, stat.st_mtime_ns):
+                return None
+        except OSError:
+            pass
+        return survey_asset(path, probe_bytes)
+
+    surveyed = []
+    reused = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for i, record in enumerate(pool.map(work, paths), 1):
+                if record is None:
+                    reused += 1
+                    continue
+                surveyed.append(record)
+                if len(surveyed) % 500 == 0:
+                    index.upsert(surveyed[-500:])
+                    print(f"  🔎 {i}/{len(paths)} file")
+        index.upsert(surveyed[len(surveyed) // 500 * 500:])
+        with_text = index.connection.execute("SELECT COUNT(*) FROM assets WHERE probe_entries > 0").fetchone()[0]
+    finally:
+        index.close()
+
+    return {
+        'files': len(paths),
+        'surveyed': len(surveyed),
+        'reused': reused,
+        'missing': missing,
+        'with_text': with_text,
+        'errors': [record for record in surveyed if record['error']],
+        'seconds': time.perf_counter() - started
+    }
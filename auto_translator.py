@@ -6,58 +6,332 @@ Tự động dịch các file JSON đã extract sang tiếng Việt
 """
 
 import os
+import re
 import json
 import time
+import hashlib
 import argparse
-from typing import Dict, List, Optional
-import google.generativeai as genai
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from typing import Callable, Dict, List, Optional
 from datetime import datetime
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-    print("⚠️ OpenAI library không có. Cài đặt: pip install openai")
+from glossary_matcher import GlossaryMatcher
+from metrics import MetricsExporter, MetricsRegistry
+from rate_controller import AIMDRateLimiter, RateController
+from translation_scheduler import PRIORITY_MODES, TranslationBudget, prioritize_texts
+from uasset_text_extractor import UAssetTextExtractor, find_uasset_files
+# SDK của các AI engine chỉ được import bên trong engine khi thực sự gọi API lần đầu
+from translation_engines import (ENGINES, ERROR_RATE_LIMIT, TranslationEngine, create_engine, estimate_tokens,
+                                 get_engine_class)
+
+# Các phần không cần dịch: command tags <...>, tags [...] và số đứng riêng
+TEMPLATE_VALUE_PATTERN = re.compile(r'<[^<>]+>|\[[^\[\]]*\]|(?<![\w.,])\d+(?:[.,]\d+)*(?![\w])')
+PLACEHOLDER_PATTERN = re.compile(r'\{(\d+)\}')
+# Tags được che trước khi gửi cho AI và khôi phục nguyên vẹn sau khi dịch
+MASKABLE_TAG_PATTERN = re.compile(r'<[^<>]+>|\[[^\[\]]*\]')
+CMD_TAG_PATTERN = re.compile(r'<CMD_[^>]+>')
+# Số lần dịch lại khi bản dịch làm mất/thừa placeholder
+TAG_MISMATCH_RETRIES = 2
+
+# Thông số mặc định để ước tính chi phí/thời gian (action 'plan')
+COMPLETION_TOKEN_RATIO = 1.5  # Bản dịch tiếng Việt thường dài hơn text gốc khi tính token
+
+# Gom hàng đa ngôn ngữ (--group-rows): mỗi hàng của bảng text lưu liền nhau các biến thể
+# JA, EN, FR, IT, DE, ES, ZH, ZH, KO; khối châu Âu đủ 5 biến thể thì biến thể đầu là tiếng Anh
+ROW_VARIANT_COUNT = 5
+ROW_MAX_GAP = 0  # Số byte tối đa giữa hai biến thể của cùng một hàng
+CJK_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]')
+
+# Hedged request: số mẫu độ trễ tối thiểu trước khi dùng percentile làm thời điểm gửi hedge
+HEDGE_MIN_SAMPLES = 20
+HEDGE_DEFAULT_DELAY = 2.0  # Giây, dùng khi chưa đủ mẫu và không chỉ định hedge_after
+HEDGE_MAX_FRACTION = 0.1  # Số hedge tối đa so với số request chính
+
+# Trạng thái dịch lưu trong từng entry để chạy lại không gửi lại entry đã xong
+TRANSLATION_STATE_KEY = 'translation_state'
+
+# Ghi tiến trình (resume sau khi chương trình bị dừng giữa chừng)
+CHECKPOINT_INTERVAL_SECONDS = 5  # Chu kỳ ghi file output tạm và fsync journal
+
+class TranslationError(Exception):
+    """AI engine không dịch được text (lỗi API, hết lượt thử hoặc placeholder sai)"""
+
+class BudgetExhaustedError(TranslationError):
+    """Hết ngân sách (TranslationBudget) trước khi gửi request: text được để lại cho lần chạy sau"""
+
+def write_json_atomic(path: str, data) -> int:
+    """
+    Ghi JSON ra file tạm rồi đổi tên, file đích không bao giờ bị ghi dở
+    
+    Returns:
+        Số byte đã ghi
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+        size = f.tell()
+    os.replace(temp_path, path)
+    return size
+
+def make_template(text: str) -> tuple[str, List[str]]:
+    """
+    Chuẩn hóa text thành template: thay số, [TAG] và <CMD_...> bằng placeholder {0}, {1}...
+    
+    Returns:
+        tuple: (template, values) - values là các giá trị gốc theo thứ tự placeholder.
+               Text đã có sẵn dấu { } được giữ nguyên (values rỗng) để tránh nhầm placeholder.
+    """
+    if '{' in text or '}' in text:
+        return text, []
+    
+    values = []
+    
+    def to_placeholder(match):
+        values.append(match.group(0))
+        return '{%d}' % (len(values) - 1)
+    
+    return TEMPLATE_VALUE_PATTERN.sub(to_placeholder, text), values
+
+def fill_template(template_translation: str, values: List[str]) -> Optional[str]:
+    """
+    Thay placeholder trong bản dịch template bằng các giá trị gốc
+    
+    Returns:
+        Bản dịch hoàn chỉnh, hoặc None nếu bản dịch không chứa đúng bộ placeholder
+    """
+    found = sorted(int(i) for i in PLACEHOLDER_PATTERN.findall(template_translation))
+    if found != list(range(len(values))):
+        return None
+    return PLACEHOLDER_PATTERN.sub(lambda m: values[int(m.group(1))], template_translation)
+
+def mask_tags(text: str) -> tuple[str, List[str]]:
+    """
+    Thay mọi tag [...] và <...> bằng placeholder {n} ngắn trước khi gửi cho AI
+    
+    Placeholder được đánh số tiếp sau các placeholder đã có sẵn trong text (ví dụ template).
+    
+    Returns:
+        tuple: (masked_text, tags) - tags[i] là tag gốc của placeholder {offset + i}
+    """
+    existing = [int(i) for i in PLACEHOLDER_PATTERN.findall(text)]
+    offset = max(existing) + 1 if existing else 0
+    tags = []
+    
+    def to_placeholder(match):
+        tags.append(match.group(0))
+        return '{%d}' % (offset + len(tags) - 1)
+    
+    return MASKABLE_TAG_PATTERN.sub(to_placeholder, text), tags
+
+def restore_tags(translation: str, masked_text: str, tags: List[str]) -> Optional[str]:
+    """
+    Khôi phục tags đã che trong bản dịch
+    
+    Returns:
+        Bản dịch với tags gốc, hoặc None nếu bộ placeholder trong bản dịch
+        không khớp chính xác với text đã gửi (thiếu, thừa hoặc bị sửa)
+    """
+    expected = PLACEHOLDER_PATTERN.findall(masked_text)
+    if sorted(PLACEHOLDER_PATTERN.findall(translation)) != sorted(expected):
+        return None
+    if not tags:
+        return translation
+    
+    # Placeholder của tags luôn là các số lớn nhất (đánh số sau placeholder có sẵn)
+    offset = max(int(i) for i in expected) - len(tags) + 1
+    
+    def to_tag(match):
+        index = int(match.group(1)) - offset
+        return tags[index] if index >= 0 else match.group(0)
+    
+    return PLACEHOLDER_PATTERN.sub(to_tag, translation)
+
+def missing_placeholders(translation: str, masked_text: str) -> List[str]:
+    """Liệt kê các placeholder bị mất hoặc lặp sai trong bản dịch (dùng cho prompt dịch lại)"""
+    expected = PLACEHOLDER_PATTERN.findall(masked_text)
+    found = PLACEHOLDER_PATTERN.findall(translation)
+    return ['{%s}' % i for i in dict.fromkeys(expected) if found.count(i) != expected.count(i)]
+
+def source_hash(text: str) -> str:
+    """Hash ngắn của text nguồn, dùng để phát hiện original_text thay đổi"""
+    return hashlib.sha1(text.strip().encode('utf-8')).hexdigest()[:16]
+
+def align_entries(old_texts: List[str], new_texts: List[str]) -> Dict[int, tuple[int, str]]:
+    """
+    Ghép entries của bản extract mới với bản cũ (sau khi game cập nhật, vị trí/id có thể đã đổi)
+    
+    1. Text giống hệt (theo hash) và chỉ xuất hiện một lần ở bản cũ: ghép thẳng ('same').
+    2. Text trùng nhiều lần: chọn entry cũ đầu tiên nằm sau entry cũ của hàng xóm đã ghép phía trước.
+    3. Entry còn lại nằm giữa hai hàng xóm đã ghép, đúng chỗ một entry cũ chưa ghép: coi là text
+       đã sửa ('changed'), lan dần theo cả hai chiều.
+    Entry mới không ghép được là text mới. Mọi bước đều tuyến tính theo số entries.
+    
+    Returns:
+        Dict: index entry mới -> (index entry cũ, 'same' hoặc 'changed')
+    """
+    old_by_hash = {}
+    for index, text in enumerate(old_texts):
+        old_by_hash.setdefault(source_hash(text), []).append(index)
+    
+    matches = {}
+    used = set()
+    duplicates = []
+    for index, text in enumerate(new_texts):
+        candidates = old_by_hash.get(source_hash(text))
+        if not candidates:
+            continue
+        if len(candidates) == 1 and candidates[0] not in used:
+            matches[index] = (candidates[0], 'same')
+            used.add(candidates[0])
+        else:
+            duplicates.append(index)
+    
+    last_new, last_old = -1, -1
+    for index in duplicates:
+        # Vị trí cũ của entry đã ghép gần nhất phía trước
+        for previous in range(index - 1, last_new, -1):
+            if previous in matches:
+                last_new, last_old = previous, matches[previous][0]
+                break
+        candidates = [old for old in old_by_hash[source_hash(new_texts[index])] if old not in used]
+        if candidates:
+            after = [old for old in candidates if old > last_old]
+            old = min(after) if after else max(candidates)
+            matches[index] = (old, 'same')
+            used.add(old)
+    
+    for indexes, step in ((range(len(new_texts)), 1), (range(len(new_texts) - 1, -1, -1), -1)):
+        for index in indexes:
+            neighbor = matches.get(index - step)
+            if index in matches or neighbor is None:
+                continue
+            old = neighbor[0] + step
+            if 0 <= old < len(old_texts) and old not in used:
+                matches[index] = (old, 'changed')
+                used.add(old)
+    
+    return matches
+
+def group_table_rows(entries: List[Dict], max_gap: int = ROW_MAX_GAP) -> Dict[int, int]:
+    """
+    Gom các biến thể ngôn ngữ nằm liền nhau trong file .uasset thành một hàng
+    
+    Nhãn 'language' của extractor không đáng tin nên chỉ dựa vào vị trí: các entry liền nhau
+    (khoảng cách <= max_gap byte) tạo thành một hàng. Hàng chỉ được gom khi có đúng 5 biến thể
+    không phải chữ Nhật/Trung/Hàn nằm liền nhau (EN, FR, IT, DE, ES); hàng thiếu biến thể
+    (bị lọc trùng hoặc quá ngắn lúc extract) được giữ nguyên vì không biết chắc đâu là tiếng Anh.
+    
+    Returns:
+        Dict: chỉ số entry -> chỉ số entry tiếng Anh của hàng, cho mọi entry thuộc hàng đã gom
+    """
+    if any('position' not in entry or 'length' not in entry for entry in entries):
+        return {}
+    
+    runs = []
+    for index in sorted(range(len(entries)), key=lambda i: entries[i]['position']):
+        if runs:
+            previous = entries[runs[-1][-1]]
+            gap = entries[index]['position'] - (previous['position'] + 4 + previous['length'])
+            if 0 <= gap <= max_gap:
+                runs[-1].append(index)
+                continue
+        runs.append([index])
+    
+    sources = {}
+    for run in runs:
+        latin = [i for i in run if not CJK_PATTERN.search(entries[i].get('original_text', ''))]
+        if len(latin) != ROW_VARIANT_COUNT or run.index(latin[-1]) - run.index(latin[0]) != ROW_VARIANT_COUNT - 1:
+            continue
+        for index in run:
+            sources[index] = latin[0]
+    return sources
 
 class AutoTranslator:
-    def __init__(self, api_key: str = None, ai_engine: str = "gemini"):
+    def __init__(self, api_key: str = None, ai_engine: str = "gemini", require_api_key: bool = True,
+                 api_keys: List[str] = None, engine_options: Dict = None):
         """
         Khởi tạo Auto Translator
         
         Args:
             api_key: API key cho AI engine được chọn
-            ai_engine: Loại AI engine ("gemini" hoặc "chatgpt")
+            ai_engine: Tên AI engine đã đăng ký ("gemini", "chatgpt" hoặc "stub")
+            require_api_key: False cho các action không gọi API (ví dụ 'plan')
+            api_keys: Danh sách key dùng thay cho listkey.txt/biến môi trường
+            engine_options: Tham số riêng của engine (ví dụ latency của engine stub)
         """
         self.ai_engine = ai_engine.lower()
+        self.engine_class = get_engine_class(self.ai_engine)
+        self.engine_options = engine_options or {}
         
-        if self.ai_engine not in ["gemini", "chatgpt"]:
-            raise ValueError("ai_engine phải là 'gemini' hoặc 'chatgpt'")
-        
-        if self.ai_engine == "chatgpt" and not OPENAI_AVAILABLE:
-            raise ValueError("OpenAI library chưa được cài đặt. Chạy: pip install openai")
+        if not self.engine_class.is_available():
+            raise ValueError(f"Thư viện cho {self.engine_class.display_name} chưa được cài đặt. Chạy: pip install -r requirements.txt")
         # Load danh sách API keys
-        self.api_keys = self.load_api_keys()
+        self.api_keys = list(api_keys) if api_keys else self.load_api_keys()
         self.current_key_index = 0
         
         # Nếu có api_key truyền vào, ưu tiên sử dụng
         if api_key:
             self.api_keys.insert(0, api_key)
         
-        if not self.api_keys:
-            env_var = "OPENAI_API_KEY" if self.ai_engine == "chatgpt" else "GEMINI_API_KEY"
-            raise ValueError(f"Cần có API key. Thêm vào file listkey.txt hoặc đặt biến môi trường {env_var}")
+        # Engine không cần key (stub) vẫn xoay vòng qua ít nhất một key ảo
+        if not self.api_keys and not self.engine_class.requires_api_key:
+            self.api_keys = [f"{self.ai_engine}-key-1"]
+        
+        if not self.api_keys and require_api_key:
+            raise ValueError(f"Cần có API key. Thêm vào file listkey.txt hoặc đặt biến môi trường {self.engine_class.env_var}")
+        
+        # Mỗi key giữ một engine (và client/kết nối) riêng, đổi key chỉ chọn lại engine trong pool
+        self._lock = threading.RLock()
+        self.engines: Dict[str, TranslationEngine] = {}
+        # Request đang chạy theo text/template: luồng đến sau chờ kết quả thay vì gọi API lần nữa
+        self._inflight: Dict[str, Future] = {}
         
         # Cấu hình AI model với key đầu tiên
         self.setup_ai_model()
         
-        # Cache và từ điển
-        self.cache_file = "translation_cache.json"
+        # Dịch song song (translate_many/batch): số luồng và số text mỗi request
+        self.concurrency = 1
+        self.batch_size = 1
+        # Gom hàng đa ngôn ngữ: chỉ dịch biến thể tiếng Anh rồi ghi cho mọi biến thể của hàng
+        self.group_rows = False
+        # Thứ tự dịch (batch) và giới hạn ngân sách: khi hết ngân sách, phần đã dịch là phần có giá trị nhất
+        self.priority = 'frequency'
+        self.file_weights: Dict[str, float] = {}
+        self.budget: Optional[TranslationBudget] = None
+        
+        # Hedged request (tắt mặc định): request chậm hơn hedge_after giây (hoặc percentile hedge_percentile
+        # của độ trễ đã đo) được gửi thêm một bản tới key khác hoặc hedge_engine, bản hợp lệ về trước thắng
+        self.hedge_after: Optional[float] = None
+        self.hedge_percentile: Optional[float] = None
+        self.hedge_engine: Optional[TranslationEngine] = None
+        # Hedge chỉ được gửi khi key/engine đích còn quota ngay lúc đó (không chờ) và không vượt
+        # hedge_max_fraction số request chính, để hedge không tranh quota với request chính
+        self.hedge_max_fraction = HEDGE_MAX_FRACTION
+        self.hedge_limiter: Optional[AIMDRateLimiter] = None  # Tốc độ của hedge_engine
+        self._hedge_counts = {'requests': 0, 'hedges': 0}
+        self.request_deadline: Optional[float] = None  # Giây, tổng thời gian tối đa cho một text/batch
+        self._hedge_executor = None
+        
+        # Tốc độ gọi API tự điều chỉnh (AIMD) theo từng key và cả engine, thay cho delay cố định
+        self.rate_controller = RateController(self.api_keys, self.engine_class.default_requests_per_minute)
+        
+        # Cache và từ điển. Engine không cần API key (stub/giả lập) chỉ cho bản dịch giả: dùng cache riêng
+        # và không đánh dấu entry là đã xong, để lần chạy thật sau không bỏ qua các entry đó
+        self.simulated = not self.engine_class.requires_api_key
+        self.cache_file = f"translation_cache.{self.ai_engine}.json" if self.simulated else "translation_cache.json"
         self.dictionary_file = "tudien.json"
         self.cache = self.load_cache()
         self.dictionary = self.load_dictionary()
+        self.glossary = self.build_glossary()
+        
+        # Bảo vệ command tags được kiểm tra khi ghi từng entry vào cache (cache_translation),
+        # quét toàn bộ cache/từ điển chỉ chạy qua action 'maintain'
         
-        # Khởi tạo bảo vệ command tags
-        self.initialize_command_tag_protection()
+        # Metrics chi tiết (request theo key, 429, retry, độ trễ, token, cache), xuất bằng --metrics-file
+        self.metrics = MetricsRegistry()
+        self.metrics.collectors.append(self.collect_metrics)
         
         # Thống kê
         self.stats = {
@@ -65,15 +339,19 @@ class AutoTranslator:
             'translated': 0,
             'cached': 0,
             'dictionary': 0,
-            'skipped': 0
+            'skipped': 0,
+            'failed': 0,
+            'unchanged': 0,
+            'resumed': 0,
+            'deferred': 0
         }
         
     def load_api_keys(self) -> List[str]:
         """Load danh sách API keys từ file listkey.txt và biến môi trường"""
         keys = []
         
-        # Đọc từ file listkey.txt
-        if os.path.exists("listkey.txt"):
+        # Đọc từ file listkey.txt (chỉ dành cho engine cần API key thật)
+        if self.engine_class.requires_api_key and os.path.exists("listkey.txt"):
             try:
                 with open("listkey.txt", 'r', encoding='utf-8') as f:
                     for line in f:
@@ -85,25 +363,28 @@ class AutoTranslator:
                 print(f"⚠️  Không thể đọc listkey.txt: {e}")
         
         # Thêm từ biến môi trường nếu có
-        env_var = "OPENAI_API_KEY" if self.ai_engine == "chatgpt" else "GEMINI_API_KEY"
-        env_key = os.getenv(env_var)
+        env_key = os.getenv(self.engine_class.env_var) if self.engine_class.env_var else None
         if env_key and env_key not in keys:
             keys.append(env_key)
             
         return keys
     
+    def get_engine(self, api_key: str) -> TranslationEngine:
+        """Engine của một API key trong pool, tạo lần đầu khi cần (model/client chỉ được tạo khi gọi API)"""
+        with self._lock:
+            engine = self.engines.get(api_key)
+            if engine is None:
+                engine = create_engine(self.ai_engine, api_key, **self.engine_options)
+                self.engines[api_key] = engine
+            return engine
+    
     def setup_ai_model(self):
-        """Cấu hình AI model với API key hiện tại"""
-        current_key = self.api_keys[self.current_key_index]
-        
-        if self.ai_engine == "gemini":
-            genai.configure(api_key=current_key)
-            self.model = genai.GenerativeModel('gemini-2.0-flash-lite')
-            print(f"🤖 Gemini - Sử dụng API key #{self.current_key_index + 1}/{len(self.api_keys)}")
-        elif self.ai_engine == "chatgpt":
-            # Không cần set openai.api_key global, sẽ dùng client pattern
-            self.model_name = "gpt-3.5-turbo"
-            print(f"🤖 ChatGPT - Sử dụng API key #{self.current_key_index + 1}/{len(self.api_keys)}")
+        """Chọn engine (trong pool) cho API key hiện tại"""
+        current_key = self.api_keys[self.current_key_index] if self.api_keys else None
+        self.engine = self.get_engine(current_key)
+        
+        if current_key:
+            print(f"🤖 {self.engine_class.display_name} - Sử dụng API key #{self.current_key_index + 1}/{len(self.api_keys)}")
     
     def setup_gemini_model(self):
         """Backward compatibility - redirect to setup_ai_model"""
@@ -117,6 +398,11 @@ class AutoTranslator:
             return True
         return False
     
+    def switch_to_key(self, api_key: str):
+        """Chuyển sang một key cụ thể trong danh sách (không in log, dùng khi chia tải giữa các key)"""
+        self.current_key_index = self.api_keys.index(api_key)
+        self.engine = self.get_engine(api_key)
+    
     def reset_to_first_key(self):
         """Reset về key đầu tiên để bắt đầu vòng mới"""
         self.current_key_index = 0
@@ -134,11 +420,15 @@ class AutoTranslator:
     
     def save_cache(self):
         """Lưu cache ra file"""
+        started = time.perf_counter()
         try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache, f, ensure_ascii=False, indent=2)
+            with self._lock:
+                size = write_json_atomic(self.cache_file, self.cache)
+            self.metrics.inc('translator_cache_bytes_written_total', size)
         except Exception as e:
             print(f"⚠️  Lỗi khi lưu cache: {e}")
+        self.metrics.inc('translator_cache_saves_total')
+        self.metrics.inc('translator_cache_save_seconds_total', time.perf_counter() - started)
     
     def load_dictionary(self) -> Dict[str, str]:
         """Tải từ điển từ file tudien.json"""
@@ -160,10 +450,61 @@ class AutoTranslator:
         except Exception as e:
             print(f"⚠️  Lỗi khi lưu từ điển: {e}")
     
+    def build_glossary(self) -> GlossaryMatcher:
+        """Dựng bộ so khớp thuật ngữ từ từ điển (bỏ qua command tags và các từ giữ nguyên)"""
+        return GlossaryMatcher({
+            term: translation for term, translation in self.dictionary.items()
+            if not term.startswith('<') and translation.lower() != term
+        })
+    
+    def format_glossary_hint(self, text: str) -> str:
+        """Tạo phần thuật ngữ bắt buộc cho prompt, chỉ gồm các thuật ngữ có trong text"""
+        terms = self.glossary.relevant_terms(text)
+        if not terms:
+            return ""
+        lines = "\n".join(f"- {term} = {translation}" for term, translation in terms.items())
+        return f"\nThuật ngữ bắt buộc (dùng đúng bản dịch này):\n{lines}\n"
+    
+    def check_glossary_consistency(self, json_file: str) -> List[Dict]:
+        """
+        Kiểm tra các entry đã dịch có dùng đúng thuật ngữ của từ điển không
+        
+        Returns:
+            List các entry vi phạm: id, original_text, translated_text, missing_terms
+        """
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"❌ Lỗi khi đọc file {json_file}: {e}")
+            return []
+        
+        issues = []
+        for entry in data.get('text_entries', []):
+            original_text = entry.get('original_text', '')
+            translated_text = entry.get('translated_text', '')
+            if not original_text or translated_text == original_text:
+                continue
+            missing = self.glossary.check_consistency(original_text, translated_text)
+            if missing:
+                issues.append({
+                    'id': entry.get('id'),
+                    'original_text': original_text,
+                    'translated_text': translated_text,
+                    'missing_terms': missing
+                })
+        
+        print(f"🔎 Đã kiểm tra thuật ngữ trong {json_file}: {len(issues)} entries không nhất quán")
+        for issue in issues[:20]:
+            terms = ", ".join(f"{term} = {expected}" for term, expected in issue['missing_terms'])
+            print(f"  #{issue['id']}: '{issue['original_text'][:40]}' -> '{issue['translated_text'][:40]}' (thiếu: {terms})")
+        if len(issues) > 20:
+            print(f"  ... và {len(issues) - 20} entries khác")
+        
+        return issues
+    
     def add_command_tags_to_dictionary(self):
         """Thêm các command tags vào từ điển để đảm bảo chúng không bị dịch"""
-        import re
-        
         # Danh sách các command tags phổ biến
         common_cmd_tags = [
             "<CMD_MENU_ENTER>", "<CMD_MENU_BACK>", "<CMD_MENU_EXIT>",
@@ -174,11 +515,10 @@ class AutoTranslator:
         ]
         
         # Tìm thêm command tags từ cache hiện tại
-        cmd_pattern = r'<CMD_[^>]+>'
         found_tags = set()
         
         for text in self.cache.keys():
-            tags = re.findall(cmd_pattern, text)
+            tags = CMD_TAG_PATTERN.findall(text)
             found_tags.update(tags)
         
         # Kết hợp tất cả command tags
@@ -198,6 +538,24 @@ class AutoTranslator:
         
         return added_count
     
+    def cache_translation(self, text: str, translation: str) -> bool:
+        """
+        Ghi một bản dịch vào cache, kiểm tra command tags ngay lúc ghi
+        
+        Returns:
+            True nếu đã ghi, False nếu bản dịch làm mất/sai command tags (không được cache)
+        """
+        original_cmds = CMD_TAG_PATTERN.findall(text)
+        if original_cmds:
+            translated_cmds = CMD_TAG_PATTERN.findall(translation)
+            if len(original_cmds) != len(translated_cmds) or set(original_cmds) != set(translated_cmds):
+                print(f"⚠️  Không cache bản dịch sai command tags: '{text}' -> '{translation}'")
+                return False
+        
+        with self._lock:
+            self.cache[text] = translation
+        return True
+    
     def initialize_command_tag_protection(self):
         """Khởi tạo bảo vệ command tags: thêm vào từ điển và làm sạch cache"""
         print("🛡️ Khởi tạo bảo vệ command tags...")
@@ -219,11 +577,43 @@ class AutoTranslator:
         """Lấy bản dịch từ cache"""
         return self.cache.get(text)
     
+    def lookup_translation(self, text: str) -> Optional[tuple[str, str]]:
+        """
+        Tra bản dịch có sẵn (từ điển rồi cache) mà không gọi API
+        
+        Tra theo text nguyên văn trước, sau đó theo template (số và tags đã được
+        thay bằng placeholder) rồi điền lại giá trị gốc vào bản dịch.
+        
+        Returns:
+            tuple: (translated_text, source) hoặc None nếu phải gọi AI engine
+        """
+        dict_translation = self.get_translation_from_dictionary(text)
+        if dict_translation:
+            return dict_translation, 'dictionary'
+        
+        cached_translation = self.get_translation_from_cache(text)
+        if cached_translation:
+            return cached_translation, 'cache'
+        
+        template, values = make_template(text)
+        if not values:
+            return None
+        
+        # Chỉ gồm số/tags, không còn gì để dịch
+        if not re.search(r'[^\W\d_]', PLACEHOLDER_PATTERN.sub('', template)):
+            return text, 'skipped'
+        
+        for translation, source in ((self.get_translation_from_dictionary(template), 'dictionary'),
+                                    (self.get_translation_from_cache(template), 'cache')):
+            if translation:
+                filled = fill_template(translation, values)
+                if filled is not None:
+                    return filled, source
+        
+        return None
+    
     def clean_command_tags_from_cache(self):
         """Làm sạch cache, loại bỏ các command tags đã bị dịch sai"""
-        import re
-        
-        cmd_pattern = r'<CMD_[^>]+>'
         cleaned_count = 0
         
         # Tạo danh sách các key cần xóa
@@ -231,11 +621,11 @@ class AutoTranslator:
         
         for original_text, translated_text in self.cache.items():
             # Kiểm tra nếu text gốc chứa command tags
-            original_cmds = re.findall(cmd_pattern, original_text)
+            original_cmds = CMD_TAG_PATTERN.findall(original_text)
             
             if original_cmds:
                 # Kiểm tra nếu bản dịch không chứa command tags (đã bị dịch sai)
-                translated_cmds = re.findall(cmd_pattern, translated_text)
+                translated_cmds = CMD_TAG_PATTERN.findall(translated_text)
                 
                 if len(original_cmds) != len(translated_cmds) or set(original_cmds) != set(translated_cmds):
                     keys_to_remove.append(original_text)
@@ -255,268 +645,738 @@ class AutoTranslator:
         return cleaned_count
     
 
-    def validate_command_tags(self, original: str, translated: str) -> str:
-        """Kiểm tra và khôi phục command tags nếu bị dịch nhầm"""
-        import re
-        
-        # Tìm tất cả command tags trong text gốc
-        cmd_pattern = r'<CMD_[^>]+>'
-        original_cmds = re.findall(cmd_pattern, original)
-        
-        # Nếu có command tags trong text gốc
-        if original_cmds:
-            for cmd in original_cmds:
-                if cmd not in translated:
-                    print(f"⚠️  Phát hiện command tag bị mất hoặc dịch: {cmd}")
-                    # Tìm và thay thế các phiên bản đã dịch
-                    # Ví dụ: nếu <CMD_MENU_ENTER> bị dịch thành "Vào menu"
-                    # thì ta cần khôi phục lại
-                    if "menu" in translated.lower() and "CMD_MENU" in cmd:
-                        # Thay thế các từ có thể là bản dịch của command
-                        translated = re.sub(r'[Vv]ào menu|[Ee]nter menu|[Mm]enu enter', cmd, translated)
-                    elif "back" in translated.lower() and "CMD_MENU_BACK" in cmd:
-                        translated = re.sub(r'[Tt]rở lại|[Bb]ack|[Qq]uay lại', cmd, translated)
-                    elif "jump" in translated.lower() and "CMD_JUMP" in cmd:
-                        translated = re.sub(r'[Nn]hảy|[Jj]ump', cmd, translated)
-                    else:
-                        # Nếu không tìm thấy, thêm command tag vào cuối
-                        translated = f"{translated} {cmd}"
-        
-        return translated
-
-    def translate_with_gemini(self, text: str) -> str:
-        """Dịch text bằng Google Gemini với bối cảnh game và multiple API keys (xoay vòng)"""
-        import time
+    def build_prompt(self, masked_text: str, retry_hint: str = "") -> str:
+        """Toàn bộ nội dung gửi cho AI engine hiện tại (dùng để ước tính token)"""
+        return self.engine.build_prompt(masked_text, self.format_glossary_hint(masked_text) + retry_hint)
+    
+    def _call_with_key_rotation(self, request: Callable, description: str, deadline: float = None,
+                                stop: threading.Event = None, budget: TranslationBudget = None, tokens: int = 0):
+        """
+        Gọi engine với cơ chế xoay vòng API keys khi bị rate limit
         
-        max_cycles = 1000005  # Số vòng xoay tối đa
+        Args:
+            request: Hàm nhận engine và thực hiện một request
+            description: Text đang dịch (để in log)
+            deadline: Mốc time.perf_counter() sau đó không gửi thêm request nào (kể cả chờ tới lượt)
+            stop: Event được set khi kết quả không còn cần nữa (bản hedge đã thắng hoặc đã quá hạn)
+            budget: Ngân sách bị trừ cho mỗi lần gửi thật (kể cả lần thử lại sau 429)
+            tokens: Token ước tính của một lần gửi
+        
+        Raises:
+            BudgetExhaustedError: hết ngân sách trước một lần gửi (không thử lại)
+            TranslationError: lỗi không thử lại được, đã thử hết các vòng key, quá deadline hoặc bị stop
+        """
+        max_cycles = self.engine_class.max_key_cycles  # Số vòng xoay tối đa
         keys_per_cycle = len(self.api_keys)
         total_attempts = 0
         max_total_attempts = max_cycles * keys_per_cycle
         
-        original_key_index = self.current_key_index  # Lưu vị trí ban đầu
-        
         while total_attempts < max_total_attempts:
+            if stop is not None and stop.is_set():
+                raise TranslationError("request không còn cần (đã có kết quả khác hoặc đã quá hạn)")
+            remaining = deadline - time.perf_counter() if deadline is not None else None
+            if remaining is not None and remaining <= 0:
+                raise TranslationError("quá hạn trước khi gửi request")
+            if not self._charge_budget(budget, tokens):
+                raise BudgetExhaustedError(f"hết ngân sách ({budget.exhausted_reason})")
+            with self._lock:
+                # Key hiện tại đang bị tạm nghỉ sau 429 thì dùng key khác đang rảnh
+                best_key = self.rate_controller.best_key(self.engine.api_key)
+                if best_key != self.engine.api_key and best_key in self.api_keys:
+                    self.switch_to_key(best_key)
+                engine = self.engine
+            key_label = self.key_label(engine.api_key)
+            waited = time.perf_counter()
+            acquired = self.rate_controller.acquire(engine.api_key, max_wait=remaining, stop=stop)
+            started = time.perf_counter()
+            self.metrics.inc('translator_rate_wait_seconds_total', started - waited, engine=self.ai_engine)
+            if not acquired:
+                raise TranslationError("quá hạn hoặc bị hủy khi chờ tới lượt gửi request")
             try:
-                prompt = f"""
-Hãy dịch đoạn text sau sang tiếng Việt một cách tự nhiên và phù hợp với ngữ cảnh game:
-
-Text: "{text}"
-
-Yêu cầu QUAN TRỌNG:
-- Dịch chính xác và tự nhiên cho game
-- Giữ nguyên ý nghĩa gốc
-- Sử dụng thuật ngữ game phù hợp
-- **TUYỆT ĐỐI KHÔNG ĐƯỢC dịch bất kỳ nội dung nào bên trong:**
-  * Dấu ngoặc vuông [...] - giữ nguyên hoàn toàn
-  * Dấu ngoặc nhọn <...> - giữ nguyên hoàn toàn
-  * Các command tags như <CMD_MENU_ENTER>, <CMD_MENU_BACK>, <CMD_JUMP>, <CMD_BTL_ATTACK>, v.v.
-- Giữ nguyên hoàn toàn các ký hiệu đặc biệt và command tags
-- Chỉ trả về bản dịch, không giải thích
-- Nếu text chứa ký tự Nhật Bản, hãy dịch phần có thể dịch được
-
-Ví dụ CHÍNH XÁC:
-- "Press <CMD_MENU_ENTER> to continue" -> "Nhấn <CMD_MENU_ENTER> để tiếp tục"
-- "<CMD_MENU_BACK>" -> "<CMD_MENU_BACK>" (KHÔNG dịch thành "Trở lại")
-- "[CGUIDE_INVALID]<CMD_MENU_BACK>[C]" -> "[CGUIDE_INVALID]<CMD_MENU_BACK>[C]"
-- "Hello [WORLD]" -> "Xin chào [WORLD]"
-- "Jump with <CMD_JUMP>" -> "Nhảy bằng <CMD_JUMP>"
-
-LƯU Ý: Nếu text chỉ chứa command tag (như "<CMD_MENU_ENTER>"), hãy trả về CHÍNH XÁC như vậy, KHÔNG dịch.
-"""
-                
-                response = self.model.generate_content(prompt)
-                translation = response.text.strip()
-                
-                # Loại bỏ dấu ngoặc kép nếu có
-                if translation.startswith('"') and translation.endswith('"'):
-                    translation = translation[1:-1]
-                
-                # Kiểm tra cuối cùng: nếu translation vẫn chứa text gốc, loại bỏ nó
-                if text in translation and translation != text:
-                    # Nếu translation chứa text gốc, tìm và loại bỏ
-                    if translation.startswith(text):
-                        remaining = translation[len(text):].strip()
-                        if remaining.startswith('" -> "') or remaining.startswith(' -> '):
-                            translation = remaining.split('"')[-1] if '"' in remaining else remaining.split(' -> ')[-1]
-                            translation = translation.strip().strip('"')
-                
-                # Validate và khôi phục command tags nếu cần
-                translation = self.validate_command_tags(text, translation)
-                
-                return translation
-                
+                result = request(engine)
+                self.rate_controller.on_success(engine.api_key)
+                self.record_request(key_label, 'success', started)
+                return result
             except Exception as e:
-                error_str = str(e).lower()
-                
-                # Kiểm tra nếu là lỗi rate limit (429)
-                if "429" in error_str or "quota" in error_str or "rate limit" in error_str or "resource_exhausted" in error_str:
-                    total_attempts += 1
-                    cycle_num = (total_attempts - 1) // keys_per_cycle + 1
-                    
-                    print(f"⚠️  Rate limit với key #{self.current_key_index + 1}. Chuyển ngay lập tức... (Vòng {cycle_num}, Lần {total_attempts}/{max_total_attempts})")
-                    
-                    # Chuyển sang key tiếp theo ngay lập tức
-                    if not self.switch_to_next_key():
-                        # Đã hết keys, quay về key đầu tiên để bắt đầu vòng mới
-                        self.reset_to_first_key()
-                        print(f"🔄 Bắt đầu vòng {cycle_num + 1}, quay về key #1")
-                    
-                    # Đợi 1 giây trước khi thử key mới
-                    time.sleep(1)
-                    continue
-                else:
+                if engine.classify_error(e) != ERROR_RATE_LIMIT:
                     # Lỗi khác, không retry
-                    print(f"❌ Lỗi khi dịch '{text}': {e}")
-                    return text
+                    self.record_request(key_label, 'error', started)
+                    print(f"❌ Lỗi khi dịch '{description}': {e}")
+                    raise TranslationError(str(e)) from e
+                
+                # Giảm tốc độ của key vừa bị chặn, lần gửi sau với key đó sẽ tự chờ lâu hơn
+                self.record_request(key_label, 'rate_limited', started)
+                self.metrics.inc('translator_retries_total', engine=self.ai_engine, reason='rate_limit')
+                self.rate_controller.on_rate_limit(engine.api_key)
+                total_attempts += 1
+                cycle_num = (total_attempts - 1) // keys_per_cycle + 1
+                
+                with self._lock:
+                    # Luồng khác có thể đã đổi key trong lúc chờ, chỉ đổi nếu vẫn là key vừa lỗi
+                    if engine is self.engine:
+                        print(f"⚠️  Rate limit với key #{self.current_key_index + 1}. Chuyển ngay lập tức... (Vòng {cycle_num}, Lần {total_attempts}/{max_total_attempts})")
+                        
+                        # Chuyển sang key tiếp theo ngay lập tức
+                        if not self.switch_to_next_key():
+                            # Đã hết keys, quay về key đầu tiên để bắt đầu vòng mới
+                            self.reset_to_first_key()
+                            print(f"🔄 Bắt đầu vòng {cycle_num + 1}, quay về key #1")
         
         # Nếu đã thử hết tất cả keys trong tất cả vòng
-        print(f"❌ Đã thử {max_cycles} vòng với tất cả {len(self.api_keys)} API keys. Bỏ qua từ: '{text}'")
-        return text  # Trả về text gốc nếu không thể dịch
+        print(f"❌ Đã thử {max_cycles} vòng với tất cả {len(self.api_keys)} API keys. Bỏ qua từ: '{description}'")
+        raise TranslationError("rate limit on every API key")
+    
+    def setup_hedge_engine(self, name: str):
+        """Dùng một AI engine khác (key lấy từ biến môi trường của engine đó) làm đích gửi hedge"""
+        engine_class = get_engine_class(name)
+        if not engine_class.is_available():
+            raise ValueError(f"Thư viện cho {engine_class.display_name} chưa được cài đặt. Chạy: pip install -r requirements.txt")
+        api_key = os.getenv(engine_class.env_var) if engine_class.env_var else None
+        if engine_class.requires_api_key and not api_key:
+            raise ValueError(f"Engine hedge {engine_class.display_name} cần API key trong biến môi trường {engine_class.env_var}")
+        options = self.engine_options if name == self.ai_engine else {}
+        self.hedge_engine = create_engine(name, api_key or f"{name}-hedge", **options)
+        self.hedge_limiter = AIMDRateLimiter(engine_class.default_requests_per_minute / 60)
+        print(f"🪂 Hedge sang {engine_class.display_name} khi request chậm")
+    
+    def hedge_delay(self) -> float:
+        """Thời điểm gửi hedge: percentile độ trễ đã đo (khi đủ mẫu), nếu không thì hedge_after"""
+        if self.hedge_percentile:
+            delay = self.metrics.quantile('translator_request_seconds', self.hedge_percentile,
+                                          min_count=HEDGE_MIN_SAMPLES, engine=self.ai_engine, outcome='success')
+            if delay is not None:
+                return delay
+        return self.hedge_after if self.hedge_after is not None else HEDGE_DEFAULT_DELAY
+    
+    def _charge_budget(self, budget: Optional[TranslationBudget], tokens: int) -> bool:
+        """Trừ ngân sách cho một lần gửi thật tới engine; False nếu đã hết (không có ngân sách thì luôn True)"""
+        if budget is None:
+            return True
+        usage = self.token_usage()
+        return budget.reserve(tokens, usage['prompt_tokens'] + usage['completion_tokens'])
+    
+    def _reserve_hedge(self, primary_key: str, budget: TranslationBudget = None, tokens: int = 0):
+        """
+        Chọn đích và giữ chỗ cho một hedge, không chờ
+        
+        Returns:
+            tuple: (engine, key_label, limiter), hoặc None nếu phải bỏ hedge (vượt hedge_max_fraction,
+                   key/engine đích chưa gửi được ngay, hoặc hết ngân sách)
+        """
+        with self._lock:
+            if self._hedge_counts['hedges'] + 1 > self.hedge_max_fraction * self._hedge_counts['requests']:
+                self.metrics.inc('translator_hedges_skipped_total', engine=self.ai_engine, reason='cap')
+                return None
+            if self.hedge_engine is not None:
+                if self.hedge_limiter is None:
+                    self.hedge_limiter = AIMDRateLimiter(self.hedge_engine.default_requests_per_minute / 60)
+                target = (self.hedge_engine, f"hedge-{self.hedge_engine.name}", self.hedge_limiter)
+                reserved = self.hedge_limiter.try_reserve()
+            else:
+                api_key = self.rate_controller.best_key(primary_key, exclude=primary_key)
+                if api_key is None or api_key not in self.api_keys:
+                    self.metrics.inc('translator_hedges_skipped_total', engine=self.ai_engine, reason='no_key')
+                    return None
+                target = (self.get_engine(api_key), self.key_label(api_key), None)
+                reserved = self.rate_controller.try_acquire(api_key)
+            if not reserved:
+                self.metrics.inc('translator_hedges_skipped_total', engine=self.ai_engine, reason='rate')
+                return None
+            if not self._charge_budget(budget, tokens):
+                self.metrics.inc('translator_hedges_skipped_total', engine=self.ai_engine, reason='budget')
+                return None
+            self._hedge_counts['hedges'] += 1
+            return target
+    
+    def _hedge_attempt(self, request: Callable, engine: TranslationEngine, key_label: str,
+                       limiter: Optional[AIMDRateLimiter]):
+        """Một lần gửi hedge đã giữ chỗ (không xoay vòng key); limiter None là key của rate_controller"""
+        started = time.perf_counter()
+        try:
+            result = request(engine)
+        except Exception as e:
+            self.record_request(key_label, 'error', started)
+            if engine.classify_error(e) == ERROR_RATE_LIMIT:
+                if limiter is not None:
+                    limiter.on_rate_limit()
+                else:
+                    self.rate_controller.on_rate_limit(engine.api_key)
+            raise TranslationError(str(e)) from e
+        self.record_request(key_label, 'success', started)
+        if limiter is not None:
+            limiter.on_success()
+        else:
+            self.rate_controller.on_success(engine.api_key)
+        return result
+    
+    def call_engine(self, request: Callable, description: str, validate: Callable = None,
+                    budget: TranslationBudget = None, tokens: int = 0):
+        """
+        Gọi engine, kèm hedged request nếu bật hedging
+        
+        Request chính chạy với xoay vòng key như bình thường. Nếu sau hedge_delay() giây vẫn chưa có kết quả,
+        một bản sao được gửi tới key khác (hoặc hedge_engine), nhưng chỉ khi đích đó gửi được ngay và số hedge
+        chưa vượt hedge_max_fraction số request; nếu không thì tiếp tục chờ request chính. Kết quả đầu tiên qua
+        được validate thắng; bản còn lại bị hủy nếu chưa chạy, hoặc bị bỏ qua khi về sau (kết quả vẫn được ghi
+        vào metrics).
+        
+        Args:
+            request: Hàm nhận engine và thực hiện một request
+            description: Text đang dịch (để in log)
+            validate: Hàm kiểm tra kết quả (ví dụ placeholder khôi phục được); kết quả không hợp lệ chỉ
+                      được trả về khi không còn bản nào khác
+            budget, tokens: Ngân sách bị trừ tokens cho mỗi lần gửi thật (request chính, thử lại, hedge)
+        
+        Raises:
+            BudgetExhaustedError: hết ngân sách trước khi gửi được
+            TranslationError: cả hai bản đều lỗi hoặc quá request_deadline
+        """
+        if self.hedge_after is None and self.hedge_percentile is None and self.request_deadline is None:
+            return self._call_with_key_rotation(request, description, budget=budget, tokens=tokens)
+        
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(max_workers=2 * max(self.concurrency, 1) + 2,
+                                                          thread_name_prefix="hedge")
+        hedging = self.hedge_after is not None or self.hedge_percentile is not None
+        started = time.perf_counter()
+        deadline = started + self.request_deadline if self.request_deadline else None
+        primary_key = self.engine.api_key
+        # Request chính dừng xoay vòng key khi quá hạn hoặc khi stop được set (kết quả đã có/bỏ cuộc),
+        # không giữ worker và quota cho một kết quả sẽ bị bỏ
+        stop = threading.Event()
+        futures = {self._hedge_executor.submit(self._call_with_key_rotation, request, description, deadline, stop,
+                                                budget, tokens): 'primary'}
+        with self._lock:
+            self._hedge_counts['requests'] += 1
+        
+        winner, fallback, errors = None, None, []
+        pending = set(futures)
+        hedge_decided = not hedging
+        while pending and winner is None:
+            timeout = None
+            if not hedge_decided:
+                timeout = max(0.0, started + self.hedge_delay() - time.perf_counter())
+            if deadline is not None:
+                remaining = max(0.0, deadline - time.perf_counter())
+                timeout = remaining if timeout is None else min(timeout, remaining)
+            
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except TranslationError as e:
+                    errors.append(e)
+                    continue
+                if validate is None or validate(result):
+                    winner = futures[future], result
+                    break
+                fallback = fallback or (futures[future], result)
+            
+            if winner is not None:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                print(f"⏰ Quá hạn {self.request_deadline:g}s khi dịch '{description}'")
+                break
+            if not hedge_decided and pending:
+                # Request chính vẫn chưa xong sau hedge_delay(): gửi bản hedge nếu còn quota, chỉ xét một lần
+                hedge_decided = True
+                target = self._reserve_hedge(primary_key, budget, tokens)
+                if target is not None:
+                    self.metrics.inc('translator_hedges_total', engine=self.ai_engine)
+                    hedge = self._hedge_executor.submit(self._hedge_attempt, request, *target)
+                    futures[hedge] = 'hedge'
+                    pending.add(hedge)
+        
+        # Bản thua: hủy nếu chưa chạy, nếu đang chạy thì ghi nhận kết quả khi về
+        stop.set()
+        for future in pending:
+            if future.cancel():
+                self.metrics.inc('translator_hedge_losers_total', role=futures[future], outcome='cancelled')
+            else:
+                role = futures[future]
+                future.add_done_callback(lambda f, role=role: self.metrics.inc(
+                    'translator_hedge_losers_total', role=role,
+                    outcome='error' if f.exception() else 'success'))
+        
+        if len(futures) > 1:
+            self.metrics.inc('translator_hedge_winners_total', winner=(winner or fallback or ('none',))[0])
+        if winner is not None:
+            return winner[1]
+        if fallback is not None:
+            return fallback[1]
+        if errors:
+            raise errors[0]
+        raise TranslationError(f"quá hạn {self.request_deadline:g}s")
+    
+    def key_label(self, api_key: str) -> str:
+        """Số thứ tự của key (không đưa key thật vào metrics/log)"""
+        return str(self.api_keys.index(api_key) + 1) if api_key in self.api_keys else "0"
+    
+    def record_request(self, key_label: str, outcome: str, started: float):
+        """Ghi nhận một request API: số lượng theo key/kết quả và độ trễ"""
+        self.metrics.inc('translator_requests_total', engine=self.ai_engine, key=key_label, outcome=outcome)
+        self.metrics.observe('translator_request_seconds', time.perf_counter() - started,
+                             engine=self.ai_engine, outcome=outcome)
+    
+    def collect_metrics(self, metrics: MetricsRegistry):
+        """Cập nhật gauge từ thống kê, token và tốc độ hiện tại (gọi ngay trước khi xuất metrics)"""
+        stats = dict(self.stats)
+        for source, count in stats.items():
+            metrics.set('translator_entries', count, source=source)
+        total = stats.get('total') or 0
+        metrics.set('translator_cache_hit_ratio', stats.get('cached', 0) / total if total else 0)
+        metrics.set('translator_dictionary_hit_ratio', stats.get('dictionary', 0) / total if total else 0)
+        
+        for api_key, engine in list(self.engines.items()):
+            key = self.key_label(api_key)
+            for kind in ('prompt_tokens', 'cached_tokens', 'completion_tokens'):
+                metrics.set('translator_tokens', engine.usage.get(kind, 0), engine=self.ai_engine, key=key,
+                            kind=kind.replace('_tokens', ''))
+        
+        rates = self.rate_controller.snapshot()
+        metrics.set('translator_rate_rpm', rates['engine_rpm'], engine=self.ai_engine, key='all')
+        for key in rates['keys']:
+            metrics.set('translator_rate_rpm', key['rpm'], engine=self.ai_engine, key=str(key['key']))
+    
+    def translate_with_engine(self, text: str, budget: TranslationBudget = None) -> str:
+        """
+        Dịch text bằng AI engine được chọn với multiple API keys (xoay vòng)
+        
+        Tags được che bằng placeholder trước khi gửi; nếu bản dịch làm sai placeholder,
+        text được dịch lại kèm chỉ dẫn cụ thể thay vì đoán cách sửa. Mỗi lần gửi thật bị trừ vào budget.
+        
+        Raises:
+            BudgetExhaustedError: hết ngân sách
+            TranslationError: nếu không dịch được
+        """
+        tokens = self.estimate_request_tokens([text])
+        masked_text, tags = mask_tags(text)
+        hints = self.format_glossary_hint(masked_text)
+        retry_hint = ""
+        
+        for tag_retries in range(TAG_MISMATCH_RETRIES + 1):
+            translation = self.call_engine(
+                lambda engine: engine.translate(masked_text, hints + retry_hint), text,
+                validate=lambda result: restore_tags(result, masked_text, tags) is not None,
+                budget=budget, tokens=tokens)
+            
+            # Khôi phục tags, placeholder không khớp thì dịch lại có chỉ định thay vì đoán
+            restored = restore_tags(translation, masked_text, tags)
+            if restored is not None:
+                return restored
+            
+            missing = missing_placeholders(translation, masked_text)
+            if tag_retries == TAG_MISMATCH_RETRIES:
+                print(f"❌ Placeholder {', '.join(missing)} vẫn sai sau {TAG_MISMATCH_RETRIES} lần dịch lại. Bỏ qua từ: '{text}'")
+                raise TranslationError(f"placeholder mismatch: {', '.join(missing)}")
+            print(f"⚠️  Bản dịch làm sai placeholder {', '.join(missing)}, dịch lại ({tag_retries + 1}/{TAG_MISMATCH_RETRIES})")
+            self.metrics.inc('translator_retries_total', engine=self.ai_engine, reason='placeholder')
+            retry_hint = f"\nLần trước bạn đã làm mất hoặc lặp placeholder {', '.join(missing)}. Bắt buộc giữ đúng mỗi placeholder một lần.\n"
+    
+    def translate_batch_with_engine(self, texts: List[str], budget: TranslationBudget = None) -> List[Optional[str]]:
+        """
+        Dịch nhiều text trong một request
+        
+        Returns:
+            List bản dịch theo thứ tự; None ở vị trí có placeholder sai (cần dịch lại riêng)
+        
+        Raises:
+            BudgetExhaustedError: hết ngân sách
+            TranslationError: nếu cả batch không dịch được
+        """
+        masked = [mask_tags(text) for text in texts]
+        masked_texts = [masked_text for masked_text, _ in masked]
+        hints = self.format_glossary_hint("\n".join(masked_texts))
+        
+        translations = self.call_engine(
+            lambda engine: engine.translate_batch(masked_texts, hints), f"batch {len(texts)} text",
+            budget=budget, tokens=self.estimate_request_tokens(texts))
+        
+        return [restore_tags(translation, masked_text, tags)
+                for translation, (masked_text, tags) in zip(translations, masked)]
+    
+    def translate_with_gemini(self, text: str) -> str:
+        """Backward compatibility - redirect to translate_with_engine"""
+        return self.translate_with_engine(text)
     
     def translate_with_chatgpt(self, text: str) -> str:
-        """Dịch text bằng ChatGPT GPT-3.5-turbo với multiple API keys (xoay vòng)"""
-        import time
+        """Backward compatibility - redirect to translate_with_engine"""
+        return self.translate_with_engine(text)
+    
+    def entry_source_texts(self, entries: List[Dict]) -> List[str]:
+        """
+        Text cần dịch cho từng entry (cùng thứ tự với entries)
         
-        max_cycles = 5  # Số vòng xoay tối đa
-        keys_per_cycle = len(self.api_keys)
-        total_attempts = 0
-        max_total_attempts = max_cycles * keys_per_cycle
+        Luôn dịch từ original_text (không phải translated_text, vốn đã là tiếng Việt sau lần chạy trước).
+        Khi bật group_rows, mọi biến thể của một hàng dùng text tiếng Anh của hàng đó nên cả hàng
+        chỉ tốn một lần dịch và nhận cùng một bản dịch.
+        """
+        texts = [entry.get('original_text', entry.get('translated_text', '')) for entry in entries]
+        if not self.group_rows:
+            return texts
+        sources = group_table_rows(entries)
+        return [texts[sources.get(index, index)] for index in range(len(entries))]
+    
+    def is_entry_done(self, entry: Dict, source_text: str) -> bool:
+        """
+        Entry đã dịch xong với đúng text nguồn hiện tại chưa (O(1), không tra cache hay gọi API)
         
-        original_key_index = self.current_key_index  # Lưu vị trí ban đầu
+        Entry có translation_state: xong khi status 'done' và source_hash khớp text nguồn.
+        Entry từ file dịch phiên bản cũ (chưa có state): coi là xong nếu translated_text khác original_text.
+        """
+        state = entry.get(TRANSLATION_STATE_KEY)
+        if state is not None:
+            return state.get('status') == 'done' and state.get('source_hash') == source_hash(source_text)
+        translated_text = entry.get('translated_text', '')
+        return bool(translated_text) and translated_text != entry.get('original_text', translated_text)
+    
+    def mark_entry(self, entry: Dict, source_text: str, source: str):
+        """
+        Ghi trạng thái dịch vào entry: hash text nguồn, nguồn bản dịch (engine/dictionary/cache/...) và status
         
-        while total_attempts < max_total_attempts:
+        Bản dịch của engine giả lập (kể cả lấy từ cache riêng của nó) có status 'simulated', không phải 'done'.
+        """
+        if source == 'failed':
+            status = 'failed'
+        elif self.simulated and source not in ('dictionary', 'legacy', 'manual'):
+            status = 'simulated'
+        else:
+            status = 'done'
+        entry[TRANSLATION_STATE_KEY] = {
+            'source_hash': source_hash(source_text),
+            'engine': source,
+            'status': status
+        }
+    
+    def copy_translation(self, previous: Dict, entry: Dict, source_text: str):
+        """Chép bản dịch (kể cả sửa tay) và trạng thái từ entry cũ sang entry mới cùng text nguồn"""
+        entry['translated_text'] = previous['translated_text']
+        entry[TRANSLATION_STATE_KEY] = previous.get(TRANSLATION_STATE_KEY)
+        if entry[TRANSLATION_STATE_KEY] is None:
+            self.mark_entry(entry, source_text, 'legacy')
+    
+    def migrate_translations(self, old_data: Dict, new_data: Dict) -> Dict:
+        """
+        Chuyển bản dịch từ file dịch cũ sang bản extract mới sau khi game cập nhật
+        
+        Entry có text không đổi nhận lại bản dịch (kể cả sửa tay) dù vị trí/id đã đổi. Entry có text
+        đã sửa giữ bản dịch cũ trong 'previous_translation' để tham khảo và chờ dịch lại cùng entry mới.
+        
+        Returns:
+            Dict: carried, manual, untranslated, removed (số entry) và changed, new (index các entry cần dịch)
+        """
+        old_entries = old_data.get('text_entries', [])
+        entries = new_data.get('text_entries', [])
+        old_sources = self.entry_source_texts(old_entries)
+        matches = align_entries([entry.get('original_text', '') for entry in old_entries],
+                                [entry.get('original_text', '') for entry in entries])
+        
+        report = {'carried': 0, 'manual': 0, 'untranslated': 0, 'removed': len(old_entries) - len(matches),
+                  'changed': [], 'new': []}
+        for index, source_text in enumerate(self.entry_source_texts(entries)):
+            if index not in matches:
+                report['new'].append(index)
+                continue
+            
+            old_index, kind = matches[index]
+            old_entry = old_entries[old_index]
+            done = self.is_entry_done(old_entry, old_sources[old_index])
+            if kind == 'changed':
+                if done:
+                    entries[index]['previous_translation'] = {'original_text': old_entry.get('original_text', ''),
+                                                              'translated_text': old_entry['translated_text']}
+                report['changed'].append(index)
+            elif done and old_sources[old_index] == source_text:
+                self.copy_translation(old_entry, entries[index], source_text)
+                report['carried'] += 1
+                if entries[index][TRANSLATION_STATE_KEY].get('engine') == 'manual':
+                    report['manual'] += 1
+            else:
+                report['untranslated'] += 1
+        return report
+    
+    def migrate(self, old_path: str, new_path: str, output_path: str, report_path: str = None):
+        """
+        Action migrate: chuyển bản dịch cũ (file hoặc folder) sang bản extract mới, ghép file theo tên
+        
+        Args:
+            old_path: File/folder JSON đã dịch của phiên bản game cũ
+            new_path: File/folder JSON vừa extract từ phiên bản mới
+            output_path: Folder (hoặc file .json) ghi kết quả; entry cần dịch giữ nguyên text gốc, chưa có translation_state
+            report_path: Nếu có, ghi danh sách chuỗi mới/đã sửa (JSON) cần dịch
+        """
+        if os.path.isdir(new_path):
+            pairs = [(os.path.join(old_path, f), os.path.join(new_path, f), os.path.join(output_path, f))
+                     for f in sorted(os.listdir(new_path)) if f.endswith('.json')]
+            os.makedirs(output_path, exist_ok=True)
+        else:
+            if not output_path.endswith('.json'):
+                os.makedirs(output_path, exist_ok=True)
+                output_path = os.path.join(output_path, os.path.basename(new_path))
+            pairs = [(old_path, new_path, output_path)]
+        
+        todo = []
+        for old_file, new_file, output_file in pairs:
             try:
-                prompt = f"""Dịch text sau sang tiếng Việt cho game. CHỈ trả về bản dịch, KHÔNG bao gồm text gốc hay ký hiệu "->".
-
-Text cần dịch: "{text}"
-
-Quy tắc:
-- Dịch tự nhiên cho game
-- Giữ nguyên [...] và <...>
-- Giữ nguyên command tags như <CMD_MENU_ENTER>
-- CHỈ trả về bản dịch tiếng Việt
-- KHÔNG viết dạng "text gốc -> bản dịch"
-- KHÔNG giải thích
-
-Ví dụ đúng:
-Input: "Press <CMD_MENU_ENTER> to continue"
-Output: "Nhấn <CMD_MENU_ENTER> để tiếp tục"
-
-Input: "<CMD_MENU_BACK>"
-Output: "<CMD_MENU_BACK>"
-
-Input: "Hello [WORLD]"
-Output: "Xin chào [WORLD]"
-
-Bản dịch:"""
-                
-                # Sử dụng OpenAI API v1.0+
-                client = openai.OpenAI(api_key=self.api_keys[self.current_key_index])
-                
-                response = client.chat.completions.create(
-                    model=self.model_name,
-                    messages=[
-                        {"role": "system", "content": "Bạn là một chuyên gia dịch thuật game, chuyên dịch từ tiếng Anh sang tiếng Việt."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=500,
-                    temperature=0.3
-                )
-                
-                translation = response.choices[0].message.content.strip()
-                
-                # Loại bỏ dấu ngoặc kép nếu có
-                if translation.startswith('"') and translation.endswith('"'):
-                    translation = translation[1:-1]
-                
-                # Xử lý nếu ChatGPT trả về format "text gốc -> bản dịch"
-                if ' -> ' in translation:
-                    # Lấy phần sau dấu ->
-                    translation = translation.split(' -> ')[-1].strip()
-                    # Loại bỏ dấu ngoặc kép nếu có
-                    if translation.startswith('"') and translation.endswith('"'):
-                        translation = translation[1:-1]
-                elif '" -> "' in translation:
-                    # Xử lý format "text" -> "dịch"
-                    parts = translation.split('" -> "')
-                    if len(parts) >= 2:
-                        translation = parts[-1].rstrip('"')
-                elif translation.startswith(f'"{text}"'):
-                    # Xử lý nếu bắt đầu bằng text gốc trong ngoặc kép
-                    translation = translation[len(f'"{text}"'):].strip()
-                    if translation.startswith(' -> '):
-                        translation = translation[4:].strip()
-                    if translation.startswith('"') and translation.endswith('"'):
-                        translation = translation[1:-1]
-                
-                # Validate và khôi phục command tags nếu cần
-                translation = self.validate_command_tags(text, translation)
-                
-                return translation
-                
+                with open(new_file, 'r', encoding='utf-8') as f:
+                    new_data = json.load(f)
+                old_data = {}
+                if os.path.exists(old_file):
+                    with open(old_file, 'r', encoding='utf-8') as f:
+                        old_data = json.load(f)
             except Exception as e:
-                error_str = str(e).lower()
-                
-                # Kiểm tra nếu là lỗi rate limit
-                if "rate limit" in error_str or "quota" in error_str or "429" in error_str or "too many requests" in error_str:
-                    total_attempts += 1
-                    cycle_num = (total_attempts - 1) // keys_per_cycle + 1
-                    
-                    print(f"⚠️  Rate limit với key #{self.current_key_index + 1}. Chuyển ngay lập tức... (Vòng {cycle_num}, Lần {total_attempts}/{max_total_attempts})")
-                    
-                    # Chuyển sang key tiếp theo ngay lập tức
-                    if not self.switch_to_next_key():
-                        # Đã hết keys, quay về key đầu tiên để bắt đầu vòng mới
-                        self.reset_to_first_key()
-                        print(f"🔄 Bắt đầu vòng {cycle_num + 1}, quay về key #1")
-                    
-                    # Đợi 1 giây trước khi thử key mới
-                    time.sleep(1)
-                    continue
-                else:
-                    # Lỗi khác, không retry
-                    print(f"❌ Lỗi khi dịch '{text}': {e}")
-                    return text
+                print(f"❌ Lỗi khi đọc {old_file} / {new_file}: {e}")
+                continue
+            
+            report = self.migrate_translations(old_data, new_data)
+            write_json_atomic(output_file, new_data)
+            print(f"\n📁 {os.path.basename(new_file)} -> {output_file}")
+            print(f"  ♻️  Giữ bản dịch: {report['carried']} (sửa tay: {report['manual']})")
+            print(f"  ✏️  Text đã sửa: {len(report['changed'])} | 🆕 Text mới: {len(report['new'])} | "
+                  f"⏳ Chưa dịch từ trước: {report['untranslated']} | 🗑️  Bị xóa: {report['removed']}")
+            
+            entries = new_data.get('text_entries', [])
+            for status in ('changed', 'new'):
+                for index in report[status]:
+                    item = {'file': os.path.basename(new_file), 'id': entries[index].get('id'), 'status': status,
+                            'original_text': entries[index].get('original_text', '')}
+                    if 'previous_translation' in entries[index]:
+                        item['previous_translation'] = entries[index]['previous_translation']
+                    todo.append(item)
+        
+        if todo:
+            print(f"\n📝 {len(todo)} chuỗi cần dịch:")
+            for item in todo[:20]:
+                icon = "✏️ " if item['status'] == 'changed' else "🆕"
+                print(f"  {icon} [{item['file']} #{item['id']}] {item['original_text'][:60]}")
+            if len(todo) > 20:
+                print(f"  ... và {len(todo) - 20} chuỗi khác")
+        if report_path:
+            write_json_atomic(report_path, todo)
+            print(f"💾 Đã ghi danh sách cần dịch: {report_path}")
+    
+    def carry_over_translations(self, data: Dict, previous_path: str) -> int:
+        """
+        Lấy các bản dịch đã xong từ file output của lần chạy trước (ghép theo text và hàng xóm, xem align_entries)
         
-        # Nếu đã thử hết tất cả keys trong tất cả vòng
-        print(f"❌ Đã thử {max_cycles} vòng với tất cả {len(self.api_keys)} API keys. Bỏ qua từ: '{text}'")
-        return text  # Trả về text gốc nếu không thể dịch
+        Chỉ entry có text nguồn không đổi mới được giữ; entry có original_text thay đổi sẽ được dịch lại.
+        
+        Returns:
+            Số entry lấy lại được
+        """
+        if not previous_path or not os.path.exists(previous_path):
+            return 0
+        try:
+            with open(previous_path, 'r', encoding='utf-8') as f:
+                previous_entries = json.load(f).get('text_entries', [])
+        except Exception as e:
+            print(f"⚠️  Không đọc được bản dịch cũ {previous_path}: {e}")
+            return 0
+        
+        entries = data.get('text_entries', [])
+        previous_sources = self.entry_source_texts(previous_entries)
+        matches = align_entries([entry.get('original_text', '') for entry in previous_entries],
+                                [entry.get('original_text', '') for entry in entries])
+        carried = 0
+        for index, source_text in enumerate(self.entry_source_texts(entries)):
+            previous_index, kind = matches.get(index, (None, None))
+            if kind != 'same' or previous_sources[previous_index] != source_text:
+                continue
+            previous = previous_entries[previous_index]
+            if not self.is_entry_done(previous, source_text):
+                continue
+            self.copy_translation(previous, entries[index], source_text)
+            carried += 1
+        return carried
     
-    def translate_text(self, text: str) -> tuple[str, str]:
+    def translate_text(self, text: str, budget: TranslationBudget = None) -> tuple[str, str]:
         """
         Dịch một đoạn text
         
+        Args:
+            budget: Giới hạn số request/token/thời gian cho các lần gọi AI engine
+        
         Returns:
-            tuple: (translated_text, source) - source có thể là 'dictionary', 'cache', 'gemini', 'skipped'
+            tuple: (translated_text, source) - source có thể là 'dictionary', 'cache', 'gemini', 'chatgpt', 'skipped',
+                   'failed' (AI engine không dịch được, trả về text gốc và không ghi cache)
+                   hoặc 'deferred' (hết ngân sách trước khi gửi, trả về text gốc)
         """
         if not text or not text.strip():
             return text, 'skipped'
         
         text = text.strip()
         
-        # 1. Kiểm tra từ điển trước
-        dict_translation = self.get_translation_from_dictionary(text)
-        if dict_translation:
-            return dict_translation, 'dictionary'
+        # 1-2. Kiểm tra từ điển trước, sau đó đến cache
+        known = self.lookup_translation(text)
+        if known:
+            return known
+        
+        # 3. Dịch template bằng AI engine được chọn để mọi biến thể số/tags dùng chung bản dịch.
+        # Các luồng cùng dịch một template/text dùng chung một request (single_flight)
+        template, values = make_template(text)
+        try:
+            if values:
+                template_translation = self.single_flight(
+                    template, lambda: self.translate_and_cache(template, values, budget))
+                translation = fill_template(template_translation, values)
+                if translation is not None:
+                    return translation, self.ai_engine
+                print(f"⚠️  Placeholder bị mất khi dịch template '{template}', dịch lại nguyên văn")
+            
+            translation = self.single_flight(text, lambda: self.translate_and_cache(text, budget=budget))
+        except BudgetExhaustedError:
+            return text, 'deferred'
+        except TranslationError:
+            return text, 'failed'
         
-        # 2. Kiểm tra cache
+        return translation, self.ai_engine
+    
+    def single_flight(self, key: str, call: Callable[[], str]) -> str:
+        """
+        Chạy call() cho key, gộp các lần gọi đồng thời cùng key thành một
+        
+        Luồng đầu tiên (dẫn đầu) gọi call(); các luồng đến trong lúc đó chờ và nhận cùng kết quả
+        (hoặc cùng TranslationError) và được đếm vào metric translator_coalesced_total.
+        """
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        
+        if not leader:
+            self.metrics.inc('translator_coalesced_total', engine=self.ai_engine, reason='inflight')
+            return future.result()
+        
+        try:
+            result = call()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+    
+    def translate_and_cache(self, text: str, values: List[str] = None, budget: TranslationBudget = None) -> str:
+        """
+        Dịch text (hoặc template) bằng AI engine và ghi ngay vào cache
+        
+        Args:
+            values: Giá trị của template; bản dịch chỉ được cache nếu điền lại được các giá trị này
+        """
+        # Luồng vừa tra cache trượt ngay trước khi luồng dẫn đầu trước đó ghi cache
         cached_translation = self.get_translation_from_cache(text)
         if cached_translation:
-            return cached_translation, 'cache'
+            self.metrics.inc('translator_coalesced_total', engine=self.ai_engine, reason='cached')
+            return cached_translation
+        
+        translation = self.translate_with_engine(text, budget)
+        if values is None or fill_template(translation, values) is not None:
+            if self.cache_translation(text, translation):
+                self.save_cache()  # Lưu cache ngay sau khi dịch từng từ
+        return translation
+    
+    def translate_many(self, texts: List[str], progress: Callable = None,
+                       budget: TranslationBudget = None) -> Dict[str, tuple]:
+        """
+        Dịch nhiều text, dùng batch (self.batch_size) và nhiều luồng (self.concurrency)
         
-        # 3. Dịch bằng AI engine được chọn
-        if self.ai_engine == "gemini":
-            translation = self.translate_with_gemini(text)
-        elif self.ai_engine == "chatgpt":
-            translation = self.translate_with_chatgpt(text)
-        else:
-            translation = text  # Fallback
+        Mỗi template chỉ được gửi một lần; từ điển/cache được tra trước như translate_text.
+        Request được gửi theo thứ tự của texts.
         
-        # Lưu vào cache ngay lập tức
-        self.cache[text] = translation
-        self.save_cache()  # Lưu cache ngay sau khi dịch từng từ
+        Args:
+            texts: Các text cần dịch
+            progress: Hàm gọi lại progress(done, total, text, source) sau mỗi text dịch bằng AI
+            budget: Giới hạn số request/token/thời gian; text chưa kịp gửi khi hết ngân sách có source 'deferred'
         
-        return translation, self.ai_engine
+        Returns:
+            Dict: text (đã strip) -> (translated_text, source)
+        """
+        results = {}
+        templates = {}  # template -> [(text, values)]
+        for text in texts:
+            if not text or not text.strip():
+                continue
+            text = text.strip()
+            if text in results:
+                continue
+            known = self.lookup_translation(text)
+            if known:
+                results[text] = known
+                continue
+            template, values = make_template(text)
+            templates.setdefault(template, []).append((text, values))
+            results[text] = None
+        
+        work = list(templates)
+        batch_size = max(self.batch_size, 1)
+        batches = [work[i:i + batch_size] for i in range(0, len(work), batch_size)]
+        
+        # Ngân sách bị trừ cho từng lần gửi thật (kể cả dịch lại vì placeholder, 429 và hedge);
+        # text chưa kịp dịch xong khi hết ngân sách là 'deferred'
+        def run_batch(batch):
+            translations = [None] * len(batch)
+            sent = [True] * len(batch)
+            if len(batch) > 1:
+                try:
+                    translations = self.translate_batch_with_engine(batch, budget)
+                except BudgetExhaustedError:
+                    return [(template, None, False) for template in batch]
+                except TranslationError:
+                    print(f"⚠️  Batch {len(batch)} text lỗi, dịch lại từng text")
+                    self.metrics.inc('translator_retries_total', engine=self.ai_engine, reason='batch')
+            # Text bị lỗi trong batch (hoặc batch 1 phần tử) được dịch riêng
+            for index, template in enumerate(batch):
+                if translations[index] is None:
+                    try:
+                        translations[index] = self.translate_with_engine(template, budget)
+                    except BudgetExhaustedError:
+                        sent[index] = False
+                    except TranslationError:
+                        pass
+            return list(zip(batch, translations, sent))
+        
+        done = 0
+        pending_total = sum(len(group) for group in templates.values())
+        with ThreadPoolExecutor(max_workers=max(self.concurrency, 1)) as pool:
+            futures = [pool.submit(run_batch, batch) for batch in batches]
+            for future in as_completed(futures):
+                for template, translation, sent in future.result():
+                    # Template không có giá trị (kể cả text có sẵn {0} kiểu FText) dùng nguyên bản dịch như translate_text;
+                    # chỉ cache bản dịch điền lại được các giá trị
+                    group_values = templates[template][0][1]
+                    if translation is not None and (not group_values or fill_template(translation, group_values) is not None):
+                        self.cache_translation(template, translation)
+                    for text, values in templates[template]:
+                        if not sent:
+                            results[text] = (text, 'deferred')
+                            continue
+                        if translation is None:
+                            filled = None
+                        else:
+                            filled = fill_template(translation, values) if values else translation
+                        results[text] = (filled, self.ai_engine) if filled is not None else (text, 'failed')
+                        done += 1
+                        if progress:
+                            progress(done, pending_total, text, results[text][1])
+                self.save_cache()
+        
+        if budget is not None and budget.exhausted_reason:
+            deferred = sum(1 for result in results.values() if result[1] == 'deferred')
+            print(f"⏹️  Hết ngân sách ({budget.exhausted_reason}): dừng gửi request, {deferred} text để lần chạy sau")
+        
+        return results
+    
+    def estimate_request_tokens(self, templates: List[str]) -> int:
+        """Token ước tính (vào + ra) của một request dịch các template này (dùng để giữ chỗ ngân sách)"""
+        masked = [mask_tags(template)[0] for template in templates]
+        text_tokens = sum(estimate_tokens(text) for text in masked)
+        return (estimate_tokens(self.engine.system_instruction) + text_tokens
+                + int(text_tokens * COMPLETION_TOKEN_RATIO))
     
     def translate_json_file(self, input_file: str, output_file: str = None):
         """Dịch một file JSON từ extract folder"""
@@ -538,6 +1398,12 @@ Bản dịch:"""
             print(f"❌ Lỗi khi đọc file {input_file}: {e}")
             return
         
+        # Giữ các entry đã dịch xong ở file output của lần chạy trước (nếu output là file khác)
+        if os.path.abspath(output_file) != os.path.abspath(input_file):
+            carried = self.carry_over_translations(data, output_file)
+            if carried:
+                print(f"♻️  Giữ {carried} entries đã dịch từ {output_file}")
+        
         # Dịch từng entry trong text_entries
         text_entries = data.get('text_entries', [])
         total_entries = len(text_entries)
@@ -549,52 +1415,104 @@ Bản dịch:"""
         print(f"📊 Tổng số entries: {total_entries}")
         print(f"📚 Từ điển có: {len(self.dictionary)} từ")
         print(f"💾 Cache có: {len(self.cache)} từ")
+        
+        # Journal tiến trình: kết quả của lần chạy bị dừng giữa chừng được dùng lại
+        journal_path = f"{output_file}.progress.jsonl"
+        journal = self.load_progress_journal(journal_path, input_file, total_entries)
+        if journal:
+            print(f"♻️  Tiếp tục từ journal {journal_path}: {len(journal)} entries đã xử lý")
+        journal_file = self.open_progress_journal(journal_path, input_file, total_entries, journal)
+        source_texts = self.entry_source_texts(text_entries)
+        
         print("\n🚀 Bắt đầu dịch...\n")
         
         start_time = time.time()
+        last_checkpoint = start_time
+        failed_entries = 0
+        if self.budget is not None:
+            self.budget.start()
         
-        for i, entry in enumerate(text_entries, 1):
-            # Lấy text từ translated_text thay vì original_text
-            current_text = entry.get('translated_text', '')
-            original_text = entry.get('original_text', '')
-            
-            # Bỏ qua nếu không có text
-            if not current_text or not current_text.strip():
-                self.stats['skipped'] += 1
-                continue
-            
-            # Dịch text hiện tại sang tiếng Việt
-            translated_text, source = self.translate_text(current_text)
-            entry['translated_text'] = translated_text
-            
-            # Cập nhật thống kê
-            self.stats['total'] += 1
-            if source == 'dictionary':
-                self.stats['dictionary'] += 1
-                icon = "📚"
-            elif source == 'cache':
-                self.stats['cached'] += 1
-                icon = "💾"
-            elif source == 'gemini':
-                self.stats['translated'] += 1
-                icon = "🤖"
-            else:
-                self.stats['skipped'] += 1
-                icon = "⏭️"
-            
-            # Hiển thị tiến trình
-            progress = (i / total_entries) * 100
-            display_text = current_text[:50] + ('...' if len(current_text) > 50 else '')
-            print(f"{icon} [{i:3d}/{total_entries}] ({progress:5.1f}%) {source:10s} | {display_text}")
-            
-            # Delay để tránh rate limit
-            if source in ['gemini', 'chatgpt']:
-                time.sleep(0.5)  # 0.5 giây delay cho mỗi request
+        try:
+            for i, entry in enumerate(text_entries, 1):
+                entry_id = entry.get('id', i - 1)
+                
+                # Text gốc của entry (của biến thể tiếng Anh nếu gom hàng)
+                current_text = source_texts[i - 1]
+                
+                # Entry đã xong ở lần chạy trước (entry lỗi thì dịch lại); chỉ dùng lại khi text nguồn
+                # không đổi (file có thể đã được extract lại với cùng số entries)
+                done = journal.get(entry_id)
+                if done and done['source'] != 'failed' and done.get('source_hash') == source_hash(current_text):
+                    entry['translated_text'] = done['translation']
+                    self.mark_entry(entry, current_text, done['source'])
+                    self.stats['resumed'] += 1
+                    continue
+                
+                # Bỏ qua nếu không có text
+                if not current_text or not current_text.strip():
+                    self.stats['skipped'] += 1
+                    continue
+                
+                # Entry đã dịch xong với đúng text gốc này: không tra cache, không gọi API
+                if self.is_entry_done(entry, current_text):
+                    if TRANSLATION_STATE_KEY not in entry:
+                        self.mark_entry(entry, current_text, 'legacy')
+                    self.stats['unchanged'] += 1
+                    continue
+                
+                # Dịch text hiện tại sang tiếng Việt
+                translated_text, source = self.translate_text(current_text, self.budget)
+                if source == 'deferred':
+                    # Hết ngân sách: giữ nguyên entry (không ghi journal) để lần chạy sau dịch tiếp
+                    self.stats['deferred'] += 1
+                    continue
+                entry['translated_text'] = translated_text
+                self.mark_entry(entry, current_text, source)
+                
+                journal_file.write(json.dumps({'id': entry_id, 'source_hash': source_hash(current_text),
+                                               'translation': translated_text, 'source': source},
+                                              ensure_ascii=False) + "\n")
+                journal_file.flush()
+                
+                # Cập nhật thống kê
+                self.stats['total'] += 1
+                if source == 'dictionary':
+                    self.stats['dictionary'] += 1
+                    icon = "📚"
+                elif source == 'cache':
+                    self.stats['cached'] += 1
+                    icon = "💾"
+                elif source == self.ai_engine:
+                    self.stats['translated'] += 1
+                    icon = "🤖"
+                elif source == 'failed':
+                    self.stats['failed'] += 1
+                    failed_entries += 1
+                    icon = "❌"
+                else:
+                    self.stats['skipped'] += 1
+                    icon = "⏭️"
+                
+                # Hiển thị tiến trình
+                progress = (i / total_entries) * 100
+                display_text = current_text[:50] + ('...' if len(current_text) > 50 else '')
+                print(f"{icon} [{i:3d}/{total_entries}] ({progress:5.1f}%) {source:10s} | {display_text}")
+                
+                # Định kỳ ghi file output tạm (atomic) và đẩy journal xuống đĩa
+                now = time.time()
+                if now - last_checkpoint >= CHECKPOINT_INTERVAL_SECONDS:
+                    os.fsync(journal_file.fileno())
+                    write_json_atomic(output_file, data)
+                    last_checkpoint = now
+        finally:
+            journal_file.close()
+        
+        if self.budget is not None and self.budget.exhausted_reason:
+            print(f"⏹️  Hết ngân sách ({self.budget.exhausted_reason}): {self.stats['deferred']} entries để lần chạy sau")
         
         # Lưu file đã dịch
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            write_json_atomic(output_file, data)
             print(f"\n✅ Đã lưu file dịch: {output_file}")
         except Exception as e:
             print(f"❌ Lỗi khi lưu file: {e}")
@@ -603,18 +1521,287 @@ Bản dịch:"""
         # Lưu cache
         self.save_cache()
         
+        # Giữ journal nếu còn entry lỗi để lần chạy sau chỉ dịch lại các entry đó
+        if failed_entries:
+            print(f"⚠️  {failed_entries} entries dịch lỗi vẫn giữ text gốc, chạy lại để dịch tiếp (journal: {journal_path})")
+        else:
+            os.remove(journal_path)
+        
         # Hiển thị thống kê
         elapsed_time = time.time() - start_time
         self.print_statistics(elapsed_time)
     
-    def batch_translate_folder(self, folder_path: str = "extract"):
-        """Dịch tất cả file JSON trong folder extract"""
+    def load_progress_journal(self, journal_path: str, input_file: str, total_entries: int) -> Dict:
+        """
+        Đọc journal tiến trình của lần chạy trước
+        
+        Returns:
+            Dict: entry id -> {'source_hash', 'translation', 'source'}; rỗng nếu không có journal
+                  hoặc journal thuộc về file đầu vào/engine khác
+        """
+        if not os.path.exists(journal_path):
+            return {}
+        
+        done = {}
+        try:
+            with open(journal_path, 'r', encoding='utf-8') as f:
+                header = json.loads(f.readline() or '{}')
+                if header.get('input_file') != os.path.abspath(input_file) or header.get('total_entries') != total_entries \
+                        or header.get('engine', self.ai_engine) != self.ai_engine:
+                    print(f"⚠️  Journal {journal_path} không khớp với {input_file}, bắt đầu lại từ đầu")
+                    return {}
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Dòng cuối bị ghi dở khi chương trình dừng
+                    done[record['id']] = record
+        except Exception as e:
+            print(f"⚠️  Không thể đọc journal {journal_path}: {e}")
+            return {}
+        return done
+    
+    def open_progress_journal(self, journal_path: str, input_file: str, total_entries: int, done: Dict):
+        """
+        Mở journal để ghi tiếp: viết lại header và các bản ghi còn hợp lệ (bỏ dòng ghi dở
+        của lần chạy trước) rồi trả về file handle để append
+        """
+        journal_file = open(journal_path, 'w', encoding='utf-8')
+        journal_file.write(json.dumps({'input_file': os.path.abspath(input_file), 'total_entries': total_entries,
+                                       'engine': self.ai_engine}) + "\n")
+        for record in done.values():
+            journal_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+        return journal_file
+    
+    def plan_batch_translation(self, folder_path: str = "extract", output_folder: str = "translated") -> Dict:
+        """
+        Lập kế hoạch dịch cho toàn bộ file JSON trong folder trước khi gọi API
+        
+        Gom tất cả text của mọi file, tra từ điển và cache một lần, chỉ giữ lại
+        các chuỗi duy nhất còn phải dịch bằng AI. Entry đã dịch xong ở output_folder (lần chạy trước)
+        được giữ nguyên và không tính vào số chuỗi cần dịch.
+        
+        Returns:
+            Dict: documents (dữ liệu từng file), resolved (text -> (bản dịch, nguồn)),
+                  pending (các chuỗi duy nhất cần gọi API, theo thứ tự xuất hiện),
+                  occurrences (số lần xuất hiện của từng chuỗi) và các con số tổng hợp
+        """
+        json_files = sorted(f for f in os.listdir(folder_path) if f.endswith('.json'))
+        return self.plan_translation([os.path.join(folder_path, f) for f in json_files], output_folder)
+    
+    def plan_translation(self, input_paths: List[str], output_folder: str = None) -> Dict:
+        """Lập kế hoạch dịch cho danh sách file JSON (xem plan_batch_translation)"""
+        documents = {}
+        for input_path in input_paths:
+            try:
+                with open(input_path, 'r', encoding='utf-8') as f:
+                    documents[os.path.basename(input_path)] = json.load(f)
+            except Exception as e:
+                print(f"❌ Lỗi khi đọc file {input_path}: {e}")
+        return self.plan_documents(documents, output_folder)
+    
+    def plan_documents(self, documents: Dict[str, Dict], output_folder: str = None) -> Dict:
+        """
+        Lập kế hoạch dịch cho các tài liệu đã có trong bộ nhớ (tên file JSON -> dữ liệu)
+        
+        Args:
+            output_folder: Folder chứa bản dịch của lần chạy trước để giữ lại entry đã dịch xong
+        """
+        resolved = {}
+        pending = {}
+        occurrences = {}
+        occurrence_files = {}  # text -> {json_file: số lần xuất hiện}
+        total_entries = 0
+        unchanged = 0
+        
+        for json_file, data in documents.items():
+            if output_folder:
+                self.carry_over_translations(data, os.path.join(output_folder, json_file))
+            
+            entries = data.get('text_entries', [])
+            for entry, current_text in zip(entries, self.entry_source_texts(entries)):
+                if not current_text or not current_text.strip():
+                    continue
+                
+                total_entries += 1
+                if self.is_entry_done(entry, current_text):
+                    unchanged += 1
+                    continue
+                
+                text = current_text.strip()
+                occurrences[text] = occurrences.get(text, 0) + 1
+                files = occurrence_files.setdefault(text, {})
+                files[json_file] = files.get(json_file, 0) + 1
+                if text in resolved or text in pending:
+                    continue
+                
+                known = self.lookup_translation(text)
+                if known:
+                    resolved[text] = known
+                else:
+                    pending[text] = True
+        
+        return {
+            'documents': documents,
+            'resolved': resolved,
+            'pending': list(pending),
+            'occurrences': occurrences,
+            'occurrence_files': occurrence_files,
+            'total_entries': total_entries,
+            'unchanged_entries': unchanged,
+            'unique_texts': len(occurrences),
+            # Các chuỗi cùng template chỉ tốn một request, các chuỗi sau lấy từ cache template
+            'projected_api_calls': len({make_template(text)[0] for text in pending})
+        }
+    
+    def estimate_translation_cost(self, plan: Dict, concurrency: int = 1, key_count: int = None,
+                                  requests_per_minute: float = None, avg_latency: float = 1.0) -> Dict:
+        """
+        Ước tính số request, token và thời gian cho một kế hoạch dịch mà không gọi API
+        
+        Args:
+            plan: Kết quả của plan_translation/plan_batch_translation
+            concurrency: Số request chạy song song
+            key_count: Số API key (mặc định: số key đang có)
+            requests_per_minute: Quota mỗi key (mặc định theo engine)
+            avg_latency: Thời gian trung bình một request (giây)
+        
+        Returns:
+            Dict: totals, by_file, by_language và projected_seconds
+        """
+        key_count = key_count or max(len(self.api_keys), 1)
+        requests_per_minute = requests_per_minute or self.engine_class.default_requests_per_minute
+        
+        def new_bucket():
+            return {'entries': 0, 'unchanged': 0, 'dictionary': 0, 'cache': 0, 'skipped': 0, 'duplicate': 0,
+                    'api_calls': 0, 'prompt_tokens': 0, 'prefix_tokens': 0, 'completion_tokens': 0}
+        
+        # Phần hướng dẫn cố định (system instruction) giống nhau ở mọi request, API có thể tính từ cache
+        prefix_tokens = estimate_tokens(self.engine.system_instruction) if self.engine.system_instruction else 0
+        
+        totals = new_bucket()
+        by_file = {}
+        by_language = {}
+        charged_templates = set()
+        
+        for json_file, data in plan['documents'].items():
+            entries = data.get('text_entries', [])
+            for entry, current_text in zip(entries, self.entry_source_texts(entries)):
+                if not current_text or not current_text.strip():
+                    continue
+                
+                text = current_text.strip()
+                buckets = (totals,
+                           by_file.setdefault(json_file, new_bucket()),
+                           by_language.setdefault(entry.get('language', 'unknown'), new_bucket()))
+                
+                if self.is_entry_done(entry, current_text):
+                    kind, usage = 'unchanged', None
+                elif text in plan['resolved']:
+                    kind = plan['resolved'][text][1]
+                    usage = None
+                else:
+                    # Request được tính cho lần xuất hiện đầu tiên của template
+                    template, _ = make_template(text)
+                    if template in charged_templates:
+                        kind, usage = 'duplicate', None
+                    else:
+                        charged_templates.add(template)
+                        masked_text, _ = mask_tags(template)
+                        kind = 'api_calls'
+                        usage = (estimate_tokens(self.build_prompt(masked_text)),
+                                 int(estimate_tokens(masked_text) * COMPLETION_TOKEN_RATIO),
+                                 prefix_tokens)
+                
+                for bucket in buckets:
+                    bucket['entries'] += 1
+                    bucket[kind] += 1
+                    if usage:
+                        bucket['prompt_tokens'] += usage[0]
+                        bucket['completion_tokens'] += usage[1]
+                        bucket['prefix_tokens'] += usage[2]
+        
+        # Thời gian bị giới hạn bởi độ trễ (chia cho số luồng) hoặc bởi quota của các key
+        calls = totals['api_calls']
+        latency_bound = calls * avg_latency / max(concurrency, 1)
+        quota_bound = calls / (key_count * requests_per_minute / 60)
+        
+        return {
+            'totals': totals,
+            'by_file': by_file,
+            'by_language': by_language,
+            'concurrency': concurrency,
+            'key_count': key_count,
+            'requests_per_minute': requests_per_minute,
+            'avg_latency': avg_latency,
+            'latency_bound_seconds': latency_bound,
+            'quota_bound_seconds': quota_bound,
+            'projected_seconds': max(latency_bound, quota_bound)
+        }
+    
+    def print_cost_report(self, cost: Dict):
+        """In báo cáo ước tính chi phí theo file và theo ngôn ngữ"""
+        def print_table(title, rows):
+            print(f"\n{title}")
+            print(f"  {'':28s} {'entries':>8s} {'từ điển':>8s} {'cache':>8s} {'trùng':>8s} {'API':>8s} {'token vào':>10s} {'token ra':>10s}")
+            for name, b in sorted(rows.items(), key=lambda item: -item[1]['api_calls']):
+                print(f"  {name[:28]:28s} {b['entries']:8d} {b['dictionary']:8d} {b['cache']:8d} {b['duplicate']:8d} "
+                      f"{b['api_calls']:8d} {b['prompt_tokens']:10d} {b['completion_tokens']:10d}")
+        
+        totals = cost['totals']
+        print("\n" + "="*60)
+        print(f"💰 ƯỚC TÍNH CHI PHÍ DỊCH ({self.ai_engine.upper()})")
+        print("="*60)
+        print(f"📝 Tổng số entries: {totals['entries']} (đã dịch từ trước: {totals['unchanged']})")
+        print(f"📚 Từ điển: {totals['dictionary']} | 💾 Cache: {totals['cache']} | ⏭️  Bỏ qua: {totals['skipped']} | 🔁 Trùng: {totals['duplicate']}")
+        print(f"🤖 Số request API: {totals['api_calls']}")
+        print(f"🔤 Token vào: ~{totals['prompt_tokens']:,} | Token ra: ~{totals['completion_tokens']:,}")
+        if totals['prefix_tokens']:
+            print(f"   trong đó ~{totals['prefix_tokens']:,} token là hướng dẫn cố định (system instruction), "
+                  f"~{totals['prompt_tokens'] - totals['prefix_tokens']:,} token là nội dung cần dịch")
+        print(f"🔑 {cost['key_count']} key × {cost['requests_per_minute']:g} request/phút, {cost['concurrency']} luồng, ~{cost['avg_latency']:g}s/request")
+        print(f"⏱️  Thời gian dự kiến: {cost['projected_seconds']/60:.1f} phút "
+              f"(độ trễ: {cost['latency_bound_seconds']/60:.1f} phút, quota: {cost['quota_bound_seconds']/60:.1f} phút)")
+        print_table("📁 Theo file:", cost['by_file'])
+        print_table("🌐 Theo ngôn ngữ:", cost['by_language'])
+        print("="*60)
+    
+    def print_plan(self, plan: Dict):
+        """In báo cáo kế hoạch dịch batch"""
+        dictionary_hits = sum(1 for _, source in plan['resolved'].values() if source == 'dictionary')
+        cache_hits = len(plan['resolved']) - dictionary_hits
+        
+        print("\n" + "="*60)
+        print("🗺️  KẾ HOẠCH DỊCH BATCH")
+        print("="*60)
+        print(f"📁 Số file: {len(plan['documents'])}")
+        print(f"📝 Tổng số entries: {plan['total_entries']}")
+        print(f"✅ Đã dịch từ trước (giữ nguyên): {plan['unchanged_entries']}")
+        print(f"🔤 Chuỗi duy nhất cần dịch: {plan['unique_texts']}")
+        print(f"📚 Có sẵn trong từ điển: {dictionary_hits}")
+        print(f"💾 Có sẵn trong cache: {cache_hits}")
+        print(f"🤖 Số lần gọi {self.ai_engine.upper()} dự kiến: {plan['projected_api_calls']}")
+        print("="*60)
+    
+    def batch_translate_folder(self, folder_path: str = "extract", dry_run: bool = False):
+        """
+        Dịch tất cả file JSON trong folder extract
+        
+        Mỗi chuỗi duy nhất chỉ được dịch một lần cho cả batch, sau đó kết quả
+        được điền vào mọi file và mỗi file chỉ được ghi ra đĩa một lần.
+        
+        Args:
+            folder_path: Folder chứa các file JSON đã extract
+            dry_run: Chỉ in kế hoạch (số lần gọi API dự kiến), không dịch
+        """
         if not os.path.exists(folder_path):
             print(f"❌ Không tìm thấy folder: {folder_path}")
             return
         
         # Tìm tất cả file JSON trong folder extract
-        json_files = [f for f in os.listdir(folder_path) if f.endswith('.json')]
+        json_files = sorted(f for f in os.listdir(folder_path) if f.endswith('.json'))
         
         if not json_files:
             print(f"❌ Không tìm thấy file JSON nào trong folder: {folder_path}")
@@ -624,33 +1811,198 @@ Bản dịch:"""
         for file in json_files:
             print(f"  - {file}")
         
+        # Lập kế hoạch trước khi tốn bất kỳ request nào
+        plan = self.plan_batch_translation(folder_path)
+        self.print_plan(plan)
+        
+        if dry_run:
+            print("ℹ️  Dry run: không gọi API, không ghi file")
+            return
+        
         # Tạo folder output
         output_folder = "translated"
         if not os.path.exists(output_folder):
             os.makedirs(output_folder)
             print(f"📁 Đã tạo folder: {output_folder}")
         
-        # Reset thống kê cho batch
+        start_time = time.time()
+        self.translate_plan(plan)
+        
+        # Ghi mỗi file ra đĩa một lần
+        for json_file, data in plan['documents'].items():
+            output_path = os.path.join(output_folder, json_file)
+            try:
+                write_json_atomic(output_path, data)
+                print(f"✅ Đã lưu file dịch: {output_path}")
+            except Exception as e:
+                print(f"❌ Lỗi khi lưu file {output_path}: {e}")
+        
+        # Lưu cache
+        self.save_cache()
+        
+        # Hiển thị thống kê tổng
+        print("\n🎉 HOÀN THÀNH DỊCH BATCH!")
+        print(f"📁 Đã xử lý {len(plan['documents'])} file")
+        self.print_statistics(time.time() - start_time)
+    
+    def translate_plan(self, plan: Dict):
+        """
+        Dịch các chuỗi còn thiếu của một kế hoạch rồi điền bản dịch vào entries của mọi tài liệu (trong bộ nhớ)
+        
+        Thống kê (self.stats) được tính lại cho lần dịch này; không ghi file nào ra đĩa.
+        """
         self.stats = {
             'total': 0,
             'translated': 0,
             'cached': 0,
             'dictionary': 0,
-            'skipped': 0
+            'skipped': 0,
+            'failed': 0,
+            'unchanged': 0,
+            'resumed': 0,
+            'deferred': 0
         }
         
-        # Dịch từng file
-        for json_file in json_files:
-            input_path = os.path.join(folder_path, json_file)
-            output_path = os.path.join(output_folder, json_file.replace('.json', '.json'))
-            
-            self.translate_json_file(input_path, output_path)
-            print("\n" + "="*80 + "\n")
+        # Bước 1: dịch tập chuỗi duy nhất, mỗi chuỗi đúng một lần, chuỗi có giá trị cao gửi trước
+        results = dict(plan['resolved'])
+        pending = prioritize_texts(plan['pending'], plan['occurrence_files'], self.priority, self.file_weights,
+                                   group_key=lambda text: make_template(text)[0])
+        if pending:
+            print(f"\n🚀 Bắt đầu dịch {len(pending)} chuỗi duy nhất "
+                  f"({self.concurrency} luồng, {self.batch_size} text/request, ưu tiên: {self.priority})...\n")
+        if self.budget is not None:
+            self.budget.start()
+        
+        def show_progress(done, total, text, source):
+            progress = (done / total) * 100
+            display_text = text[:50] + ('...' if len(text) > 50 else '')
+            icon = "❌" if source == 'failed' else "🤖"
+            print(f"{icon} [{done:3d}/{total}] ({progress:5.1f}%) {source:10s} | {display_text}")
+        
+        results.update(self.translate_many(pending, progress=show_progress, budget=self.budget))
+        
+        # Bước 2: điền kết quả vào từng tài liệu
+        api_texts_counted = set()
+        for data in plan['documents'].values():
+            entries = data.get('text_entries', [])
+            for entry, current_text in zip(entries, self.entry_source_texts(entries)):
+                if not current_text or not current_text.strip():
+                    self.stats['skipped'] += 1
+                    continue
+                
+                if self.is_entry_done(entry, current_text):
+                    if TRANSLATION_STATE_KEY not in entry:
+                        self.mark_entry(entry, current_text, 'legacy')
+                    self.stats['unchanged'] += 1
+                    continue
+                
+                text = current_text.strip()
+                translated_text, source = results[text]
+                if source == 'deferred':
+                    # Chưa dịch vì hết ngân sách: giữ nguyên entry để lần chạy sau dịch tiếp
+                    self.stats['deferred'] += 1
+                    continue
+                entry['translated_text'] = translated_text
+                self.mark_entry(entry, current_text, source)
+                
+                # Các lần xuất hiện sau của chuỗi vừa dịch được tính như lấy từ cache
+                if source == self.ai_engine and text in api_texts_counted:
+                    source = 'cache'
+                api_texts_counted.add(text)
+                
+                self.stats['total'] += 1
+                if source == 'dictionary':
+                    self.stats['dictionary'] += 1
+                elif source == 'cache':
+                    self.stats['cached'] += 1
+                elif source == self.ai_engine:
+                    self.stats['translated'] += 1
+                elif source == 'failed':
+                    self.stats['failed'] += 1
+                else:
+                    self.stats['skipped'] += 1
+    
+    def run_pipeline(self, uasset_paths: List[str], import_folder: str = "import", json_folder: str = None,
+                     previous_folder: str = "translated", dry_run: bool = False):
+        """
+        Extract → dịch → import trong một tiến trình, dữ liệu đi thẳng từ extractor sang rebuild trong bộ nhớ
         
-        # Hiển thị thống kê tổng
-        print("\n🎉 HOÀN THÀNH DỊCH BATCH!")
-        print(f"📁 Đã xử lý {len(json_files)} file")
-        self.print_statistics(0)  # Không tính thời gian cho batch
+        Args:
+            uasset_paths: Các file .uasset gốc
+            import_folder: Folder ghi file .uasset đã dịch
+            json_folder: Nếu có, ghi thêm file JSON đã dịch vào folder này (tùy chọn, không cần cho import)
+            previous_folder: Folder bản dịch của lần chạy trước (giữ lại entry đã dịch/sửa tay)
+            dry_run: Chỉ extract và in kế hoạch dịch
+        """
+        timings = {}
+        started = time.perf_counter()
+        
+        # Bước 1: extract, giữ bytes gốc của từng file trong extractor để rebuild
+        extractors = {}
+        documents = {}
+        for uasset_path in uasset_paths:
+            extractor = UAssetTextExtractor()
+            data = extractor.extract_texts(uasset_path)
+            if not data.get('text_entries'):
+                print(f"⚠️  Không tìm thấy text có ý nghĩa trong {uasset_path}")
+                continue
+            json_file = os.path.basename(uasset_path).replace('.uasset', '_texts.json')
+            extractors[json_file] = extractor
+            documents[json_file] = data
+        timings['extract'] = time.perf_counter() - started
+        
+        if not documents:
+            print("❌ Không có file .uasset nào để xử lý")
+            return
+        
+        # Bước 2: tra từ điển/cache và dịch phần còn thiếu
+        stage_started = time.perf_counter()
+        plan = self.plan_documents(documents, previous_folder if previous_folder and os.path.isdir(previous_folder) else None)
+        self.print_plan(plan)
+        if dry_run:
+            print("ℹ️  Dry run: không gọi API, không ghi file")
+            return
+        self.translate_plan(plan)
+        self.save_cache()
+        timings['translate'] = time.perf_counter() - stage_started
+        
+        # Bước 3: rebuild từng file .uasset (và ghi JSON nếu được yêu cầu)
+        stage_started = time.perf_counter()
+        os.makedirs(import_folder, exist_ok=True)
+        if json_folder:
+            os.makedirs(json_folder, exist_ok=True)
+        for json_file, data in documents.items():
+            extractor = extractors[json_file]
+            new_data, processed_entries = extractor.build_uasset_data(data)
+            output_path = os.path.join(import_folder, os.path.basename(data['file_info']['original_file']))
+            try:
+                with open(output_path, 'wb') as f:
+                    f.write(new_data)
+                print(f"✅ Đã tạo {output_path} ({len(processed_entries)} entries đã thay, "
+                      f"{len(extractor.original_data):,} -> {len(new_data):,} bytes)")
+                for note in extractor.relocation_notes:
+                    print(f"   ⚠️ {note}")
+            except Exception as e:
+                print(f"❌ Lỗi khi ghi file {output_path}: {e}")
+            if json_folder:
+                try:
+                    write_json_atomic(os.path.join(json_folder, json_file), data)
+                except Exception as e:
+                    print(f"❌ Lỗi khi lưu file JSON {json_file}: {e}")
+        timings['import'] = time.perf_counter() - stage_started
+        
+        print("\n🎉 HOÀN THÀNH PIPELINE!")
+        print(f"📁 Đã xử lý {len(documents)} file")
+        print("⏱️  " + ", ".join(f"{stage}: {seconds:.2f}s" for stage, seconds in timings.items()))
+        self.print_statistics(time.perf_counter() - started)
+    
+    def token_usage(self) -> Dict[str, int]:
+        """Tổng token thực tế (theo usage metadata của API) của mọi engine trong pool"""
+        total = {'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
+        for engine in list(self.engines.values()):
+            for name in total:
+                total[name] += engine.usage.get(name, 0)
+        return total
     
     def print_statistics(self, elapsed_time: float):
         """In thống kê"""
@@ -663,27 +2015,138 @@ Bản dịch:"""
         print(f"💾 Lấy từ cache: {self.stats['cached']}")
         print(f"📚 Lấy từ từ điển: {self.stats['dictionary']}")
         print(f"⏭️  Bỏ qua: {self.stats['skipped']}")
+        if self.stats.get('unchanged'):
+            print(f"✅ Đã dịch từ trước (không gửi lại): {self.stats['unchanged']}")
+        if self.stats.get('resumed'):
+            print(f"♻️  Lấy lại từ journal của lần chạy bị dừng: {self.stats['resumed']}")
+        if self.stats.get('failed'):
+            print(f"❌ Dịch lỗi (giữ text gốc): {self.stats['failed']}")
+        if self.stats.get('deferred'):
+            print(f"⏹️  Chưa dịch do hết ngân sách: {self.stats['deferred']}")
+        coalesced = sum(self.metrics.counters.get('translator_coalesced_total', {}).values())
+        if coalesced:
+            print(f"🔗 Request trùng được gộp (không gọi API): {coalesced:g}")
         
         if self.stats['translated'] > 0:
             avg_time = elapsed_time / self.stats['translated']
             print(f"⚡ Trung bình: {avg_time:.1f}s/text")
         
+        latencies = [histogram for key, histogram in self.metrics.histograms.get('translator_request_seconds', {}).items()
+                     if ('outcome', 'success') in key]
+        if latencies:
+            print(f"📶 Độ trễ request: p50 ≤ {latencies[0].quantile(0.5):g}s, p95 ≤ {latencies[0].quantile(0.95):g}s, "
+                  f"p99 ≤ {latencies[0].quantile(0.99):g}s")
+        
+        usage = self.token_usage()
+        if usage['prompt_tokens']:
+            print(f"🔤 Token vào: {usage['prompt_tokens']:,} (từ cache: {usage['cached_tokens']:,}, "
+                  f"mới: {usage['prompt_tokens'] - usage['cached_tokens']:,}) | Token ra: {usage['completion_tokens']:,}")
+        
+        rates = self.rate_controller.snapshot()
+        if rates['engine_rpm'] and (self.stats['translated'] or rates['rate_limited']):
+            print(f"🚦 Tốc độ hiện tại: {rates['engine_rpm']:.0f} request/phút, {rates['rate_limited']} lần bị rate limit")
+            for key in rates['keys']:
+                print(f"   🔑 Key #{key['key']}: {key['rpm']:.0f} request/phút "
+                      f"({key['successes']} thành công, {key['rate_limited']} lần 429)")
+        
         print("="*60)
 
 def main():
     parser = argparse.ArgumentParser(description='Auto Translator using Google Gemini API or ChatGPT API')
-    parser.add_argument('action', choices=['translate', 'batch'], 
-                       help='Hành động: translate (dịch 1 file) hoặc batch (dịch tất cả)')
-    parser.add_argument('input_file', nargs='?', help='File JSON cần dịch (cho action translate)')
-    parser.add_argument('-o', '--output', help='File đầu ra')
+    parser.add_argument('action', choices=['translate', 'batch', 'plan', 'pipeline', 'migrate', 'check-glossary', 'maintain'], 
+                       help='Hành động: translate (dịch 1 file), batch (dịch tất cả), plan (ước tính chi phí, không gọi API), '
+                            'pipeline (extract → dịch → import file .uasset trong một lệnh), '
+                            'migrate (chuyển bản dịch cũ sang bản extract mới sau khi game cập nhật), '
+                            'check-glossary (kiểm tra thuật ngữ) hoặc maintain (quét cache/từ điển để bảo vệ command tags)')
+    parser.add_argument('input_file', nargs='?', help='File JSON cần dịch (cho action translate, check-glossary), '
+                                                      'file hoặc folder cho action plan (mặc định: extract), '
+                                                      'file .uasset hoặc folder cho action pipeline (mặc định: . và original/), '
+                                                      'file/folder đã dịch của bản game cũ cho action migrate (mặc định: translated)')
+    parser.add_argument('-o', '--output', help='File đầu ra (action pipeline: folder ghi .uasset, mặc định import; '
+                                               'action migrate: folder kết quả, mặc định migrated)')
+    parser.add_argument('--json-dir', help='Action pipeline: ghi thêm file JSON đã dịch vào folder này')
+    parser.add_argument('--new', default='extract',
+                       help='Action migrate: file/folder JSON extract từ bản game mới (mặc định: extract)')
+    parser.add_argument('--report', help='Action migrate: ghi danh sách chuỗi mới/đã sửa cần dịch ra file JSON')
     parser.add_argument('--api-key', help='API key cho AI engine được chọn')
-    parser.add_argument('--ai-engine', choices=['gemini', 'chatgpt'], default='gemini',
-                       help='AI engine để dịch: gemini (mặc định) hoặc chatgpt')
+    parser.add_argument('--ai-engine', choices=list(ENGINES), default='gemini',
+                       help='AI engine để dịch: gemini (mặc định), chatgpt hoặc stub (giả lập offline, không gọi mạng)')
+    parser.add_argument('--dry-run', action='store_true',
+                       help='Chỉ in kế hoạch dịch batch (số lần gọi API dự kiến), không dịch')
+    parser.add_argument('--concurrency', type=int, default=1,
+                       help='Số request chạy song song (batch; action plan dùng để ước tính thời gian)')
+    parser.add_argument('--batch-size', type=int, default=1,
+                       help='Số text gửi trong một request (batch)')
+    parser.add_argument('--group-rows', action='store_true',
+                       help='Gom các biến thể ngôn ngữ của cùng một hàng, chỉ dịch bản tiếng Anh rồi ghi cho cả hàng')
+    parser.add_argument('--stub-latency', type=float, default=0.0, help='Engine stub: latency mỗi request (giây)')
+    parser.add_argument('--stub-failure-rate', type=float, default=0.0, help='Engine stub: tỉ lệ request lỗi')
+    parser.add_argument('--stub-429-rate', type=float, default=0.0, help='Engine stub: tỉ lệ request bị rate limit')
+    parser.add_argument('--keys', type=int, help='Số API key để ước tính (action plan, mặc định: số key hiện có)')
+    parser.add_argument('--rpm', type=float, help='Quota request/phút của mỗi key (action plan; khi dịch là tốc độ khởi đầu)')
+    parser.add_argument('--latency', type=float, default=1.0, help='Thời gian trung bình mỗi request, giây (action plan)')
+    parser.add_argument('--hedge-after', type=float,
+                       help='Gửi thêm một request tới key/engine khác nếu request chậm hơn số giây này')
+    parser.add_argument('--hedge-percentile', type=float,
+                       help='Thời điểm hedge theo percentile độ trễ đã đo, ví dụ 0.95 (chưa đủ mẫu thì dùng --hedge-after)')
+    parser.add_argument('--hedge-engine', choices=list(ENGINES),
+                       help='Engine nhận request hedge (mặc định: key khác của cùng engine)')
+    parser.add_argument('--hedge-max-fraction', type=float, default=HEDGE_MAX_FRACTION,
+                       help=f'Số hedge tối đa so với số request chính (mặc định: {HEDGE_MAX_FRACTION})')
+    parser.add_argument('--deadline', type=float, help='Thời gian tối đa (giây) cho mỗi text/batch')
+    parser.add_argument('--priority', choices=PRIORITY_MODES, default='frequency',
+                       help='Thứ tự dịch (batch): frequency (chuỗi xuất hiện nhiều trước), short (chuỗi ngắn/UI trước) '
+                            'hoặc file (file có --file-weight cao trước)')
+    parser.add_argument('--file-weight', action='append', default=[], metavar='FILE=WEIGHT',
+                       help='Trọng số ưu tiên của một file, ví dụ GDSMenuText=3 (dùng nhiều lần, mặc định 1)')
+    parser.add_argument('--max-calls', type=int,
+                       help='Số request tối đa tới AI engine, tính cả lần thử lại và hedge (translate/batch/pipeline)')
+    parser.add_argument('--max-tokens', type=int, help='Số token vào + ra tối đa (translate/batch/pipeline)')
+    parser.add_argument('--max-minutes', type=float, help='Thời gian dịch tối đa, phút (translate/batch/pipeline)')
+    parser.add_argument('--metrics-file', help='Ghi metrics định kỳ ra file (.prom/.txt: Prometheus text, còn lại: JSON)')
+    parser.add_argument('--metrics-interval', type=float, default=10.0, help='Chu kỳ ghi metrics (giây)')
     
     args = parser.parse_args()
     
+    exporter = None
     try:
-        translator = AutoTranslator(api_key=args.api_key, ai_engine=args.ai_engine)
+        engine_options = {}
+        if args.ai_engine == 'stub':
+            engine_options = {'latency': args.stub_latency, 'failure_rate': args.stub_failure_rate,
+                              'rate_limit_rate': args.stub_429_rate}
+        if args.deadline:
+            engine_options['timeout'] = args.deadline
+        
+        translator = AutoTranslator(api_key=args.api_key, ai_engine=args.ai_engine,
+                                    require_api_key=args.action not in ['plan', 'migrate', 'maintain', 'check-glossary'],
+                                    engine_options=engine_options)
+        translator.concurrency = args.concurrency
+        translator.batch_size = args.batch_size
+        translator.group_rows = args.group_rows
+        translator.priority = args.priority
+        for item in args.file_weight:
+            name, _, weight = item.partition('=')
+            try:
+                translator.file_weights[name.strip()] = float(weight)
+            except ValueError:
+                print(f"❌ --file-weight không hợp lệ: {item} (cần dạng FILE=WEIGHT)")
+                return
+        if args.max_calls is not None or args.max_tokens is not None or args.max_minutes is not None:
+            translator.budget = TranslationBudget(args.max_calls, args.max_tokens,
+                                                  args.max_minutes * 60 if args.max_minutes is not None else None)
+        translator.hedge_after = args.hedge_after
+        translator.hedge_percentile = args.hedge_percentile
+        translator.hedge_max_fraction = args.hedge_max_fraction
+        translator.request_deadline = args.deadline
+        if args.hedge_engine:
+            translator.setup_hedge_engine(args.hedge_engine)
+            if translator.hedge_after is None and translator.hedge_percentile is None:
+                translator.hedge_after = HEDGE_DEFAULT_DELAY
+        if args.metrics_file:
+            exporter = MetricsExporter(translator.metrics, args.metrics_file, args.metrics_interval).start()
+        if args.rpm:
+            # Tốc độ khởi đầu theo quota khai báo, sau đó AIMD tự điều chỉnh
+            translator.rate_controller = RateController(translator.api_keys, args.rpm)
         
         if args.action == 'translate':
             if not args.input_file:
@@ -693,7 +2156,58 @@ def main():
             translator.translate_json_file(args.input_file, args.output)
             
         elif args.action == 'batch':
-            translator.batch_translate_folder()
+            translator.batch_translate_folder(dry_run=args.dry_run)
+            
+        elif args.action == 'migrate':
+            old_path = args.input_file or "translated"
+            if not os.path.exists(old_path) or not os.path.exists(args.new):
+                print(f"❌ Không tìm thấy: {old_path if not os.path.exists(old_path) else args.new}")
+                return
+            
+            translator.migrate(old_path, args.new, args.output or "migrated", args.report)
+            
+        elif args.action == 'pipeline':
+            target = args.input_file or "."
+            if os.path.isdir(target):
+                uasset_paths = find_uasset_files(target)
+            elif target.endswith('.uasset') and os.path.exists(target):
+                uasset_paths = [target]
+            else:
+                print(f"❌ Không tìm thấy file .uasset: {target}")
+                return
+            
+            translator.run_pipeline(uasset_paths, import_folder=args.output or "import", json_folder=args.json_dir,
+                                    dry_run=args.dry_run)
+            
+        elif args.action == 'plan':
+            target = args.input_file or "extract"
+            if os.path.isdir(target):
+                input_paths = [os.path.join(target, f) for f in sorted(os.listdir(target)) if f.endswith('.json')]
+            elif os.path.exists(target):
+                input_paths = [target]
+            else:
+                print(f"❌ Không tìm thấy: {target}")
+                return
+            
+            plan = translator.plan_translation(input_paths, "translated" if os.path.isdir("translated") else None)
+            cost = translator.estimate_translation_cost(plan, concurrency=args.concurrency, key_count=args.keys,
+                                                        requests_per_minute=args.rpm, avg_latency=args.latency)
+            translator.print_cost_report(cost)
+            
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    json.dump(cost, f, ensure_ascii=False, indent=2)
+                print(f"✅ Đã lưu báo cáo: {args.output}")
+            
+        elif args.action == 'check-glossary':
+            if not args.input_file:
+                print("❌ Cần chỉ định file JSON cho action 'check-glossary'")
+                return
+            
+            translator.check_glossary_consistency(args.input_file)
+            
+        elif args.action == 'maintain':
+            translator.initialize_command_tag_protection()
             
     except ValueError as e:
         print(f"❌ {e}")
@@ -703,6 +2217,10 @@ def main():
         print("   hoặc dùng --api-key your-api-key-here --ai-engine [gemini|chatgpt]")
     except Exception as e:
         print(f"❌ Lỗi: {e}")
+    finally:
+        if exporter:
+            exporter.stop()
+            print(f"📈 Đã ghi metrics: {args.metrics_file}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
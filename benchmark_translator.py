@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Translator Benchmark
+Đo throughput và độ trễ của AutoTranslator với backend giả lập (quota theo key, 429 theo đợt, latency ngẫu nhiên)
+"""
+
+import os
+import io
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import contextlib
+from typing import Dict, List
+
+from auto_translator import AutoTranslator
+from translation_engines import TranslationEngine, RateLimitError, register_engine
+
+class SimulatedBackend:
+    """
+    Backend giả lập dùng chung cho mọi key
+
+    Mô phỏng:
+        - quota requests_per_minute cho mỗi key (cửa sổ trượt 60 giây)
+        - đợt 429: mỗi request có xác suất burst_probability mở ra một khoảng
+          burst_seconds trong đó key đó luôn trả 429
+        - latency theo phân phối log-normal (median latency_median, độ lệch latency_sigma)
+        - lỗi fatal với xác suất failure_rate
+    """
+    def __init__(self, requests_per_minute: float = 600, burst_probability: float = 0.0,
+                 burst_seconds: float = 2.0, latency_median: float = 0.05, latency_sigma: float = 0.5,
+                 failure_rate: float = 0.0, seed: int = 0):
+        self.requests_per_minute = requests_per_minute
+        self.burst_probability = burst_probability
+        self.burst_seconds = burst_seconds
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._windows: Dict[str, List[float]] = {}
+        self._burst_until: Dict[str, float] = {}
+        self.counters = {'attempts': 0, 'success': 0, 'rate_limited': 0, 'failed': 0}
+
+    def request(self, api_key: str, items: int = 1):
+        """Thực hiện một request giả lập cho key, raise RateLimitError/RuntimeError nếu bị từ chối"""
+        now = time.monotonic()
+        with self._lock:
+            self.counters['attempts'] += 1
+            window = self._windows.setdefault(api_key, [])
+            while window and now - window[0] > 60:
+                window.pop(0)
+
+            if now < self._burst_until.get(api_key, 0) or len(window) >= self.requests_per_minute:
+                self.counters['rate_limited'] += 1
+                raise RateLimitError(f"429 RESOURCE_EXHAUSTED ({api_key})")
+            if self._random.random() < self.burst_probability:
+                self._burst_until[api_key] = now + self.burst_seconds
+                self.counters['rate_limited'] += 1
+                raise RateLimitError(f"429 RESOURCE_EXHAUSTED burst ({api_key})")
+
+            window.append(now)
+            latency = self.latency_median * math.exp(self._random.gauss(0, self.latency_sigma))
+            failed = self._random.random() < self.failure_rate
+
+        time.sleep(latency)
+        with self._lock:
+            if failed:
+                self.counters['failed'] += 1
+            else:
+                self.counters['success'] += 1
+        if failed:
+            raise RuntimeError("simulated: lỗi giả lập")
+
+@register_engine
+class SimulatedEngine(TranslationEngine):
+    """Engine dùng SimulatedBackend, chỉ dành cho benchmark"""
+    name = 'simulated'
+    display_name = 'Simulated'
+    requires_api_key = False
+    max_key_cycles = 20
+    default_requests_per_minute = 600
+
+    def __init__(self, api_key: str = None, backend: SimulatedBackend = None, **options):
+        super().__init__(api_key, **options)
+        self.backend = backend or SimulatedBackend()
+
+    def translate(self, masked_text: str, hints: str = "") -> str:
+        self.backend.request(self.api_key)
+        return f"[VI] {masked_text}"
+
+    def translate_batch(self, masked_texts: List[str], hints: str = "") -> List[str]:
+        self.backend.request(self.api_key, len(masked_texts))
+        return [f"[VI] {text}" for text in masked_texts]
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Percentile theo nearest-rank (0 nếu không có dữ liệu)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+def generate_synthetic_workload(folder: str, total_entries: int, files: int = 2, seed: int = 0):
+    """Tạo các file JSON giả lập: nhiều chuỗi UI lặp lại, biến thể số/tags và câu dài"""
+    rng = random.Random(seed)
+    ui_words = ["Confirm", "Cancel", "Back", "Next", "Close", "Options", "Exit Craft Mode?", "Build here?",
+                "Open the chest", "Network error", "Enter a name.", "Please type with the keyboard."]
+    story_words = ["explore", "the", "cave", "forest", "island", "at", "night", "find", "hidden", "treasure",
+                   "villagers", "need", "help", "storm", "bridge", "repair", "ancient", "map", "boat", "fish"]
+    per_file = max(1, total_entries // files)
+    for file_index in range(files):
+        entries = []
+        for entry_id in range(per_file):
+            roll = rng.random()
+            if roll < 0.4:
+                text = rng.choice(ui_words)
+            elif roll < 0.6:
+                text = f"Get {rng.randint(1, 999)} gold [C]"
+            else:
+                words = rng.sample(story_words, rng.randint(4, 9))
+                text = " ".join(words).capitalize() + "."
+            entries.append({'id': entry_id, 'key': f'utf8_entry_{entry_id}', 'original_text': text,
+                            'translated_text': text, 'language': 'english', 'position': entry_id * 16,
+                            'length': len(text) + 1})
+        data = {'file_info': {'original_file': f'synthetic_{file_index}.uasset'}, 'text_entries': entries}
+        with open(os.path.join(folder, f'synthetic_{file_index}_texts.json'), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+def run_mode(mode: str, input_folder: str, args) -> Dict:
+    """Chạy một chế độ dịch trên bản sao của workload trong thư mục tạm, trả về các số đo"""
+    backend = SimulatedBackend(requests_per_minute=args.rpm, burst_probability=args.burst_probability,
+                               burst_seconds=args.burst_seconds, latency_median=args.latency,
+                               latency_sigma=args.latency_sigma, failure_rate=args.failure_rate, seed=args.seed)
+    workdir = tempfile.mkdtemp(prefix=f"bench_{mode}_")
+    previous_cwd = os.getcwd()
+    try:
+        shutil.copytree(input_folder, os.path.join(workdir, 'extract'))
+        if args.dictionary and os.path.exists(args.dictionary):
+            shutil.copy(args.dictionary, os.path.join(workdir, 'tudien.json'))
+        os.chdir(workdir)
+
+        translator = AutoTranslator(ai_engine='simulated',
+                                    api_keys=[f"sim-key-{i + 1}" for i in range(args.keys)],
+                                    engine_options={'backend': backend})
+        if mode == 'batched':
+            translator.batch_size = args.batch_size
+        elif mode in ('concurrent', 'hedged'):
+            translator.concurrency = args.concurrency
+            translator.batch_size = args.concurrent_batch_size
+        if mode == 'hedged':
+            translator.hedge_percentile = args.hedge_percentile
+            translator.hedge_after = args.hedge_after
+            translator.hedge_max_fraction = args.hedge_max_fraction
+
+        # Đo độ trễ mỗi chuỗi gửi AI (gồm cả retry/đổi key) và thời gian trong save_cache
+        latencies = []
+        timings = {'save_cache': 0.0, 'save_cache_calls': 0}
+        timing_lock = threading.Lock()
+
+        def timed_single(original):
+            def wrapper(text, budget=None):
+                start = time.perf_counter()
+                try:
+                    return original(text, budget)
+                finally:
+                    with timing_lock:
+                        latencies.append(time.perf_counter() - start)
+            return wrapper
+
+        def timed_batch(original):
+            def wrapper(texts, budget=None):
+                start = time.perf_counter()
+                try:
+                    return original(texts, budget)
+                finally:
+                    with timing_lock:
+                        latencies.extend([time.perf_counter() - start] * len(texts))
+            return wrapper
+
+        def timed_save(original):
+            def wrapper():
+                start = time.perf_counter()
+                try:
+                    return original()
+                finally:
+                    with timing_lock:
+                        timings['save_cache'] += time.perf_counter() - start
+                        timings['save_cache_calls'] += 1
+            return wrapper
+
+        translator.translate_with_engine = timed_single(translator.translate_with_engine)
+        translator.translate_batch_with_engine = timed_batch(translator.translate_batch_with_engine)
+        translator.save_cache = timed_save(translator.save_cache)
+
+        quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+        start = time.perf_counter()
+        with quiet:
+            if mode == 'sequential':
+                os.makedirs('translated', exist_ok=True)
+                for json_file in sorted(os.listdir('extract')):
+                    translator.translate_json_file(os.path.join('extract', json_file),
+                                                   os.path.join('translated', json_file))
+            else:
+                translator.batch_translate_folder('extract')
+        elapsed = time.perf_counter() - start
+
+        stats = translator.stats
+        counters = backend.counters
+        total = stats['total'] or 1
+        return {
+            'mode': mode,
+            'elapsed_seconds': elapsed,
+            'entries': stats['total'],
+            'strings_per_second': stats['total'] / elapsed if elapsed else 0.0,
+            'api_strings': len(latencies),
+            'latency_p50': percentile(latencies, 0.50),
+            'latency_p95': percentile(latencies, 0.95),
+            'latency_p99': percentile(latencies, 0.99),
+            'attempts': counters['attempts'],
+            'wasted_attempts': counters['attempts'] - counters['success'],
+            'rate_limited': counters['rate_limited'],
+            'failed': counters['failed'],
+            'cache_hit_ratio': (stats['cached'] + stats['dictionary']) / total,
+            'save_cache_seconds': timings['save_cache'],
+            'save_cache_calls': timings['save_cache_calls']
+        }
+    finally:
+        os.chdir(previous_cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def print_report(results: List[Dict]):
+    """In bảng so sánh các chế độ"""
+    print("\n" + "="*110)
+    print("📊 KẾT QUẢ BENCHMARK")
+    print("="*110)
+    print(f"{'chế độ':12s} {'thời gian':>10s} {'chuỗi/s':>9s} {'p50':>8s} {'p95':>8s} {'p99':>8s} "
+          f"{'request':>8s} {'lãng phí':>9s} {'429':>6s} {'cache hit':>10s} {'save_cache':>11s}")
+    for r in results:
+        print(f"{r['mode']:12s} {r['elapsed_seconds']:9.2f}s {r['strings_per_second']:9.1f} "
+              f"{r['latency_p50']:7.3f}s {r['latency_p95']:7.3f}s {r['latency_p99']:7.3f}s "
+              f"{r['attempts']:8d} {r['wasted_attempts']:9d} {r['rate_limited']:6d} "
+              f"{r['cache_hit_ratio']:9.1%} {r['save_cache_seconds']:10.2f}s")
+    print("="*110)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark AutoTranslator với backend giả lập')
+    parser.add_argument('--input', help='Folder chứa các file JSON làm workload (mặc định: tạo workload giả lập)')
+    parser.add_argument('--synthetic', type=int, default=2000, help='Số entries của workload giả lập')
+    parser.add_argument('--modes', default='sequential,batched,concurrent',
+                       help='Các chế độ cần đo: sequential, batched, concurrent, hedged')
+    parser.add_argument('--keys', type=int, default=3, help='Số API key giả lập')
+    parser.add_argument('--rpm', type=float, default=600, help='Quota request/phút của mỗi key')
+    parser.add_argument('--burst-probability', type=float, default=0.01, help='Xác suất mở một đợt 429')
+    parser.add_argument('--burst-seconds', type=float, default=2.0, help='Độ dài mỗi đợt 429 (giây)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Latency trung vị mỗi request (giây)')
+    parser.add_argument('--latency-sigma', type=float, default=0.5, help='Độ lệch log-normal của latency')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='Tỉ lệ request lỗi fatal')
+    parser.add_argument('--batch-size', type=int, default=20, help='Số text mỗi request ở chế độ batched')
+    parser.add_argument('--concurrency', type=int, default=8, help='Số luồng ở chế độ concurrent')
+    parser.add_argument('--concurrent-batch-size', type=int, default=1, help='Số text mỗi request ở chế độ concurrent')
+    parser.add_argument('--hedge-percentile', type=float, default=0.9, help='Percentile độ trễ để gửi hedge (chế độ hedged)')
+    parser.add_argument('--hedge-after', type=float, default=0.5, help='Thời điểm hedge khi chưa đủ mẫu (chế độ hedged)')
+    parser.add_argument('--hedge-max-fraction', type=float, default=0.1, help='Số hedge tối đa so với số request (chế độ hedged)')
+    parser.add_argument('--dictionary', default='tudien.json', help='Từ điển dùng cho workload')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('-o', '--output', help='Lưu kết quả ra file JSON')
+    parser.add_argument('--verbose', action='store_true', help='Hiện log của translator')
+
+    args = parser.parse_args()
+    args.dictionary = os.path.abspath(args.dictionary) if args.dictionary else None
+
+    synthetic_folder = None
+    input_folder = args.input
+    if not input_folder:
+        synthetic_folder = tempfile.mkdtemp(prefix="bench_input_")
+        generate_synthetic_workload(synthetic_folder, args.synthetic, seed=args.seed)
+        input_folder = synthetic_folder
+        print(f"🧪 Workload giả lập: {args.synthetic} entries")
+    input_folder = os.path.abspath(input_folder)
+
+    results = []
+    try:
+        for mode in [m.strip() for m in args.modes.split(',') if m.strip()]:
+            print(f"⏱️  Đang đo chế độ: {mode}")
+            results.append(run_mode(mode, input_folder, args))
+    finally:
+        if synthetic_folder:
+            shutil.rmtree(synthetic_folder, ignore_errors=True)
+
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"✅ Đã lưu kết quả: {args.output}")
+
+if __name__ == '__main__':
+    main()
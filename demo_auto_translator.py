@@ -107,10 +107,10 @@ def check_environment():
     
     # Kiểm tra thư viện
     try:
-        import google.generativeai
-        print("✅ google-generativeai: Đã cài đặt")
+        from google import genai
+        print("✅ google-genai: Đã cài đặt")
     except ImportError:
-        print("❌ google-generativeai: Chưa cài đặt")
+        print("❌ google-genai: Chưa cài đặt")
         print("   Chạy: pip3 install -r requirements.txt")
     
     # Kiểm tra API key
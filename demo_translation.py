@@ -86,7 +86,8 @@ def create_translated_uasset(demo_file):
         print("Không tìm thấy file .uasset gốc")
         return
     
-    extractor.extract_texts(original_uasset)
+    if not extractor.load_uasset(original_uasset):
+        return
     
     # Tạo file .uasset mới
     output_file = "GDSSystemText_vietnamese_demo.uasset"
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Glossary Matcher
+Tìm nhanh các thuật ngữ của từ điển (tudien.json) bên trong một đoạn text bằng Aho-Corasick
+"""
+
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+
+class GlossaryMatcher:
+    def __init__(self, glossary: Dict[str, str]):
+        """
+        Dựng automaton Aho-Corasick một lần từ từ điển thuật ngữ
+
+        Args:
+            glossary: {thuật ngữ: bản dịch}, thuật ngữ được so khớp không phân biệt hoa thường
+        """
+        self.terms = {}
+        for term, translation in glossary.items():
+            term = term.lower().strip()
+            if term and translation:
+                self.terms[term] = translation
+
+        # Mỗi node: bảng chuyển trạng thái, liên kết fail và độ dài các thuật ngữ kết thúc tại node
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._outputs: List[List[int]] = [[]]
+
+        for term in self.terms:
+            node = 0
+            for char in term:
+                next_node = self._goto[node].get(char)
+                if next_node is None:
+                    next_node = len(self._goto)
+                    self._goto[node][char] = next_node
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._outputs.append([])
+                node = next_node
+            self._outputs[node].append(len(term))
+
+        self._build_fail_links()
+
+    def _build_fail_links(self):
+        """Tính liên kết fail theo BFS và gộp output của các hậu tố"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def lookup(self, term: str) -> Optional[str]:
+        """Tra bản dịch của một thuật ngữ (O(1))"""
+        return self.terms.get(term.lower().strip())
+
+    def find_terms(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Tìm các thuật ngữ xuất hiện trong text, chỉ nhận trùng khớp trọn từ
+
+        Khi các thuật ngữ chồng lên nhau, ưu tiên thuật ngữ bắt đầu sớm nhất rồi dài nhất
+        (ví dụ "exit craft mode" thắng "craft").
+
+        Returns:
+            List các (start, end, term) theo vị trí trong text
+        """
+        text_lower = text.lower()
+        matches = []
+        node = 0
+        for index, char in enumerate(text_lower):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length in self._outputs[node]:
+                start = index - length + 1
+                end = index + 1
+                if self._is_word_boundary(text_lower, start, end):
+                    matches.append((start, end, text_lower[start:end]))
+
+        matches.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        selected = []
+        last_end = 0
+        for start, end, term in matches:
+            if start >= last_end:
+                selected.append((start, end, term))
+                last_end = end
+        return selected
+
+    def relevant_terms(self, text: str) -> Dict[str, str]:
+        """Các cặp {thuật ngữ: bản dịch} xuất hiện trong text, theo thứ tự xuất hiện"""
+        return {term: self.terms[term] for _, _, term in self.find_terms(text)}
+
+    def check_consistency(self, source: str, translation: str) -> List[Tuple[str, str]]:
+        """
+        Kiểm tra bản dịch có dùng đúng thuật ngữ của từ điển không
+
+        Returns:
+            List các (thuật ngữ, bản dịch mong đợi) không xuất hiện trong bản dịch
+        """
+        translation_lower = translation.lower()
+        return [(term, expected) for term, expected in self.relevant_terms(source).items()
+                if expected.lower() not in translation_lower]
+
+    @staticmethod
+    def _is_word_boundary(text: str, start: int, end: int) -> bool:
+        """Kiểm tra thuật ngữ không nằm giữa một từ dài hơn (ví dụ "code" trong "decode")"""
+        if start > 0 and (text[start - 1].isalnum() or text[start - 1] == '_'):
+            return False
+        if end < len(text) and (text[end].isalnum() or text[end] == '_'):
+            return False
+        return True
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Metrics
+Bộ đếm, gauge và histogram cho quá trình dịch, xuất định kỳ ra file JSON hoặc Prometheus text
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Ranh giới bucket (giây) cho histogram độ trễ request
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60]
+
+class Histogram:
+    def __init__(self, buckets: List[float] = None):
+        self.buckets = list(buckets or LATENCY_BUCKETS)
+        self.counts = [0] * (len(self.buckets) + 1)  # Phần tử cuối là bucket +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, fraction: float) -> float:
+        """Ước tính percentile theo cận trên của bucket chứa nó"""
+        if not self.count:
+            return 0.0
+        target = fraction * self.count
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def to_dict(self) -> Dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'buckets': {str(bound): count for bound, count in zip(self.buckets + ['+Inf'], self.counts)},
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99)
+        }
+
+def _label_key(labels: Dict) -> Tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _escape_label_value(value: str) -> str:
+    """Escape giá trị label theo định dạng text của Prometheus: \\, \" và xuống dòng"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(label_key: Tuple, extra: str = "") -> str:
+    parts = [f'{name}="{_escape_label_value(value)}"' for name, value in label_key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class MetricsRegistry:
+    """
+    Nơi ghi nhận metrics của một lần chạy (an toàn đa luồng)
+
+    Tên metric theo kiểu Prometheus, labels truyền bằng keyword (ví dụ engine="gemini", key="1").
+    Các collector được gọi ngay trước khi xuất để cập nhật gauge từ trạng thái hiện tại.
+    """
+    def __init__(self):
+        self.counters: Dict[str, Dict[Tuple, float]] = {}
+        self.gauges: Dict[str, Dict[Tuple, float]] = {}
+        self.histograms: Dict[str, Dict[Tuple, Histogram]] = {}
+        self.collectors: List[Callable[['MetricsRegistry'], None]] = []
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: float = 1, **labels):
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name: str, value: float, **labels):
+        with self._lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def quantile(self, name: str, fraction: float, min_count: int = 1, **labels) -> Optional[float]:
+        """
+        Percentile của một histogram (đọc trong lock, an toàn khi luồng khác đang observe)
+
+        Returns:
+            float, hoặc None nếu chưa có series với đúng các labels này hoặc chưa đủ min_count mẫu
+        """
+        with self._lock:
+            histogram = self.histograms.get(name, {}).get(_label_key(labels))
+            if histogram is None or histogram.count < max(min_count, 1):
+                return None
+            return histogram.quantile(fraction)
+
+    def collect(self):
+        """Chạy các collector để cập nhật gauge"""
+        for collector in list(self.collectors):
+            try:
+                collector(self)
+            except Exception as e:
+                print(f"⚠️  Lỗi khi thu thập metrics: {e}")
+
+    def snapshot(self) -> Dict:
+        """Toàn bộ metrics dạng dict (dùng cho file JSON)"""
+        self.collect()
+        with self._lock:
+            def series_list(metrics, convert=lambda value: value):
+                return {name: [{'labels': dict(key), 'value': convert(value)} for key, value in series.items()]
+                        for name, series in sorted(metrics.items())}
+            return {
+                'timestamp': time.time(),
+                'uptime_seconds': time.time() - self.started_at,
+                'counters': series_list(self.counters),
+                'gauges': series_list(self.gauges),
+                'histograms': series_list(self.histograms, lambda histogram: histogram.to_dict())
+            }
+
+    def to_prometheus(self) -> str:
+        """Metrics theo định dạng text exposition của Prometheus"""
+        self.collect()
+        lines = []
+        with self._lock:
+            for kind, metrics in (('counter', self.counters), ('gauge', self.gauges)):
+                for name, series in sorted(metrics.items()):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in series.items():
+                        lines.append(f"{name}{_format_labels(key)} {value:g}")
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ['+Inf'], histogram.counts):
+                        cumulative += count
+                        le_label = f'le="{bound}"'
+                        lines.append(f"{name}_bucket{_format_labels(key, le_label)} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Ghi metrics ra file (atomic): .prom/.txt theo Prometheus, còn lại là JSON"""
+        if path.endswith(('.prom', '.txt')):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+class MetricsExporter:
+    def __init__(self, metrics: MetricsRegistry, path: str, interval: float = 10.0):
+        """
+        Ghi metrics ra file định kỳ bằng một luồng nền
+
+        Args:
+            metrics: Registry cần xuất
+            path: File đích (.prom/.txt cho Prometheus textfile collector, còn lại là JSON)
+            interval: Chu kỳ ghi (giây)
+        """
+        self.metrics = metrics
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-exporter", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def export(self):
+        try:
+            self.metrics.write(self.path)
+        except Exception as e:
+            print(f"⚠️  Không thể ghi metrics {self.path}: {e}")
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Dừng luồng nền và ghi lần cuối"""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self.export()
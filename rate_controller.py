@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rate Controller
+Điều tiết tốc độ gọi API theo AIMD: tăng dần khi request thành công, giảm một nửa khi gặp 429
+"""
+
+import time
+import threading
+from typing import Dict, List
+
+MAX_COOLDOWN_SECONDS = 60  # Thời gian nghỉ tối đa của một key sau nhiều lần 429 liên tiếp
+
+class AIMDRateLimiter:
+    def __init__(self, initial_rate: float, min_rate: float = 1 / 60, max_rate: float = 50.0,
+                 increase_step: float = None, decrease_factor: float = 0.5, cooldown: bool = True):
+        """
+        Bộ giới hạn tốc độ cho một key (hoặc cả engine)
+
+        Args:
+            initial_rate: Tốc độ ban đầu (request/giây)
+            min_rate: Tốc độ thấp nhất khi bị 429 liên tục
+            max_rate: Tốc độ cao nhất được phép tăng tới
+            increase_step: Lượng cộng thêm sau mỗi request thành công (mặc định 1/10 tốc độ ban đầu)
+            decrease_factor: Hệ số nhân khi gặp 429
+            cooldown: Tạm nghỉ sau 429 (thời gian nghỉ gấp đôi sau mỗi 429 liên tiếp)
+        """
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.rate = min(max(initial_rate, min_rate), max_rate)
+        self.increase_step = increase_step if increase_step is not None else self.rate / 10
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.successes = 0
+        self.rate_limited = 0
+        self._next_slot = 0.0
+        self._last_decrease = float('-inf')
+        self._consecutive_limits = 0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Giữ chỗ cho request tiếp theo, trả về số giây cần chờ trước khi gửi"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + 1 / self.rate
+            return slot - now
+
+    def try_reserve(self) -> bool:
+        """Giữ chỗ chỉ khi gửi được ngay (không phải chờ); dùng cho request phụ như hedge"""
+        with self._lock:
+            now = time.monotonic()
+            if self._next_slot > now:
+                return False
+            self._next_slot = now + 1 / self.rate
+            return True
+
+    def wait_time(self) -> float:
+        """Số giây còn phải chờ nếu giữ chỗ ngay bây giờ (không giữ chỗ)"""
+        with self._lock:
+            return max(0.0, self._next_slot - time.monotonic())
+
+    def on_success(self):
+        """Request thành công: tăng tốc độ theo cấp số cộng"""
+        with self._lock:
+            self.successes += 1
+            self._consecutive_limits = 0
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+
+    def on_rate_limit(self):
+        """
+        Gặp 429: giảm tốc độ theo cấp số nhân và tạm nghỉ (nếu bật cooldown)
+
+        Các 429 đến dồn dập từ những request đang bay cùng lúc chỉ tính là một lần giảm
+        (trong vòng max(1 giây, 1 khoảng request)), tránh tụt tốc độ và kéo dài thời gian nghỉ
+        chỉ vì một đợt 429.
+        """
+        with self._lock:
+            self.rate_limited += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= max(1.0, 1 / self.rate):
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self._last_decrease = now
+                self._consecutive_limits += 1
+            if self.cooldown:
+                pause = min(MAX_COOLDOWN_SECONDS, 2 ** (self._consecutive_limits - 1) / self.rate)
+                self._next_slot = max(self._next_slot, now + pause)
+
+class RateController:
+    def __init__(self, api_keys: List[str], requests_per_minute: float):
+        """
+        Giữ một AIMDRateLimiter cho mỗi API key và một limiter chung cho cả engine
+
+        Args:
+            api_keys: Danh sách key (thứ tự dùng để hiển thị #1, #2, ...)
+            requests_per_minute: Quota ước tính của mỗi key, dùng làm tốc độ khởi đầu
+        """
+        per_key_rate = requests_per_minute / 60
+        self.key_order = list(api_keys)
+        self.keys: Dict[str, AIMDRateLimiter] = {key: AIMDRateLimiter(per_key_rate) for key in self.key_order}
+        # Quota theo project/tài khoản dùng chung cho mọi key: giảm nhẹ hơn để một key bị chặn
+        # không kéo tụt cả engine
+        self.engine = AIMDRateLimiter(per_key_rate * max(len(self.key_order), 1),
+                                      max_rate=50.0 * max(len(self.key_order), 1), decrease_factor=0.8,
+                                      cooldown=False)
+        self._lock = threading.Lock()  # Thêm key mới từ nhiều worker cùng lúc
+
+    def _limiter(self, api_key: str) -> AIMDRateLimiter:
+        limiter = self.keys.get(api_key)
+        if limiter is None:
+            with self._lock:
+                limiter = self.keys.get(api_key)
+                if limiter is None:
+                    limiter = self.keys[api_key] = AIMDRateLimiter(self.engine.rate)
+                    self.key_order.append(api_key)
+        return limiter
+
+    def acquire(self, api_key: str, max_wait: float = None, stop: threading.Event = None) -> bool:
+        """
+        Chờ tới lượt gửi request với key này (theo cả giới hạn của key và của engine)
+
+        Args:
+            max_wait: Không giữ chỗ nếu phải chờ lâu hơn số giây này (ví dụ phần còn lại của deadline)
+            stop: Dừng chờ ngay khi event được set (request không còn cần nữa)
+
+        Returns:
+            True nếu đã tới lượt gửi; False nếu vượt max_wait hoặc bị stop
+        """
+        limiter = self._limiter(api_key)
+        if max_wait is not None and max(self.engine.wait_time(), limiter.wait_time()) > max_wait:
+            return False
+        wait = max(self.engine.reserve(), limiter.reserve())
+        if wait > 0:
+            if stop is not None:
+                return not stop.wait(wait)
+            time.sleep(wait)
+        return True
+
+    def try_acquire(self, api_key: str) -> bool:
+        """Giữ chỗ cho key này chỉ khi cả key và engine đều gửi được ngay, không chờ"""
+        limiter = self._limiter(api_key)
+        if limiter.wait_time() > 0 or self.engine.wait_time() > 0:
+            return False
+        return limiter.try_reserve() and self.engine.try_reserve()
+
+    def best_key(self, current_key: str, exclude: str = None) -> str:
+        """
+        Key sẵn sàng sớm nhất, giữ key hiện tại nếu nó không phải chờ lâu hơn key khác
+
+        Args:
+            exclude: Key không được chọn (ví dụ key đang chạy request chính khi gửi hedge)
+        """
+        best_key, best_wait = None, float('inf')
+        if current_key != exclude:
+            best_key, best_wait = current_key, self._limiter(current_key).wait_time()
+        with self._lock:
+            key_order = list(self.key_order)
+        for key in key_order:
+            if key == exclude:
+                continue
+            wait = self.keys[key].wait_time()
+            if wait < best_wait:
+                best_key, best_wait = key, wait
+        return best_key
+
+    def on_success(self, api_key: str):
+        self._limiter(api_key).on_success()
+        self.engine.on_success()
+
+    def on_rate_limit(self, api_key: str):
+        self._limiter(api_key).on_rate_limit()
+        self.engine.on_rate_limit()
+
+    def snapshot(self) -> Dict:
+        """Tốc độ hiện tại (request/phút) của engine và từng key, key được đánh số thay vì in ra"""
+        with self._lock:
+            key_order = list(self.key_order)
+        return {
+            'engine_rpm': self.engine.rate * 60,
+            'rate_limited': self.engine.rate_limited,
+            'keys': [{'key': index + 1,
+                      'rpm': self.keys[key].rate * 60,
+                      'successes': self.keys[key].successes,
+                      'rate_limited': self.keys[key].rate_limited}
+                     for index, key in enumerate(key_order)]
+        }
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+import tempfile
+
+from asset_survey import TAIL_MAGIC, AssetIndex, find_survey_paths, survey, survey_asset
+from test_text_scanner import build_asset
+from uasset_text_extractor import read_size_info
+
+TEXTS = ["Open the chest", "Close the door", "Network error"]
+
+def write_file(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def test_survey_asset_agrees_with_extractor():
+    with tempfile.TemporaryDirectory() as workdir:
+        path = os.path.join(workdir, 'GDSMenuText.uasset')
+        data = build_asset(TEXTS)
+        write_file(path, data)
+        record = survey_asset(path)
+
+        assert record['error'] is None and record['size'] == len(data)
+        assert record['size_offset_position'] == 0x30
+        # Survey và extractor dùng cùng công thức cho trường kích thước
+        assert record['size_field_ok']
+        assert read_size_info(data) == (0x30, record['size_field'])
+        assert record['tail_magic'] is False
+        assert record['probe_entries'] == 3 and record['utf16_entries'] == 0
+        assert record['first_entry_position'] == 0x30 + 12
+        assert record['first_text'] == "Open the chest"
+        assert record['signature'] == "utf8:3/utf16:0@+12"
+
+        # File bị nối thêm dữ liệu: trường kích thước không còn khớp
+        write_file(path, data + TAIL_MAGIC)
+        record = survey_asset(path)
+        assert record['tail_magic'] is True and record['size_field_ok'] is False
+        assert read_size_info(data + TAIL_MAGIC)[1] != record['size_field']
+
+        # Con trỏ tại 0x20 không hợp lệ: dò từ đầu file, không đọc trường kích thước
+        broken = bytearray(data)
+        struct.pack_into('<I', broken, 0x20, len(data) + 1)
+        write_file(path, bytes(broken))
+        record = survey_asset(path)
+        assert record['size_offset_position'] is None and record['size_field_ok'] is None
+        assert record['probe_entries'] == 3
+
+        record = survey_asset(os.path.join(workdir, 'Missing.uasset'))
+        assert record['error'] and record['size'] is None
+
+def test_find_survey_paths():
+    with tempfile.TemporaryDirectory() as workdir:
+        for name in ('Game/UI/GDSMenuText.uasset', 'Game/Items/ItemText.uasset', 'Game/UI/GDSMenuText.uexp'):
+            write_file(os.path.join(workdir, name), build_asset(TEXTS))
+
+        # Thư mục: duyệt cả cây, chỉ lấy .uasset, sắp xếp theo đường dẫn
+        paths, missing = find_survey_paths(workdir)
+        assert paths == [os.path.join(workdir, 'Game', 'Items', 'ItemText.uasset'),
+                         os.path.join(workdir, 'Game', 'UI', 'GDSMenuText.uasset')]
+        assert missing == 0
+
+        # File danh sách: output của UnrealPak -List (mount point ../../../) và đường dẫn từng dòng
+        listing = os.path.join(workdir, 'pak_list.txt')
+        with open(listing, 'w', encoding='utf-8') as f:
+            f.write('LogPakFile: Display: "../../../Game/UI/GDSMenuText.uasset" offset: 0, size: 512\n'
+                    'LogPakFile: Display: "../../../Game/UI/GDSMenuText.uexp" offset: 512, size: 64\n'
+                    'Game\\Items\\ItemText.uasset\n'
+                    'Game/Missing/Gone.uasset\n')
+        paths, missing = find_survey_paths(listing)
+        assert paths == [os.path.join(workdir, 'Game', 'UI', 'GDSMenuText.uasset'),
+                         os.path.join(workdir, 'Game', 'Items', 'ItemText.uasset')]
+        assert missing == 1
+
+        # Đường dẫn tương đối tính từ root khi pak được giải nén ở nơi khác
+        paths, missing = find_survey_paths(listing, root=os.path.join(workdir, 'Game'))
+        assert paths == [] and missing == 3
+
+def test_index_reuses_unchanged_files():
+    with tempfile.TemporaryDirectory() as workdir:
+        text_asset = os.path.join(workdir, 'assets', 'GDSMenuText.uasset')
+        other_asset = os.path.join(workdir, 'assets', 'Empty.uasset')
+        write_file(text_asset, build_asset(TEXTS))
+        write_file(other_asset, build_asset([]))
+        index_path = os.path.join(workdir, 'asset_index.sqlite')
+
+        report = survey(os.path.join(workdir, 'assets'), index_path, workers=2)
+        assert (report['files'], report['surveyed'], report['reused'], report['with_text']) == (2, 2, 0, 1)
+        assert report['errors'] == []
+
+        # Không đổi kích thước/mtime: dùng lại dòng đã có
+        report = survey(os.path.join(workdir, 'assets'), index_path, workers=2)
+        assert (report['surveyed'], report['reused']) == (0, 2)
+
+        # File đổi nội dung: survey lại riêng file đó
+        write_file(other_asset, build_asset(["Exit Craft Mode?"]))
+        report = survey(os.path.join(workdir, 'assets'), index_path, workers=2)
+        assert (report['surveyed'], report['reused'], report['with_text']) == (1, 1, 2)
+
+        report = survey(os.path.join(workdir, 'assets'), index_path, workers=2, force=True)
+        assert (report['surveyed'], report['reused']) == (2, 0)
+
+        index = AssetIndex(index_path)
+        try:
+            assert index.text_assets() == [text_asset, other_asset]  # Nhiều entry trước
+            assert index.text_assets(min_entries=2) == [text_asset]
+            assert set(index.stamps()) == {text_asset, other_asset}
+        finally:
+            index.close()
+
+if __name__ == '__main__':
+    test_survey_asset_agrees_with_extractor()
+    test_find_survey_paths()
+    test_index_reuses_unchanged_files()
+    print("✅ Asset survey OK")
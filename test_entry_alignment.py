@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from auto_translator import align_entries
+
+def test_align_entries_after_game_patch():
+    old = ["New Game", "Continue", "Options", "Quit", "Volume", "Volume", "Credits"]
+    # Bản mới: hai dòng đầu đổi chỗ, "Options" sửa thành "Settings", chèn "Load Game", xóa "Credits"
+    new = ["Continue", "New Game", "Settings", "Quit", "Load Game", "Volume", "Volume"]
+
+    matches = align_entries(old, new)
+
+    assert matches[0] == (1, 'same')
+    assert matches[1] == (0, 'same')
+    # Nằm giữa hai hàng xóm đã ghép, đúng chỗ "Options"
+    assert matches[2] == (2, 'changed')
+    assert matches[3] == (3, 'same')
+    # Text mới: hai phía đều đã ghép liền nhau nên không thay cho entry cũ nào
+    assert 4 not in matches
+    # Text trùng được ghép theo thứ tự
+    assert matches[5] == (4, 'same')
+    assert matches[6] == (5, 'same')
+
+if __name__ == '__main__':
+    test_align_entries_after_game_patch()
+    print("✅ align_entries OK")
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import io
+import json
+
+from auto_translator import TRANSLATION_STATE_KEY, source_hash
+from test_translate_many import stub_translator
+
+def state(text, status='done', engine='gemini'):
+    return {'source_hash': source_hash(text), 'engine': engine, 'status': status}
+
+def test_is_entry_done():
+    with stub_translator() as translator:
+        entry = {'original_text': "Open the chest", 'translated_text': "Mở rương",
+                 TRANSLATION_STATE_KEY: state("Open the chest")}
+        assert translator.is_entry_done(entry, "Open the chest")
+        # Text nguồn đã đổi sau khi game cập nhật: hash không khớp
+        assert not translator.is_entry_done(entry, "Open the big chest")
+        # Entry lỗi hoặc dịch bằng engine giả lập: chưa xong
+        assert not translator.is_entry_done({**entry, TRANSLATION_STATE_KEY: state("Open the chest", 'failed')},
+                                            "Open the chest")
+        assert not translator.is_entry_done({**entry, TRANSLATION_STATE_KEY: state("Open the chest", 'simulated')},
+                                            "Open the chest")
+        # File dịch phiên bản cũ (chưa có state): xong khi đã có bản dịch khác text gốc
+        assert translator.is_entry_done({'original_text': "Exit", 'translated_text': "Thoát"}, "Exit")
+        assert not translator.is_entry_done({'original_text': "Exit", 'translated_text': "Exit"}, "Exit")
+
+def test_translate_json_file_only_sends_unfinished_entries():
+    entries = [
+        # Đã dịch với đúng text nguồn: bỏ qua
+        {'id': 0, 'original_text': "Open the chest", 'translated_text': "Mở rương",
+         TRANSLATION_STATE_KEY: state("Open the chest")},
+        # original_text đã đổi so với lúc dịch: dịch lại
+        {'id': 1, 'original_text': "Close the door", 'translated_text': "Đóng cổng",
+         TRANSLATION_STATE_KEY: state("Close the gate")},
+        # Entry cũ chưa có translation_state, đã dịch: giữ và ghi state 'legacy'
+        {'id': 2, 'original_text': "Exit", 'translated_text': "Thoát"},
+        # Entry cũ chưa dịch
+        {'id': 3, 'original_text': "Load Game", 'translated_text': "Load Game"},
+        # Lần trước lỗi: dịch lại
+        {'id': 4, 'original_text': "Network error", 'translated_text': "Network error",
+         TRANSLATION_STATE_KEY: state("Network error", 'failed', 'failed')},
+    ]
+    with stub_translator() as translator:
+        with open('texts.json', 'w', encoding='utf-8') as f:
+            json.dump({'text_entries': entries}, f)
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator.translate_json_file('texts.json', 'texts_vi.json')
+
+        assert translator.stats['unchanged'] == 2
+        assert translator.stats['translated'] == 3
+        assert translator.engine.usage['requests'] == 3
+
+        with open('texts_vi.json', 'r', encoding='utf-8') as f:
+            result = json.load(f)['text_entries']
+        assert [entry['translated_text'] for entry in result] == \
+            ["Mở rương", "[VI] Close the door", "Thoát", "[VI] Load Game", "[VI] Network error"]
+        assert result[0][TRANSLATION_STATE_KEY] == state("Open the chest")
+        assert result[1][TRANSLATION_STATE_KEY] == state("Close the door", 'simulated', 'stub')
+        assert result[2][TRANSLATION_STATE_KEY] == state("Exit", 'done', 'legacy')
+        assert result[4][TRANSLATION_STATE_KEY]['status'] == 'simulated'
+
+if __name__ == '__main__':
+    test_is_entry_done()
+    test_translate_json_file_only_sends_unfinished_entries()
+    print("✅ Entry state OK")
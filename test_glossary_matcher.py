@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from glossary_matcher import GlossaryMatcher
+
+GLOSSARY = {
+    "chest": "Rương",
+    "craft": "Chế tạo",
+    "exit craft mode": "Thoát chế độ chế tạo",
+    "mode": "Chế độ",
+    "code": "Mã",
+    "network": "Mạng",
+}
+
+def test_find_terms_prefers_longest_whole_word_match():
+    matcher = GlossaryMatcher(GLOSSARY)
+
+    terms = [term for _, _, term in matcher.find_terms("Exit Craft Mode? Open the Chest.")]
+    assert terms == ["exit craft mode", "chest"]
+
+    # Không nhận thuật ngữ nằm giữa một từ khác
+    assert matcher.find_terms("Decode the crafted chests") == []
+
+def test_relevant_terms_and_consistency():
+    matcher = GlossaryMatcher(GLOSSARY)
+
+    assert matcher.relevant_terms("Network error: enter the gift code") == {
+        "network": "Mạng",
+        "code": "Mã",
+    }
+    assert matcher.lookup("CHEST") == "Rương"
+    assert matcher.check_consistency("Open the chest", "Mở rương") == []
+    assert matcher.check_consistency("Open the chest", "Mở hòm") == [("chest", "Rương")]
+
+if __name__ == '__main__':
+    test_find_terms_prefers_longest_whole_word_match()
+    test_relevant_terms_and_consistency()
+    print("✅ GlossaryMatcher OK")
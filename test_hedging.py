@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import time
+
+from auto_translator import TranslationError
+from test_translate_many import stub_translator
+
+KEYS = ('stub-key-1', 'stub-key-2')
+
+def counter(translator, name, **labels):
+    return sum(value for key, value in translator.metrics.counters.get(name, {}).items()
+               if all((label, str(value)) in key for label, value in labels.items()))
+
+def test_first_valid_result_wins():
+    with stub_translator(api_keys=KEYS) as translator:
+        # Hedge chỉ gửi được khi limiter chung của engine (2 key x 10 request/giây) đã rảnh: chờ hơn 0.05s
+        translator.hedge_after = 0.1
+        translator.hedge_max_fraction = 1.0
+        primary, other = (translator.get_engine(key) for key in KEYS)
+        primary.latency = 0.6
+        other.latency = 0.0
+        translator._hedge_counts['requests'] = 10  # Đủ hạn mức cho hedge ngay lần đầu
+
+        # Hedge về trước và hợp lệ: thắng
+        started = time.perf_counter()
+        assert translator.call_engine(lambda engine: engine.translate("Open the chest"), "Open the chest") == \
+            "[VI] Open the chest"
+        assert time.perf_counter() - started < 0.45
+        assert counter(translator, 'translator_hedge_winners_total', winner='hedge') == 1
+
+        # Hedge về trước nhưng sai placeholder: đợi request chính (hợp lệ) về sau
+        other.translate = lambda masked_text, hints="": "[VI] thiếu placeholder"
+        time.sleep(0.3)  # Để key 1 rảnh lại, request chính vẫn đi key 1
+        result = translator.call_engine(lambda engine: engine.translate("Open {0}"), "Open {0}",
+                                        validate=lambda result: "{0}" in result)
+        assert result == "[VI] Open {0}"
+        assert counter(translator, 'translator_hedge_winners_total', winner='primary') == 1
+
+def test_hedge_max_fraction_caps_hedges():
+    with stub_translator(api_keys=KEYS) as translator:
+        translator.hedge_after = 0.1
+        translator.hedge_max_fraction = 0.5
+        for key in KEYS:
+            translator.get_engine(key).latency = 0.25
+        for i in range(6):
+            translator.call_engine(lambda engine: engine.translate(f"Text {i}"), f"Text {i}")
+
+        # Hedge thứ n chỉ được gửi khi n <= 0.5 * số request chính: request 2, 4, 6
+        assert counter(translator, 'translator_hedges_total') == 3
+        assert counter(translator, 'translator_hedges_skipped_total', reason='cap') == 3
+
+def test_deadline_stops_key_rotation():
+    with stub_translator(api_keys=KEYS, latency=0.05, rate_limit_rate=1.0) as translator:
+        translator.request_deadline = 0.3
+        started = time.perf_counter()
+        try:
+            translator.call_engine(lambda engine: engine.translate("Open the chest"), "Open the chest")
+            assert False, "phải quá hạn"
+        except TranslationError:
+            pass
+        assert time.perf_counter() - started < 0.6
+
+        # Sau deadline request chính không còn xoay vòng key và gửi thêm request
+        time.sleep(0.2)
+        sent = counter(translator, 'translator_requests_total')
+        time.sleep(0.5)
+        assert counter(translator, 'translator_requests_total') == sent
+
+if __name__ == '__main__':
+    test_first_valid_result_wins()
+    test_hedge_max_fraction_caps_hedges()
+    test_deadline_stops_key_rotation()
+    print("✅ Hedging OK")
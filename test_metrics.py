@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+from unittest import mock
+
+from metrics import Histogram, MetricsExporter, MetricsRegistry
+
+def test_histogram_quantile():
+    histogram = Histogram([1, 2, 5])
+    assert histogram.quantile(0.5) == 0.0  # Chưa có mẫu
+    for value in (0.5, 1, 1.5, 3, 10):
+        histogram.observe(value)
+
+    # Bucket theo cận trên (giá trị bằng cận thuộc bucket đó), percentile là cận trên của bucket chứa nó
+    assert histogram.counts == [2, 1, 1, 1]
+    assert histogram.quantile(0.4) == 1
+    assert histogram.quantile(0.5) == 2
+    assert histogram.quantile(0.8) == 5
+    assert histogram.quantile(0.99) == float('inf')
+    assert histogram.to_dict()['buckets'] == {'1': 2, '2': 1, '5': 1, '+Inf': 1}
+
+    metrics = MetricsRegistry()
+    for value in (0.04, 0.2, 0.3):
+        metrics.observe('translator_request_seconds', value, engine='stub', outcome='success')
+    assert metrics.quantile('translator_request_seconds', 0.5, engine='stub', outcome='success') == 0.25
+    # Labels phải khớp đúng series; chưa đủ min_count mẫu thì chưa có percentile
+    assert metrics.quantile('translator_request_seconds', 0.5, engine='stub') is None
+    assert metrics.quantile('translator_request_seconds', 0.5, min_count=4, engine='stub', outcome='success') is None
+    assert metrics.quantile('missing_seconds', 0.5) is None
+
+def test_to_prometheus_format_and_escaping():
+    metrics = MetricsRegistry()
+    metrics.inc('translator_requests_total', engine='stub', key='1')
+    metrics.inc('translator_requests_total', 2, engine='stub', key='1')
+    metrics.inc('translator_retries_total')
+    metrics.set('translator_entries', 5, source='path "C:\\game"\nnext')
+    metrics.collectors.append(lambda registry: registry.set('translator_cache_hit_ratio', 0.5))
+    histogram = Histogram()
+    for value in (0.2, 0.7):
+        metrics.observe('translator_request_seconds', value, engine='stub')
+    lines = metrics.to_prometheus().splitlines()
+
+    assert lines[:4] == [
+        '# TYPE translator_requests_total counter',
+        'translator_requests_total{engine="stub",key="1"} 3',
+        '# TYPE translator_retries_total counter',
+        'translator_retries_total 1',
+    ]
+    # Giá trị label có \\, " và xuống dòng được escape, mỗi sample vẫn nằm trên một dòng
+    assert 'translator_entries{source="path \\"C:\\\\game\\"\\nnext"} 5' in lines
+    assert 'translator_cache_hit_ratio 0.5' in lines  # Gauge từ collector
+    assert '# TYPE translator_request_seconds histogram' in lines
+    buckets = [line for line in lines if line.startswith('translator_request_seconds_bucket')]
+    assert len(buckets) == len(histogram.buckets) + 1
+    assert 'translator_request_seconds_bucket{engine="stub",le="0.1"} 0' in buckets
+    assert 'translator_request_seconds_bucket{engine="stub",le="0.25"} 1' in buckets
+    assert 'translator_request_seconds_bucket{engine="stub",le="1"} 2' in buckets
+    assert buckets[-1] == 'translator_request_seconds_bucket{engine="stub",le="+Inf"} 2'
+    assert 'translator_request_seconds_sum{engine="stub"} 0.9' in lines
+    assert 'translator_request_seconds_count{engine="stub"} 2' in lines
+
+def test_atomic_write_and_exporter():
+    metrics = MetricsRegistry()
+    metrics.inc('translator_requests_total', engine='stub')
+    with tempfile.TemporaryDirectory() as workdir:
+        json_path = os.path.join(workdir, 'metrics.json')
+        prom_path = os.path.join(workdir, 'metrics.prom')
+        metrics.write(json_path)
+        metrics.write(prom_path)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        assert snapshot['counters']['translator_requests_total'] == [{'labels': {'engine': 'stub'}, 'value': 1}]
+        with open(prom_path, 'r', encoding='utf-8') as f:
+            assert 'translator_requests_total{engine="stub"} 1\n' in f.read()
+        assert sorted(os.listdir(workdir)) == ['metrics.json', 'metrics.prom']  # Không còn file .tmp
+
+        # Lỗi giữa chừng: file cũ giữ nguyên, người đọc không thấy file ghi dở
+        metrics.inc('translator_requests_total', engine='stub')
+        with mock.patch('metrics.os.replace', side_effect=OSError("disk full")):
+            try:
+                metrics.write(json_path)
+                assert False, "write phải báo lỗi"
+            except OSError:
+                pass
+        with open(json_path, 'r', encoding='utf-8') as f:
+            assert json.load(f) == snapshot
+
+        # Exporter: lỗi ghi chỉ in cảnh báo, stop() ghi lần cuối
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            MetricsExporter(metrics, os.path.join(workdir, 'missing', 'metrics.json')).export()
+        assert "Không thể ghi metrics" in output.getvalue()
+        exporter = MetricsExporter(metrics, json_path, interval=60).start()
+        exporter.stop()
+        with open(json_path, 'r', encoding='utf-8') as f:
+            assert json.load(f)['counters']['translator_requests_total'][0]['value'] == 2
+
+if __name__ == '__main__':
+    test_histogram_quantile()
+    test_to_prometheus_format_and_escaping()
+    test_atomic_write_and_exporter()
+    print("✅ Metrics OK")
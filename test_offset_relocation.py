@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import struct
+
+from uasset_relocation import (PACKAGE_FILE_TAG, PKG_FILTER_EDITOR_ONLY, VER_UE4_LATEST, VER_UE5_SCRIPT_SERIALIZATION_OFFSET,
+                               DeltaTable, parse_package_offsets, relocate_offsets)
+
+def _fstring(text: str) -> bytes:
+    raw = text.encode('ascii') + b'\0'
+    return struct.pack('<i', len(raw)) + raw
+
+def _summary(legacy_version: int, written: tuple, ue4: int, ue5: int, package_flags: int, o: dict) -> bytes:
+    """FPackageFileSummary tối giản theo đúng thứ tự trường mà _parse_summary đọc với version (ue4, ue5)"""
+    editor = not package_flags & PKG_FILTER_EDITOR_ONLY
+    out = struct.pack('<Iii', PACKAGE_FILE_TAG, legacy_version, 0)
+    out += struct.pack('<i', written[0])
+    if legacy_version <= -8:
+        out += struct.pack('<i', written[1])
+    out += struct.pack('<ii', 0, 0)  # Licensee, số custom version
+    out += struct.pack('<i', o['header']) + _fstring("None") + struct.pack('<Iii', package_flags, 1, o['names'])
+    if ue5:
+        out += struct.pack('<ii', 0, 0)  # SoftObjectPaths: không dùng
+    if editor:
+        out += _fstring("")  # LocalizationId
+    out += struct.pack('<ii', 0, 0)  # GatherableTextData: không dùng
+    out += struct.pack('<iiiii', 2, o['exports'], 0, o['imports'], o['depends'])
+    out += struct.pack('<iiii', 0, 0, 0, 0)  # SoftPackageReferences, SearchableNames, ThumbnailTable
+    out += bytes(16)  # Guid
+    if editor:
+        out += bytes(16)  # PersistentGuid
+    out += struct.pack('<iii', 1, 2, 1)  # Một generation
+    for _ in range(2):
+        out += struct.pack('<HHHI', 5, 1, 0, 0) + _fstring("")
+    out += struct.pack('<IiIi', 0, 0, 0, 0)  # CompressionFlags, CompressedChunks, PackageSource, AdditionalPackagesToCook
+    if legacy_version > -7:
+        out += struct.pack('<i', 0)
+    out += struct.pack('<iqii', o['registry'], o['bulk'], 0, 0)  # AssetRegistry, BulkDataStart, WorldTileInfo, ChunkIDs
+    out += struct.pack('<ii', 0, 0)  # PreloadDependency: không dùng
+    if ue5:
+        out += struct.pack('<iqi', 0, o['bulk'], 0)  # NamesReferencedFromExportData, PayloadToc, DataResource
+    return out
+
+def _export(ue5: int, serial_size: int, serial_offset: int) -> bytes:
+    out = bytes(12 + 16) + struct.pack('<qq', serial_size, serial_offset)
+    if ue5:
+        out += struct.pack('<qq', 4, serial_size)  # ScriptSerializationStart/EndOffset, tính từ đầu export
+    out += bytes(12)
+    out += bytes(4) if ue5 else bytes(16)  # bIsInheritedInstance (UE5) / PackageGuid (UE4)
+    out += bytes(4 + 4 + 4) + (bytes(4) if ue5 else b'') + bytes(20)
+    return out
+
+def build_package(legacy_version: int, written: tuple, ue4: int, ue5: int, package_flags: int):
+    """
+    Package tổng hợp: summary, name map, export map với 2 export, export 0 chứa FString "Hello"
+
+    Returns:
+        tuple: (dữ liệu, vị trí FString "Hello")
+    """
+    exports = [b'\x00' * 4 + _fstring("Hello") + b'\x00' * 6, b'\x00' * 12]
+    o = dict.fromkeys(('header', 'names', 'imports', 'depends', 'exports', 'registry', 'bulk'), 0)
+    summary_size = len(_summary(legacy_version, written, ue4, ue5, package_flags, o))
+    o['names'] = summary_size
+    o['imports'] = o['names'] + len(_fstring("None")) + 4
+    o['exports'] = o['imports']
+    export_size = len(_export(ue5, 0, 0))
+    o['depends'] = o['registry'] = o['exports'] + 2 * export_size
+    o['header'] = o['depends'] + 8
+    o['bulk'] = o['header'] + sum(len(body) for body in exports)
+
+    data = _summary(legacy_version, written, ue4, ue5, package_flags, o) + _fstring("None") + bytes(4)
+    offset = o['header']
+    for body in exports:
+        data += _export(ue5, len(body), offset)
+        offset += len(body)
+    data += bytes(o['header'] - len(data)) + b''.join(exports)
+    return data, o['header'] + 4
+
+def check_relocation_after_edit(data: bytes, text_position: int, expect_script_offsets: bool):
+    fields, reason = parse_package_offsets(data)
+    assert reason is None, reason
+    values = {field['name']: field['value'] for field in fields}
+    assert values['Export[1].SerialOffset'] == values['Export[0].SerialOffset'] + values['Export[0].SerialSize']
+    assert ('Export[0].ScriptSerializationEndOffset' in values) == expect_script_offsets
+
+    # Thay "Hello" (10 byte) bằng FString dài hơn 7 byte
+    replacement = _fstring("Xin chao ban")
+    table = DeltaTable([{'position': text_position, 'old_length': 10, 'size_change': len(replacement) - 10}])
+    new_data = bytearray(data[:text_position] + replacement + data[text_position + 10:])
+    changed, unclassified = relocate_offsets(data, new_data, fields, table)
+    assert unclassified == []
+
+    new_fields, reason = parse_package_offsets(bytes(new_data))
+    assert reason is None, reason
+    new_values = {field['name']: field['value'] for field in new_fields}
+    assert new_values['Export[0].SerialSize'] == values['Export[0].SerialSize'] + 7
+    assert new_values['Export[1].SerialOffset'] == values['Export[1].SerialOffset'] + 7
+    assert new_values['BulkDataStartOffset'] == len(new_data)
+    # Các trường trong header (trước text) không đổi
+    for name in ('TotalHeaderSize', 'NameOffset', 'ExportOffset', 'Export[0].SerialOffset'):
+        assert new_values[name] == values[name]
+    expected_changed = 3  # SerialSize export 0, SerialOffset export 1, BulkDataStartOffset
+    if expect_script_offsets:
+        assert new_values['Export[0].ScriptSerializationStartOffset'] == 4  # Trước text: giữ nguyên
+        assert new_values['Export[0].ScriptSerializationEndOffset'] == values['Export[0].ScriptSerializationEndOffset'] + 7
+        assert new_values['PayloadTocOffset'] == len(new_data)
+        expected_changed += 2  # ScriptSerializationEndOffset export 0, PayloadTocOffset
+    assert changed == expected_changed
+
+def test_delta_table_and_relocation():
+    # Bản ghi tại 100 (dài 20) tăng 6 byte, bản ghi tại 300 (dài 10) giảm 4 byte
+    table = DeltaTable([
+        {'position': 300, 'old_length': 10, 'size_change': -4},
+        {'position': 100, 'old_length': 20, 'size_change': 6},
+        {'position': 200, 'old_length': 8, 'size_change': 0},
+    ])
+
+    assert table.map(50) == 50
+    assert table.map(100) == 100  # Đầu bản ghi đã thay giữ nguyên chỗ
+    assert table.map(110) is None  # Giữa bản ghi đã thay
+    assert table.map(120) == 126
+    assert table.map(310) == 312
+    assert table.total == 2
+
+    original = bytearray(400)
+    fields = [
+        {'name': 'ExportOffset', 'position': 0, 'format': '<i', 'value': 320, 'kind': 'offset', 'base': 0},
+        {'name': 'SerialSize', 'position': 4, 'format': '<q', 'value': 250, 'kind': 'span', 'base': 90},
+        {'name': 'Broken', 'position': 12, 'format': '<i', 'value': 305, 'kind': 'offset', 'base': 0},
+    ]
+    new_data = bytearray(original) + bytearray(table.total)
+    changed, unclassified = relocate_offsets(bytes(original), new_data, fields, table)
+
+    assert changed == 2
+    assert struct.unpack_from('<i', new_data, 0)[0] == 322
+    assert struct.unpack_from('<q', new_data, 4)[0] == 252
+    assert len(unclassified) == 1 and unclassified[0].startswith('Broken')
+
+def test_versioned_ue4_package():
+    data, text_position = build_package(-7, (VER_UE4_LATEST,), VER_UE4_LATEST, 0, 0)
+    check_relocation_after_edit(data, text_position, expect_script_offsets=False)
+
+def test_unversioned_ue5_package():
+    # Cooked UE5: version = 0, layout được dò theo vị trí name map
+    data, text_position = build_package(-8, (0, 0), VER_UE4_LATEST, VER_UE5_SCRIPT_SERIALIZATION_OFFSET,
+                                        PKG_FILTER_EDITOR_ONLY)
+    check_relocation_after_edit(data, text_position, expect_script_offsets=True)
+
+if __name__ == '__main__':
+    test_delta_table_and_relocation()
+    test_versioned_ue4_package()
+    test_unversioned_ue5_package()
+    print("✅ Offset relocation OK")
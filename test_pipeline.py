@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import io
+import json
+import os
+
+from auto_translator import TRANSLATION_STATE_KEY, source_hash
+from test_text_scanner import build_asset
+from test_translate_many import stub_translator
+from uasset_text_extractor import UAssetTextExtractor
+
+TEXTS = ["Open the chest", "Close the door", "Network error"]
+
+def write_original(path='original/GDSMenuText.uasset'):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(build_asset(TEXTS))
+    return path
+
+def extract(path):
+    with contextlib.redirect_stdout(io.StringIO()):
+        extractor = UAssetTextExtractor()
+        return extractor, extractor.extract_texts(path)
+
+def test_pipeline_extract_translate_rebuild():
+    with stub_translator() as translator:
+        original = write_original()
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator.run_pipeline([original], import_folder='import', json_folder='json_out')
+
+        # File .uasset đã dịch: text mới đúng vị trí, offset/trường kích thước hợp lệ
+        _, rebuilt = extract(os.path.join('import', 'GDSMenuText.uasset'))
+        assert [entry['original_text'] for entry in rebuilt['text_entries']] == [f"[VI] {text}" for text in TEXTS]
+        with open(os.path.join('json_out', 'GDSMenuText_texts.json'), 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        assert [entry['translated_text'] for entry in data['text_entries']] == [f"[VI] {text}" for text in TEXTS]
+        extractor, _ = extract(original)
+        with open(os.path.join('import', 'GDSMenuText.uasset'), 'rb') as f:
+            assert extractor.verify_uasset(f.read(), data) == []
+        assert translator.stats['translated'] == len(TEXTS)
+
+def test_pipeline_without_json_output_reuses_previous_translations():
+    with stub_translator() as translator:
+        original = write_original()
+        # Bản dịch của lần chạy trước (engine thật) cho entry đầu tiên
+        _, previous = extract(original)
+        previous['text_entries'][0]['translated_text'] = "Mở rương"
+        previous['text_entries'][0][TRANSLATION_STATE_KEY] = {'source_hash': source_hash(TEXTS[0]),
+                                                               'engine': 'gemini', 'status': 'done'}
+        os.makedirs('translated')
+        with open(os.path.join('translated', 'GDSMenuText_texts.json'), 'w', encoding='utf-8') as f:
+            json.dump(previous, f)
+
+        # Dry run: chỉ in kế hoạch
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator.run_pipeline([original], import_folder='import', dry_run=True)
+        assert not os.path.exists('import')
+        assert translator.engine.usage['requests'] == 0
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator.run_pipeline([original], import_folder='import')
+        _, rebuilt = extract(os.path.join('import', 'GDSMenuText.uasset'))
+        assert [entry['original_text'] for entry in rebuilt['text_entries']] == \
+            ["Mở rương", "[VI] Close the door", "[VI] Network error"]
+        assert translator.engine.usage['requests'] == 2
+
+        # Không có json_folder: không ghi file JSON nào, bản dịch cũ giữ nguyên
+        assert sorted(os.listdir('.')) == ['import', 'original', 'translated', 'translation_cache.stub.json']
+        with open(os.path.join('translated', 'GDSMenuText_texts.json'), 'r', encoding='utf-8') as f:
+            assert json.load(f) == previous
+
+if __name__ == '__main__':
+    test_pipeline_extract_translate_rebuild()
+    test_pipeline_without_json_output_reuses_previous_translations()
+    print("✅ Pipeline OK")
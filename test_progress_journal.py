@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import io
+import json
+import os
+
+from test_translate_many import stub_translator
+
+TEXTS = ["Open the chest", "Close the door", "Exit Craft Mode?", "Network error", "Enter a name.", "Build here?"]
+
+def test_translate_json_file_resumes_from_journal():
+    with stub_translator() as translator:
+        entries = [{'id': i, 'original_text': text, 'translated_text': text} for i, text in enumerate(TEXTS)]
+        with open('texts.json', 'w', encoding='utf-8') as f:
+            json.dump({'text_entries': entries}, f)
+
+        # Lần chạy đầu bị dừng (Ctrl+C) sau khi dịch xong 2 entries
+        engine = translator.engine
+        original_translate = engine.translate
+        calls = []
+
+        def interrupted_translate(masked_text, hints=""):
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            calls.append(masked_text)
+            return original_translate(masked_text, hints)
+
+        engine.translate = interrupted_translate
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                translator.translate_json_file('texts.json', 'texts_vi.json')
+            assert False, "KeyboardInterrupt phải được truyền ra ngoài"
+        except KeyboardInterrupt:
+            pass
+        assert os.path.exists('texts_vi.json.progress.jsonl')
+
+        # Lần chạy sau (cache rỗng để chắc chắn 2 entries đầu lấy từ journal): chỉ dịch phần còn lại
+        engine.translate = original_translate
+        translator.cache = {}
+        translator.stats = {key: 0 for key in translator.stats}
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator.translate_json_file('texts.json', 'texts_vi.json')
+
+        assert translator.stats['resumed'] == 2
+        assert translator.stats['translated'] == len(TEXTS) - 2
+        assert not os.path.exists('texts_vi.json.progress.jsonl')
+        with open('texts_vi.json', 'r', encoding='utf-8') as f:
+            translated = [entry['translated_text'] for entry in json.load(f)['text_entries']]
+        assert translated == [f"[VI] {text}" for text in TEXTS]
+
+def test_journal_not_replayed_onto_changed_source_text():
+    with stub_translator() as translator:
+        entries = [{'id': i, 'original_text': text, 'translated_text': text} for i, text in enumerate(TEXTS)]
+        with open('texts.json', 'w', encoding='utf-8') as f:
+            json.dump({'text_entries': entries}, f)
+
+        # Entry 1 lỗi nên journal được giữ lại
+        engine = translator.engine
+        original_translate = engine.translate
+
+        def fail_door(masked_text, hints=""):
+            if masked_text == "Close the door":
+                raise RuntimeError("stub: lỗi giả lập")
+            return original_translate(masked_text, hints)
+
+        engine.translate = fail_door
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator.translate_json_file('texts.json', 'texts_vi.json')
+        assert os.path.exists('texts_vi.json.progress.jsonl')
+
+        # Extract lại sau bản vá game: cùng số entries nhưng entry 0 đổi text
+        engine.translate = original_translate
+        entries[0]['original_text'] = entries[0]['translated_text'] = "Open the big chest"
+        with open('texts.json', 'w', encoding='utf-8') as f:
+            json.dump({'text_entries': entries}, f)
+        os.remove('texts_vi.json')
+        translator.stats = {key: 0 for key in translator.stats}
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator.translate_json_file('texts.json', 'texts_vi.json')
+
+        with open('texts_vi.json', 'r', encoding='utf-8') as f:
+            translated = [entry['translated_text'] for entry in json.load(f)['text_entries']]
+        assert translated[0] == "[VI] Open the big chest"
+        assert translated[1] == "[VI] Close the door"
+        assert translator.stats['resumed'] == len(TEXTS) - 2
+
+if __name__ == '__main__':
+    test_translate_json_file_resumes_from_journal()
+    test_journal_not_replayed_onto_changed_source_text()
+    print("✅ Progress journal OK")
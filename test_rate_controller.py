@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading
+from unittest import mock
+
+from rate_controller import AIMDRateLimiter, RateController
+
+class FakeClock:
+    """Đồng hồ giả cho rate_controller: thời gian chỉ trôi khi sleep() hoặc advance()"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.now += seconds
+
+    advance = sleep
+
+def test_additive_increase_on_success():
+    with mock.patch('rate_controller.time', FakeClock()):
+        limiter = AIMDRateLimiter(1.0, max_rate=2.0, increase_step=0.25)
+        limiter.on_success()
+        limiter.on_success()
+        assert limiter.rate == 1.5
+        assert limiter.successes == 2
+        for _ in range(10):
+            limiter.on_success()
+        assert limiter.rate == 2.0  # Không vượt max_rate
+
+def test_multiplicative_decrease_and_cooldown_on_429():
+    clock = FakeClock()
+    with mock.patch('rate_controller.time', clock):
+        limiter = AIMDRateLimiter(4.0, min_rate=0.5)
+        limiter.on_rate_limit()
+        assert limiter.rate == 2.0
+        assert limiter.wait_time() == 0.5  # Nghỉ 1 khoảng request ở tốc độ mới
+
+        # 429 dồn dập trong cùng một giây chỉ tính là một lần giảm
+        limiter.on_rate_limit()
+        assert limiter.rate == 2.0 and limiter.rate_limited == 2
+
+        # 429 liên tiếp sau đó: giảm tiếp và thời gian nghỉ gấp đôi
+        clock.advance(1.0)
+        limiter.on_rate_limit()
+        assert limiter.rate == 1.0
+        assert limiter.wait_time() == 2.0
+        clock.advance(2.0)
+        limiter.on_rate_limit()
+        assert limiter.rate == 0.5  # Không thấp hơn min_rate
+        clock.advance(8.0)
+        limiter.on_rate_limit()
+        assert limiter.rate == 0.5
+
+        # Thành công thì chuỗi 429 liên tiếp được reset
+        clock.advance(60.0)
+        limiter.on_success()
+        clock.advance(60.0)
+        limiter.on_rate_limit()
+        assert limiter.wait_time() == 1 / limiter.rate
+
+        # Limiter chung của engine không tạm nghỉ
+        engine = AIMDRateLimiter(4.0, decrease_factor=0.8, cooldown=False)
+        engine.on_rate_limit()
+        assert engine.rate == 3.2 and engine.wait_time() == 0.0
+
+def test_try_reserve_refuses_when_busy():
+    clock = FakeClock()
+    with mock.patch('rate_controller.time', clock):
+        limiter = AIMDRateLimiter(2.0)
+        assert limiter.try_reserve()
+        assert not limiter.try_reserve()  # Slot tiếp theo sau 0.5 giây
+        assert limiter.reserve() == 0.5  # reserve() vẫn giữ chỗ và trả về thời gian chờ
+        clock.advance(0.5)
+        assert not limiter.try_reserve()
+        clock.advance(0.5)
+        assert limiter.try_reserve()
+
+        controller = RateController(['key-1'], 60)
+        assert controller.try_acquire('key-1')
+        assert not controller.try_acquire('key-1')
+        # acquire() chờ tới lượt, hoặc từ chối nếu phải chờ lâu hơn max_wait
+        assert not controller.acquire('key-1', max_wait=0.5)
+        start = clock.now
+        assert controller.acquire('key-1')
+        assert clock.now - start == 1.0
+
+def test_best_key_skips_cooling_key():
+    clock = FakeClock()
+    with mock.patch('rate_controller.time', clock):
+        controller = RateController(['key-1', 'key-2'], 60)
+        assert controller.best_key('key-1') == 'key-1'  # Giữ key hiện tại khi không phải chờ lâu hơn
+
+        controller.on_rate_limit('key-1')
+        assert controller.best_key('key-1') == 'key-2'
+        # Hedge không được dùng key của request chính: chỉ còn key đang nghỉ
+        assert controller.best_key('key-2', exclude='key-2') == 'key-1'
+
+        clock.advance(controller.keys['key-1'].wait_time())
+        assert controller.best_key('key-1') == 'key-1'
+
+def test_new_key_registered_once_from_many_threads():
+    controller = RateController(['key-1'], 60)
+    barrier = threading.Barrier(16)
+    limiters = []
+
+    def worker():
+        barrier.wait()
+        limiters.append(controller._limiter('key-2'))
+
+    threads = [threading.Thread(target=worker) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert controller.key_order == ['key-1', 'key-2']
+    assert len({id(limiter) for limiter in limiters}) == 1
+
+if __name__ == '__main__':
+    test_additive_increase_on_success()
+    test_multiplicative_decrease_and_cooldown_on_429()
+    test_try_reserve_refuses_when_busy()
+    test_best_key_skips_cooling_key()
+    test_new_key_registered_once_from_many_threads()
+    print("✅ Rate controller OK")
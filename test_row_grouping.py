@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from auto_translator import group_table_rows
+
+ROW = ["Open the chest", "Ouvrir le coffre", "Apri il forziere", "Truhe öffnen", "Abrir el cofre"]
+
+def make_entries(texts, gaps=None, start=100):
+    """Entry liền nhau trong file (4 byte độ dài + text), gaps: chỉ số entry -> số byte chèn trước entry đó"""
+    entries = []
+    position = start
+    for index, text in enumerate(texts):
+        position += (gaps or {}).get(index, 0)
+        length = len(text.encode('utf-8')) + 1
+        entries.append({'id': index, 'original_text': text, 'position': position, 'length': length})
+        position += 4 + length
+    return entries
+
+def test_exact_row_with_cjk_neighbours():
+    # Chữ Nhật đứng trước, chữ Trung/Hàn đứng sau 5 biến thể: cả hàng dùng text tiếng Anh
+    entries = make_entries(["宝箱を開ける"] + ROW + ["打开宝箱", "상자 열기"])
+    assert group_table_rows(entries) == {index: 1 for index in range(8)}
+
+    # Hai hàng liền nhau được gom riêng nhờ khoảng cách giữa hai hàng
+    entries = make_entries(ROW + ROW, gaps={5: 16})
+    assert group_table_rows(entries) == {**{i: 0 for i in range(5)}, **{i: 5 for i in range(5, 10)}}
+
+def test_incomplete_rows_stay_ungrouped():
+    # Có khoảng trống giữa hai biến thể: tách thành hai run, không run nào đủ 5 biến thể
+    assert group_table_rows(make_entries(ROW, gaps={3: 8})) == {}
+
+    # Biến thể tiếng Pháp bị lọc trùng lúc extract: chỗ của nó thành khoảng trống
+    entries = [entry for entry in make_entries(ROW) if entry['id'] != 1]
+    assert group_table_rows(entries) == {}
+    assert group_table_rows(entries, max_gap=64) == {}  # Gom liền cũng chỉ còn 4 biến thể
+
+    # 6 biến thể liền nhau hoặc chữ CJK chen giữa: không biết chắc đâu là tiếng Anh
+    assert group_table_rows(make_entries(ROW + ["Otwórz skrzynię"])) == {}
+    assert group_table_rows(make_entries(ROW[:2] + ["宝箱を開ける"] + ROW[2:])) == {}
+
+    # Entry cũ không có vị trí: không gom
+    entries = make_entries(ROW)
+    del entries[0]['position']
+    assert group_table_rows(entries) == {}
+
+if __name__ == '__main__':
+    test_exact_row_with_cjk_neighbours()
+    test_incomplete_rows_stay_ungrouped()
+    print("✅ group_table_rows OK")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from auto_translator import fill_template, make_template, mask_tags, missing_placeholders, restore_tags
+
+def test_make_and_fill_template():
+    template, values = make_template("Deal 12 damage to <CMD_Enemy> in 3 turns [C]")
+    assert template == "Deal {0} damage to {1} in {2} turns {3}"
+    assert values == ["12", "<CMD_Enemy>", "3", "[C]"]
+
+    # Bản dịch được đổi thứ tự placeholder vẫn điền đúng giá trị
+    assert fill_template("Gây {0} sát thương lên {1} trong {2} lượt {3}", values) == \
+        "Gây 12 sát thương lên <CMD_Enemy> trong 3 lượt [C]"
+    assert fill_template("{3} Trong {2} lượt: {1} nhận {0}", values) == "[C] Trong 3 lượt: <CMD_Enemy> nhận 12"
+
+    # Thiếu, lặp hoặc thừa placeholder: không điền
+    assert fill_template("Gây {0} sát thương lên {1} {3}", values) is None
+    assert fill_template("Gây {0} {0} sát thương lên {1} trong {2} lượt {3}", values) is None
+    assert fill_template("Gây {0} sát thương lên {1} trong {2} lượt {3} {4}", values) is None
+
+    # Số dính vào chữ không phải giá trị
+    assert make_template("Level 3/10 on MK2") == ("Level {0}/{1} on MK2", ["3", "10"])
+
+def test_make_template_keeps_existing_braces():
+    # Text kiểu FText đã có {0}: giữ nguyên, không đánh số lại
+    assert make_template("{0} Gold collected") == ("{0} Gold collected", [])
+    assert make_template("Obtain {0} x {1} [C]") == ("Obtain {0} x {1} [C]", [])
+    assert fill_template("[VI] {0} Gold collected", []) is None  # translate_many dùng nguyên bản dịch khi values rỗng
+
+def test_mask_and_restore_tags_after_existing_placeholders():
+    # Tags được đánh số sau placeholder có sẵn
+    masked, tags = mask_tags("Obtain {0} x {1} <CMD_Item> [C]")
+    assert masked == "Obtain {0} x {1} {2} {3}"
+    assert tags == ["<CMD_Item>", "[C]"]
+
+    assert restore_tags("Nhận {3} {2} {0} x {1}", masked, tags) == "Nhận [C] <CMD_Item> {0} x {1}"
+    assert restore_tags("Nhận {0} x {1} {2}", masked, tags) is None  # Mất {3}
+    assert restore_tags("Nhận {0} x {1} {2} {2} {3}", masked, tags) is None  # Lặp {2}
+
+    # Không có placeholder sẵn: tags bắt đầu từ {0}
+    masked, tags = mask_tags("[PLAYER] opened <CMD_Chest>")
+    assert (masked, tags) == ("{0} opened {1}", ["[PLAYER]", "<CMD_Chest>"])
+    assert restore_tags("{0} đã mở {1}", masked, tags) == "[PLAYER] đã mở <CMD_Chest>"
+
+    # Không có tag: bản dịch giữ nguyên nếu đủ placeholder
+    masked, tags = mask_tags("{0} Gold collected")
+    assert (masked, tags) == ("{0} Gold collected", [])
+    assert restore_tags("Nhận {0} vàng", masked, tags) == "Nhận {0} vàng"
+
+def test_missing_placeholders():
+    masked = "Obtain {0} x {1} {2}"
+    assert missing_placeholders("Nhận {0} x {1} {2}", masked) == []
+    assert missing_placeholders("Nhận {0} {2}", masked) == ["{1}"]
+    assert missing_placeholders("Nhận {0} {0} x {1}", masked) == ["{0}", "{2}"]
+
+if __name__ == '__main__':
+    test_make_and_fill_template()
+    test_make_template_keeps_existing_braces()
+    test_mask_and_restore_tags_after_existing_placeholders()
+    test_missing_placeholders()
+    print("✅ Templates OK")
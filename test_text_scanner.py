@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import struct
+
+from uasset_text_extractor import iter_text_entries
+
+def utf8_entry(text: str) -> bytes:
+    encoded = text.encode('utf-8') + b'\x00'
+    return struct.pack('<i', len(encoded)) + encoded
+
+def utf16_entry(text: str) -> bytes:
+    return struct.pack('<i', -(len(text) + 1)) + text.encode('utf-16-le') + b'\x00\x00'
+
+def build_asset(texts, size_offset_position: int = 0x30) -> bytes:
+    """
+    File .uasset giả không có package summary: con trỏ size_offset_position tại 0x20, trường kích thước
+    tại size_offset_position + 8, sau đó các entry UTF-8 liền nhau và phần đệm cuối file
+    """
+    data = bytearray(size_offset_position + 12)
+    struct.pack_into('<I', data, 0x20, size_offset_position)
+    data += b''.join(utf8_entry(text) for text in texts) + bytes(256)
+    struct.pack_into('<I', data, size_offset_position + 8, len(data) - (size_offset_position + 12) - 104)
+    return bytes(data)
+
+def build_buffer():
+    """Header giả, 3 entry (utf8, utf16, utf8) xen byte rác, trả về buffer và vị trí từng entry"""
+    parts = [b'\xc1\x83\x2a\x9e' + b'\x00' * 12, utf8_entry("Open the chest"), b'\xff\x01',
+             utf16_entry("Thoát chế độ chế tạo"), b'\x07' * 5, utf8_entry("Network error"), utf8_entry("ab")]
+    positions, offset = [], 0
+    for part in parts:
+        positions.append(offset)
+        offset += len(part)
+    return b''.join(parts), positions[1], positions[3], positions[5]
+
+def test_detects_utf8_and_utf16_entries():
+    data, first, second, third = build_buffer()
+    entries = list(iter_text_entries(data))
+
+    assert [(entry['key'], entry['original_text'], entry['position']) for entry in entries] == [
+        ('utf8_entry_0', "Open the chest", first),
+        ('utf16_entry_1', "Thoát chế độ chế tạo", second),
+        ('utf8_entry_2', "Network error", third),
+    ]
+    assert entries[0]['length'] == len("Open the chest") + 1
+    assert entries[1]['length'] == (len("Thoát chế độ chế tạo") + 1) * 2
+
+def test_scan_window():
+    data, first, second, third = build_buffer()
+
+    # Chỉ entry nằm trọn trong [start, end) được trả về, id đánh lại từ 0
+    entries = list(iter_text_entries(data, second, third))
+    assert [(entry['key'], entry['position']) for entry in entries] == [('utf16_entry_0', second)]
+
+    # end cắt ngang entry cuối: bỏ entry đó
+    entries = list(iter_text_entries(data, first, third + 6))
+    assert [entry['original_text'] for entry in entries] == ["Open the chest", "Thoát chế độ chế tạo"]
+
+    # end vượt quá dữ liệu không gây lỗi
+    assert len(list(iter_text_entries(data, third, len(data) + 64))) == 1
+
+if __name__ == '__main__':
+    test_detects_utf8_and_utf16_entries()
+    test_scan_window()
+    print("✅ iter_text_entries OK")
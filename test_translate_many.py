@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+
+from auto_translator import AutoTranslator, TranslationError
+from translation_scheduler import TranslationBudget
+
+@contextlib.contextmanager
+def stub_translator(api_keys=('stub-key-1',), **options):
+    """AutoTranslator với engine stub, chạy trong thư mục tạm (cache/từ điển riêng)"""
+    previous_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                translator = AutoTranslator(ai_engine='stub', api_keys=list(api_keys), engine_options=options)
+            yield translator
+        finally:
+            os.chdir(previous_cwd)
+
+def test_translate_many_keeps_ftext_placeholders():
+    texts = ["{0} Gold collected", "Obtain {0} x {1}", "Collected 5 coins", "Collected 12 coins"]
+    with stub_translator() as translator:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = translator.translate_many(texts)
+
+        # Text có sẵn {0} (FText) dùng nguyên bản dịch, không bị coi là mất placeholder
+        assert results["{0} Gold collected"] == ("[VI] {0} Gold collected", 'stub')
+        assert results["Obtain {0} x {1}"] == ("[VI] Obtain {0} x {1}", 'stub')
+        # Biến thể số vẫn dùng chung template
+        assert results["Collected 12 coins"] == ("[VI] Collected 12 coins", 'stub')
+
+        # Cache và translate_text cho cùng kết quả
+        assert translator.cache["{0} Gold collected"] == "[VI] {0} Gold collected"
+        assert translator.translate_text("{0} Gold collected") == ("[VI] {0} Gold collected", 'cache')
+
+def test_translate_many_does_not_cache_broken_template():
+    with stub_translator() as translator:
+        # Engine làm mất placeholder: bản dịch không điền lại được số, không được cache
+        translator.engine.translate = lambda masked_text, hints="": "[VI] coins"
+        for engine in translator.engines.values():
+            engine.translate = translator.engine.translate
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = translator.translate_many(["Collected 5 coins"])
+
+        assert results["Collected 5 coins"] == ("Collected 5 coins", 'failed')
+        assert "Collected {0} coins" not in translator.cache
+
+def test_single_flight_coalesces_concurrent_calls():
+    with stub_translator() as translator:
+        calls = []
+        release = threading.Event()
+
+        def call():
+            calls.append(threading.current_thread().name)
+            release.wait(5)
+            raise TranslationError("rate limit on every API key")
+
+        outcomes = []
+
+        def worker():
+            try:
+                outcomes.append(translator.single_flight("Open the chest", call))
+            except TranslationError as e:
+                outcomes.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        # Chờ 7 luồng theo sau đều đang chờ kết quả của luồng dẫn đầu rồi mới cho call() kết thúc
+        deadline = time.monotonic() + 5
+        while sum(translator.metrics.counters.get('translator_coalesced_total', {}).values()) < 7:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert len(calls) == 1
+        assert len(outcomes) == 8
+        assert all(isinstance(outcome, TranslationError) for outcome in outcomes)
+        assert len({id(outcome) for outcome in outcomes}) == 1  # Cùng một exception của luồng dẫn đầu
+        assert translator._inflight == {}
+
+        # Key đã xong thì lần gọi sau chạy lại call()
+        assert translator.single_flight("Open the chest", lambda: "Mở rương") == "Mở rương"
+
+def test_translate_many_defers_texts_after_budget():
+    texts = ["Open the chest", "Close the door", "Collected 5 coins", "Collected 7 coins", "Exit Craft Mode?"]
+    with stub_translator() as translator:
+        budget = TranslationBudget(max_calls=2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = translator.translate_many(texts, budget=budget)
+
+        # Hai request đầu được gửi theo thứ tự; hai biến thể số cùng template nên cùng bị hoãn
+        assert results["Open the chest"] == ("[VI] Open the chest", 'stub')
+        assert results["Close the door"] == ("[VI] Close the door", 'stub')
+        assert results["Collected 5 coins"] == ("Collected 5 coins", 'deferred')
+        assert results["Collected 7 coins"] == ("Collected 7 coins", 'deferred')
+        assert results["Exit Craft Mode?"] == ("Exit Craft Mode?", 'deferred')
+        assert budget.exhausted_reason == 'calls'
+        assert "Exit Craft Mode?" not in translator.cache
+
+def test_stub_run_keeps_production_cache_and_entries_untouched():
+    with stub_translator() as translator:
+        with open('texts.json', 'w', encoding='utf-8') as f:
+            json.dump({'text_entries': [{'id': 0, 'original_text': "Open the chest", 'translated_text': "Open the chest"}]}, f)
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator.translate_json_file('texts.json', 'texts_vi.json')
+
+        # Bản dịch giả nằm trong cache riêng của engine stub, không vào translation_cache.json
+        assert not os.path.exists('translation_cache.json')
+        with open('translation_cache.stub.json', 'r', encoding='utf-8') as f:
+            assert json.load(f) == {"Open the chest": "[VI] Open the chest"}
+
+        # Entry không được đánh dấu 'done', lần chạy bằng engine thật sẽ dịch lại
+        with open('texts_vi.json', 'r', encoding='utf-8') as f:
+            entry = json.load(f)['text_entries'][0]
+        assert entry['translation_state']['status'] == 'simulated'
+        assert not translator.is_entry_done(entry, "Open the chest")
+
+def test_budget_counts_every_engine_call():
+    # Dịch lại vì sai placeholder: mỗi lần gửi đều bị trừ, dừng thử lại khi hết ngân sách
+    with stub_translator() as translator:
+        sent = []
+
+        def drop_placeholder(masked_text, hints=""):
+            sent.append(masked_text)
+            return "[VI] thiếu placeholder"
+
+        translator.engine.translate = drop_placeholder
+        budget = TranslationBudget(max_calls=2)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = translator.translate_many(["Open [C] now"], budget=budget)
+        assert results["Open [C] now"] == ("Open [C] now", 'deferred')
+        assert len(sent) == budget.calls == 2
+
+    # 429 rồi xoay vòng key: mỗi lần thử lại cũng bị trừ
+    with stub_translator(api_keys=('stub-key-1', 'stub-key-2'), rate_limit_rate=1.0) as translator:
+        budget = TranslationBudget(max_calls=3)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = translator.translate_many(["Open the chest"], budget=budget)
+        assert results["Open the chest"] == ("Open the chest", 'deferred')
+        assert sum(engine.usage['requests'] for engine in translator.engines.values()) == 0
+        assert sum(translator.metrics.counters['translator_requests_total'].values()) == 3
+
+def test_translate_action_respects_budget():
+    with stub_translator() as translator:
+        texts = ["Open the chest", "Close the door", "Network error"]
+        with open('texts.json', 'w', encoding='utf-8') as f:
+            json.dump({'text_entries': [{'id': i, 'original_text': text, 'translated_text': text}
+                                        for i, text in enumerate(texts)]}, f)
+        translator.budget = TranslationBudget(max_calls=1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            translator.translate_json_file('texts.json', 'texts_vi.json')
+
+        assert translator.stats['translated'] == 1
+        assert translator.stats['deferred'] == 2
+        with open('texts_vi.json', 'r', encoding='utf-8') as f:
+            entries = json.load(f)['text_entries']
+        assert entries[0]['translated_text'] == "[VI] Open the chest"
+        # Entry chưa dịch giữ nguyên, không có trạng thái: lần chạy sau dịch tiếp
+        assert entries[1]['translated_text'] == "Close the door" and 'translation_state' not in entries[1]
+
+if __name__ == '__main__':
+    test_translate_many_keeps_ftext_placeholders()
+    test_translate_many_does_not_cache_broken_template()
+    test_single_flight_coalesces_concurrent_calls()
+    test_translate_many_defers_texts_after_budget()
+    test_stub_run_keeps_production_cache_and_entries_untouched()
+    test_budget_counts_every_engine_call()
+    test_translate_action_respects_budget()
+    print("✅ translate_many OK")
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import contextlib
+import io
+import json
+import os
+
+from test_text_scanner import build_asset
+from test_translate_many import stub_translator
+from translation_daemon import INVALID_PARAMS, INVALID_REQUEST, METHOD_NOT_FOUND, TranslationDaemon
+from uasset_text_extractor import UAssetTextExtractor
+
+TEXTS = ["Open the chest", "Close the door", "Network error"]
+
+@contextlib.contextmanager
+def stub_daemon():
+    """Daemon với engine stub, phục vụ một file .uasset giả đã extract vào folder translated"""
+    with stub_translator() as translator:
+        with open('GDSMenuText.uasset', 'wb') as f:
+            f.write(build_asset(TEXTS))
+        os.makedirs('translated')
+        with contextlib.redirect_stdout(io.StringIO()):
+            data = UAssetTextExtractor().extract_texts('GDSMenuText.uasset')
+            with open(os.path.join('translated', 'GDSMenuText_texts.json'), 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            daemon = TranslationDaemon(translator, 'translated', 'import')
+            daemon.load()
+        yield daemon
+
+def call(daemon, method, params=None, request_id=1):
+    request = {'jsonrpc': '2.0', 'id': request_id, 'method': method}
+    if params is not None:
+        request['params'] = params
+    with contextlib.redirect_stdout(io.StringIO()):
+        return daemon.dispatch(request)
+
+def test_dispatch_routing_and_errors():
+    with stub_daemon() as daemon:
+        response = call(daemon, 'status', request_id=7)
+        assert response['id'] == 7 and response['jsonrpc'] == '2.0'
+        assert response['result']['files']['GDSMenuText_texts']['entries'] == len(TEXTS)
+
+        response = call(daemon, 'translate', {'text': "Open the chest"})
+        assert response['result'] == {'translation': "[VI] Open the chest", 'source': 'stub'}
+
+        # Lỗi trả về dạng error object, giữ id của request
+        response = call(daemon, 'delete_everything', request_id=3)
+        assert response == {'jsonrpc': '2.0', 'id': 3,
+                            'error': {'code': METHOD_NOT_FOUND, 'message': "Không có method: delete_everything"}}
+        assert daemon.dispatch({'id': 4})['error']['code'] == INVALID_REQUEST
+        assert daemon.dispatch(['status'])['error']['code'] == INVALID_REQUEST
+        assert call(daemon, 'rebuild', ['GDSMenuText'])['error']['code'] == INVALID_PARAMS
+        assert call(daemon, 'translate', {})['error']['code'] == INVALID_PARAMS
+        assert call(daemon, 'update_entry', {'file': 'GDSMenuText', 'id': 0})['error']['code'] == INVALID_PARAMS
+        for params in ({'file': 'Missing', 'id': 0, 'translated_text': "x"},
+                       {'file': 'GDSMenuText', 'id': 99, 'translated_text': "x"}):
+            response = call(daemon, 'update_entry', params)
+            assert response['error']['code'] == INVALID_PARAMS and 'result' not in response
+        assert call(daemon, 'verify', {'file': 'GDSMenuText'})['error']['code'] == INVALID_PARAMS  # Chưa rebuild
+
+def test_update_entry_then_rebuild():
+    with stub_daemon() as daemon:
+        response = call(daemon, 'update_entry', {'file': 'GDSMenuText_texts.json', 'id': 1,
+                                                 'translated_text': "Đóng cửa lại", 'rebuild': True})
+        result = response['result']
+        assert result['id'] == 1 and result['translated_text'] == "Đóng cửa lại"
+        rebuild = result['rebuild']
+        assert rebuild['output'] == os.path.join('import', 'GDSMenuText.uasset')
+        assert rebuild['changed_entries'] == 1
+        assert rebuild['relocation_notes']  # File giả không có package summary
+
+        # File rebuild chứa bản sửa tay, các entry khác giữ nguyên
+        with contextlib.redirect_stdout(io.StringIO()):
+            rebuilt = UAssetTextExtractor().extract_texts(rebuild['output'])
+        assert [entry['original_text'] for entry in rebuilt['text_entries']] == \
+            ["Open the chest", "Đóng cửa lại", "Network error"]
+        assert call(daemon, 'verify', {'file': 'GDSMenuText'})['result']['ok']
+
+        # Sửa tay không vào cache dùng chung nếu không yêu cầu
+        assert "Close the door" not in daemon.translator.cache
+        call(daemon, 'update_entry', {'file': 'GDSMenuText', 'id': 2, 'translated_text': "Lỗi mạng", 'cache': True})
+        assert daemon.translator.cache["Network error"] == "Lỗi mạng"
+
+        # save ghi file JSON với trạng thái 'manual'
+        saved = call(daemon, 'save')['result']['saved']
+        assert os.path.join('translated', 'GDSMenuText_texts.json') in saved
+        with open(os.path.join('translated', 'GDSMenuText_texts.json'), 'r', encoding='utf-8') as f:
+            entry = json.load(f)['text_entries'][1]
+        assert entry['translated_text'] == "Đóng cửa lại"
+        assert entry['translation_state']['engine'] == 'manual' and entry['translation_state']['status'] == 'done'
+
+if __name__ == '__main__':
+    test_dispatch_routing_and_errors()
+    test_update_entry_then_rebuild()
+    print("✅ Translation daemon OK")
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from translation_engines import PROMPT_CACHE_MIN_TOKENS, SYSTEM_INSTRUCTION, StubEngine, estimate_tokens
+
+def test_stub_reports_cached_tokens_only_for_long_prefix():
+    # System instruction hiện tại ngắn hơn mức tối thiểu: API thật báo 0 token cache
+    assert estimate_tokens(SYSTEM_INSTRUCTION) < PROMPT_CACHE_MIN_TOKENS
+    engine = StubEngine("stub-key-1")
+    engine.translate("Open the chest")
+    engine.translate("Close the door")
+    assert engine.usage['requests'] == 2
+    assert engine.usage['cached_tokens'] == 0
+
+    # Tiền tố đủ dài: từ request thứ hai phần cố định được tính từ cache
+    engine = StubEngine("stub-key-1")
+    engine.system_instruction = "x" * (PROMPT_CACHE_MIN_TOKENS * 4)
+    engine.translate("Open the chest")
+    assert engine.usage['cached_tokens'] == 0
+    engine.translate("Close the door")
+    assert engine.usage['cached_tokens'] == estimate_tokens(engine.system_instruction)
+
+if __name__ == '__main__':
+    test_stub_reports_cached_tokens_only_for_long_prefix()
+    print("✅ StubEngine usage OK")
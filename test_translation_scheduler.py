@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from translation_scheduler import TranslationBudget
+
+def test_budget_stops_at_max_calls_and_stays_exhausted():
+    budget = TranslationBudget(max_calls=3)
+    assert [budget.reserve(100) for _ in range(3)] == [True, True, True]
+    assert budget.reserve(100) is False
+    assert budget.exhausted_reason == 'calls'
+    assert budget.calls == 3
+
+def test_budget_stops_at_max_tokens_and_stays_exhausted():
+    budget = TranslationBudget(max_tokens=1000)
+    assert budget.reserve(400)
+    # Token thực tế (usage) lớn hơn phần đã ước tính thì tính theo token thực tế
+    assert budget.reserve(300, used_tokens=600)
+    assert budget.tokens == 900
+    assert budget.reserve(200) is False
+    assert budget.exhausted_reason == 'tokens'
+    # Đã hết thì request nhỏ hơn cũng bị từ chối
+    assert budget.reserve(1) is False
+    assert budget.calls == 2
+
+def test_budget_time_limit():
+    budget = TranslationBudget(max_seconds=0)
+    assert budget.reserve(1) is False
+    assert budget.exhausted_reason == 'time'
+
+if __name__ == '__main__':
+    test_budget_stops_at_max_calls_and_stays_exhausted()
+    test_budget_stops_at_max_tokens_and_stays_exhausted()
+    test_budget_time_limit()
+    print("✅ TranslationBudget OK")
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Translation Daemon
+Giữ dữ liệu .uasset gốc, bảng entries, cache, từ điển và engine trong bộ nhớ;
+nhận lệnh dịch/sửa/rebuild/kiểm tra qua JSON-RPC trên localhost
+"""
+
+import os
+import json
+import time
+import signal
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from auto_translator import AutoTranslator, write_json_atomic
+from translation_engines import ENGINES
+from uasset_text_extractor import UAssetTextExtractor
+
+DEFAULT_PORT = 8765
+FLUSH_INTERVAL_SECONDS = 2.0  # Chu kỳ ghi các file JSON/cache đã sửa ra đĩa
+
+# Mã lỗi JSON-RPC 2.0
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+class DaemonError(Exception):
+    def __init__(self, message: str, code: int = SERVER_ERROR):
+        super().__init__(message)
+        self.code = code
+
+class AssetState:
+    def __init__(self, json_path: str, data: Dict):
+        """Một file JSON đã extract/dịch cùng extractor của file .uasset gốc (nạp khi cần)"""
+        self.json_path = json_path
+        self.data = data
+        self.entries = {entry['id']: entry for entry in data.get('text_entries', [])}
+        # File JSON có thể được extract trên Windows
+        self.original_file = data.get('file_info', {}).get('original_file', '').replace('\\', os.sep)
+        self.extractor = None
+        self.last_output = None
+        self.dirty = False
+        self.lock = threading.Lock()
+
+class TranslationDaemon:
+    def __init__(self, translator: AutoTranslator, folder: str = "translated", import_folder: str = "import"):
+        """
+        Args:
+            translator: AutoTranslator giữ cache, từ điển và engine
+            folder: Folder chứa các file JSON (bản dịch) cần phục vụ
+            import_folder: Folder ghi file .uasset đã rebuild
+        """
+        self.translator = translator
+        self.folder = folder
+        self.import_folder = import_folder
+        self.assets: Dict[str, AssetState] = {}
+        self.started_at = time.time()
+        self.methods = {
+            'translate': self.translate,
+            'update_entry': self.update_entry,
+            'rebuild': self.rebuild,
+            'verify': self.verify,
+            'save': self.save,
+            'status': self.status
+        }
+        self._cache_dirty = False
+        self._stop = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="daemon-flush", daemon=True)
+
+    def load(self):
+        """Đọc mọi file JSON trong folder vào bộ nhớ"""
+        for json_file in sorted(f for f in os.listdir(self.folder) if f.endswith('.json')):
+            json_path = os.path.join(self.folder, json_file)
+            try:
+                with open(json_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"⚠️  Bỏ qua {json_path}: {e}")
+                continue
+            self.assets[json_file[:-5]] = AssetState(json_path, data)
+        print(f"📂 Đã nạp {len(self.assets)} file từ {self.folder}")
+
+    def asset(self, params: Dict) -> AssetState:
+        """Tìm file theo params['file'] (chấp nhận GDSMenuText, GDSMenuText_texts hoặc GDSMenuText_texts.json)"""
+        name = params.get('file')
+        if not name:
+            raise DaemonError("Thiếu tham số 'file'", INVALID_PARAMS)
+        name = os.path.basename(name)
+        if name.endswith('.json'):
+            name = name[:-5]
+        for candidate in (name, f"{name}_texts"):
+            if candidate in self.assets:
+                return self.assets[candidate]
+        raise DaemonError(f"Không có file: {params['file']}", INVALID_PARAMS)
+
+    def extractor_for(self, state: AssetState) -> UAssetTextExtractor:
+        """Extractor đã nạp bytes gốc của file .uasset (chỉ đọc đĩa lần đầu)"""
+        if state.extractor is None:
+            original_file = state.original_file
+            if not original_file or not os.path.exists(original_file):
+                raise DaemonError(f"Không tìm thấy file .uasset gốc: {original_file}")
+            extractor = UAssetTextExtractor()
+            if not extractor.load_uasset(original_file):
+                raise DaemonError(f"Không thể đọc file .uasset gốc: {original_file}")
+            state.extractor = extractor
+        return state.extractor
+
+    def translate(self, params: Dict) -> Dict:
+        """Dịch một text (từ điển, cache rồi AI engine)"""
+        text = params.get('text')
+        if not isinstance(text, str):
+            raise DaemonError("Thiếu tham số 'text'", INVALID_PARAMS)
+        if not self.translator.api_keys:
+            raise DaemonError("Chưa có API key cho AI engine")
+        translation, source = self.translator.translate_text(text)
+        return {'translation': translation, 'source': source}
+
+    def update_entry(self, params: Dict) -> Dict:
+        """
+        Sửa bản dịch của một entry (theo id), tùy chọn ghi vào cache và rebuild ngay
+
+        Bản sửa tay chỉ vào cache dịch dùng chung (áp cho mọi file có cùng text) khi gửi cache=true.
+
+        Params:
+            file, id, translated_text; rebuild (mặc định False); cache (mặc định False)
+        """
+        state = self.asset(params)
+        translated_text = params.get('translated_text')
+        if not isinstance(translated_text, str):
+            raise DaemonError("Thiếu tham số 'translated_text'", INVALID_PARAMS)
+
+        with state.lock:
+            entry = state.entries.get(params.get('id'))
+            if entry is None:
+                raise DaemonError(f"Không có entry id={params.get('id')}", INVALID_PARAMS)
+            entry['translated_text'] = translated_text
+            self.translator.mark_entry(entry, entry['original_text'], 'manual')
+            state.dirty = True
+
+        if params.get('cache', False) and entry['original_text'].strip():
+            if self.translator.cache_translation(entry['original_text'].strip(), translated_text):
+                self._cache_dirty = True
+
+        result = {'file': os.path.basename(state.json_path), 'id': entry['id'], 'translated_text': translated_text}
+        if params.get('rebuild'):
+            result['rebuild'] = self.rebuild(params)
+        return result
+
+    def rebuild(self, params: Dict) -> Dict:
+        """Tạo file .uasset từ bản dịch đang có trong bộ nhớ (mặc định ghi vào import_folder)"""
+        state = self.asset(params)
+        started = time.perf_counter()
+        extractor = self.extractor_for(state)
+        output = params.get('output') or os.path.join(self.import_folder, os.path.basename(state.original_file))
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with state.lock:
+            new_data, processed_entries = extractor.build_uasset_data(state.data)
+            relocation_notes = list(extractor.relocation_notes)  # Lần rebuild khác ghi đè sau khi nhả lock
+            temp_path = f"{output}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(new_data)
+            os.replace(temp_path, output)
+            state.last_output = output
+        return {
+            'output': output,
+            'size': len(new_data),
+            'changed_entries': len(processed_entries),
+            'relocation_notes': relocation_notes,
+            'seconds': time.perf_counter() - started
+        }
+
+    def verify(self, params: Dict) -> Dict:
+        """Kiểm tra file đã rebuild (mặc định file của lần rebuild gần nhất) khớp bản dịch trong bộ nhớ"""
+        state = self.asset(params)
+        path = params.get('path') or state.last_output
+        if not path or not os.path.exists(path):
+            raise DaemonError("Chưa có file rebuild để kiểm tra (gọi rebuild trước hoặc truyền 'path')", INVALID_PARAMS)
+        extractor = self.extractor_for(state)
+        with open(path, 'rb') as f:
+            new_data = f.read()
+        with state.lock:
+            errors = extractor.verify_uasset(new_data, state.data)
+        return {'path': path, 'ok': not errors, 'errors': errors[:50], 'error_count': len(errors)}
+
+    def save(self, params: Dict = None) -> Dict:
+        """Ghi ngay các file JSON và cache đã sửa ra đĩa"""
+        return {'saved': self.flush()}
+
+    def status(self, params: Dict = None) -> Dict:
+        return {
+            'uptime_seconds': time.time() - self.started_at,
+            'engine': self.translator.ai_engine,
+            'cache_size': len(self.translator.cache),
+            'files': {name: {'entries': len(state.entries), 'dirty': state.dirty,
+                             'loaded': state.extractor is not None, 'last_output': state.last_output}
+                      for name, state in self.assets.items()}
+        }
+
+    def flush(self) -> List[str]:
+        """Ghi các file JSON đã sửa (và cache nếu có thay đổi), trả về danh sách file đã ghi"""
+        saved = []
+        for state in list(self.assets.values()):
+            if not state.dirty:
+                continue
+            with state.lock:
+                state.dirty = False
+                try:
+                    write_json_atomic(state.json_path, state.data)
+                    saved.append(state.json_path)
+                except Exception as e:
+                    state.dirty = True
+                    print(f"❌ Lỗi khi lưu file {state.json_path}: {e}")
+        if self._cache_dirty:
+            self._cache_dirty = False
+            self.translator.save_cache()
+            saved.append(self.translator.cache_file)
+        return saved
+
+    def _flush_loop(self):
+        while not self._stop.wait(FLUSH_INTERVAL_SECONDS):
+            self.flush()
+
+    def dispatch(self, request) -> Dict:
+        """Xử lý một request JSON-RPC 2.0, trả về response"""
+        if not isinstance(request, dict) or not isinstance(request.get('method'), str):
+            return rpc_error(None, INVALID_REQUEST, "Request không hợp lệ")
+        request_id = request.get('id')
+        method = self.methods.get(request['method'])
+        if method is None:
+            return rpc_error(request_id, METHOD_NOT_FOUND, f"Không có method: {request['method']}")
+        params = request.get('params') or {}
+        if not isinstance(params, dict):
+            return rpc_error(request_id, INVALID_PARAMS, "params phải là object")
+        try:
+            return {'jsonrpc': '2.0', 'id': request_id, 'result': method(params)}
+        except DaemonError as e:
+            return rpc_error(request_id, e.code, str(e))
+        except Exception as e:
+            return rpc_error(request_id, SERVER_ERROR, f"{type(e).__name__}: {e}")
+
+    def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT):
+        """Chạy HTTP server (mỗi request một luồng) tới khi Ctrl+C, ghi lại mọi thay đổi khi dừng"""
+        server = ThreadingHTTPServer((host, port), make_handler(self))
+        self._flusher.start()
+        print(f"🚀 Daemon đang chạy tại http://{host}:{server.server_address[1]} (Ctrl+C để dừng)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            print("\n⏹️  Đang dừng daemon...")
+        finally:
+            server.server_close()
+            self._stop.set()
+            self.flush()
+
+def rpc_error(request_id, code: int, message: str) -> Dict:
+    return {'jsonrpc': '2.0', 'id': request_id, 'error': {'code': code, 'message': message}}
+
+def make_handler(daemon: TranslationDaemon):
+    class Handler(BaseHTTPRequestHandler):
+        def _send_json(self, payload: Dict, status: int = 200):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._send_json(daemon.status())
+
+        def do_POST(self):
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+            except (ValueError, UnicodeDecodeError):
+                self._send_json(rpc_error(None, PARSE_ERROR, "JSON không hợp lệ"))
+                return
+            self._send_json(daemon.dispatch(request))
+
+        def log_message(self, format, *args):
+            pass  # Không in log cho mỗi request
+
+    return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description='Daemon dịch/rebuild .uasset qua JSON-RPC trên localhost')
+    parser.add_argument('--folder', help='Folder chứa file JSON (mặc định: translated nếu có, không thì extract)')
+    parser.add_argument('--import-folder', default='import', help='Folder ghi file .uasset đã rebuild')
+    parser.add_argument('--host', default='127.0.0.1', help='Địa chỉ lắng nghe (mặc định chỉ localhost)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='Cổng HTTP')
+    parser.add_argument('--api-key', help='API key cho AI engine được chọn')
+    parser.add_argument('--ai-engine', choices=list(ENGINES), default='gemini', help='AI engine cho method translate')
+    args = parser.parse_args()
+
+    folder = args.folder or ("translated" if os.path.isdir("translated") else "extract")
+    if not os.path.isdir(folder):
+        print(f"❌ Không tìm thấy folder: {folder}")
+        return
+
+    # Không bắt buộc API key: sửa tay, rebuild và verify không cần gọi AI
+    translator = AutoTranslator(api_key=args.api_key, ai_engine=args.ai_engine, require_api_key=False)
+    daemon = TranslationDaemon(translator, folder, args.import_folder)
+    daemon.load()
+    
+    def handle_sigterm(signum, frame):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)  # Không ngắt lần ghi cuối khi nhận thêm SIGTERM
+        raise KeyboardInterrupt
+    
+    # Dừng bằng SIGTERM cũng ghi lại các thay đổi như Ctrl+C
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    daemon.serve(args.host, args.port)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Translation Engines
+Giao diện plugin cho các AI engine dịch thuật (Gemini, ChatGPT và engine giả lập chạy offline)
+"""
+
+import json
+import time
+import random
+import asyncio
+import threading
+import importlib.util
+from typing import Dict, List, Type
+
+# Phân loại lỗi của engine
+ERROR_RATE_LIMIT = 'rate_limit'  # Hết quota/429: chuyển key và thử lại
+ERROR_FATAL = 'fatal'            # Lỗi khác: không thử lại
+
+class RateLimitError(Exception):
+    """Engine báo hết quota (HTTP 429 / RESOURCE_EXHAUSTED)"""
+
+class EngineResponseError(Exception):
+    """Engine trả về nội dung không đúng định dạng yêu cầu (ví dụ batch không phải mảng JSON)"""
+
+# Phần hướng dẫn cố định: gửi dưới dạng system instruction/system message, giống hệt nhau ở mọi request
+# (kể cả batch), tách khỏi phần thay đổi là text cần dịch và thuật ngữ liên quan. Tiền tố này (~170 token) ngắn hơn
+# PROMPT_CACHE_MIN_TOKENS nên API không cache nó; token cache chỉ có nếu sau này tiền tố đủ dài
+SYSTEM_INSTRUCTION = """Bạn là chuyên gia dịch thuật game, dịch text trong game sang tiếng Việt.
+
+Quy tắc:
+- Dịch chính xác, tự nhiên, giữ nguyên ý nghĩa gốc, dùng thuật ngữ game phù hợp
+- Giữ nguyên các placeholder {0}, {1}... (mỗi placeholder xuất hiện đúng một lần), đặt đúng vị trí trong câu tiếng Việt
+- Chỉ trả về bản dịch, không kèm text gốc, không dùng ký hiệu "->", không giải thích
+- Nếu text chứa ký tự Nhật Bản, hãy dịch phần có thể dịch được
+- Nếu có mục "Thuật ngữ bắt buộc", dùng đúng các bản dịch đó
+- Nếu đầu vào là một mảng JSON: dịch từng phần tử và trả về DUY NHẤT một mảng JSON các chuỗi, cùng số phần tử và cùng thứ tự
+
+Ví dụ: "Press {0} to continue" -> "Nhấn {0} để tiếp tục"
+"""
+
+# Tiền tố ngắn nhất được prompt caching của API tính là cache (OpenAI: 1024 token; Gemini không dùng cache tường minh ở đây)
+PROMPT_CACHE_MIN_TOKENS = 1024
+
+def estimate_tokens(text: str) -> int:
+    """Ước tính số token (~4 byte UTF-8 mỗi token, tiếng Việt có dấu tốn nhiều token hơn)"""
+    return max(1, (len(text.encode('utf-8')) + 3) // 4)
+
+def strip_quotes(translation: str) -> str:
+    """Loại bỏ dấu ngoặc kép bao quanh bản dịch nếu có"""
+    if len(translation) >= 2 and translation.startswith('"') and translation.endswith('"'):
+        return translation[1:-1]
+    return translation
+
+def parse_batch_response(response_text: str, expected_count: int) -> List[str]:
+    """Đọc mảng JSON các bản dịch từ phản hồi của model (bỏ qua code fence nếu có)"""
+    text = response_text.strip()
+    if text.startswith('```'):
+        text = text.split('\n', 1)[1] if '\n' in text else ''
+        text = text.rsplit('```', 1)[0]
+    try:
+        translations = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise EngineResponseError(f"phản hồi batch không phải JSON: {e}") from e
+    if not isinstance(translations, list) or len(translations) != expected_count:
+        raise EngineResponseError(f"phản hồi batch cần {expected_count} phần tử")
+    return [str(t).strip() for t in translations]
+
+class TranslationEngine:
+    """
+    Giao diện chung của một AI engine, mỗi instance gắn với một API key
+
+    Plugin mới chỉ cần kế thừa, cài đặt translate() (và build_request()/system_instruction
+    để ước tính token), rồi đăng ký bằng register_engine().
+    """
+    name = ''
+    display_name = ''
+    env_var = None                   # Biến môi trường chứa API key
+    requires_api_key = True
+    max_key_cycles = 5               # Số vòng xoay qua toàn bộ key khi bị rate limit
+    default_requests_per_minute = 30
+    system_instruction = ""          # Phần prompt cố định, không gửi lại trong nội dung mỗi request
+
+    def __init__(self, api_key: str = None, **options):
+        self.api_key = api_key
+        self.options = options
+        # Token thực tế theo usage metadata của API: cached_tokens là phần prompt được tính từ cache
+        self.usage = {'requests': 0, 'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
+        self._usage_lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        """Thư viện SDK của engine đã được cài đặt chưa (kiểm tra không cần import)"""
+        return True
+
+    def build_request(self, masked_text: str, hints: str = "") -> str:
+        """Phần thay đổi theo từng request: text cần dịch và thuật ngữ liên quan"""
+        return f'Text: "{masked_text}"\n{hints}'
+
+    def build_batch_request(self, masked_texts: List[str], hints: str = "") -> str:
+        """Phần thay đổi của một request batch: mảng JSON các text cần dịch"""
+        return json.dumps(masked_texts, ensure_ascii=False) + "\n" + hints
+
+    def build_prompt(self, masked_text: str, hints: str = "") -> str:
+        """Toàn bộ nội dung gửi đi cho một text (dùng để ước tính token)"""
+        return self.system_instruction + self.build_request(masked_text, hints)
+
+    def record_usage(self, prompt_tokens: int, cached_tokens: int = 0, completion_tokens: int = 0):
+        """Cộng dồn token của một request (an toàn đa luồng)"""
+        with self._usage_lock:
+            self.usage['requests'] += 1
+            self.usage['prompt_tokens'] += prompt_tokens or 0
+            self.usage['cached_tokens'] += cached_tokens or 0
+            self.usage['completion_tokens'] += completion_tokens or 0
+
+    def translate(self, masked_text: str, hints: str = "") -> str:
+        """Dịch một text đã che tags, trả về bản dịch đã làm sạch"""
+        raise NotImplementedError
+
+    def translate_batch(self, masked_texts: List[str], hints: str = "") -> List[str]:
+        """Dịch nhiều text; mặc định gọi translate() lần lượt"""
+        return [self.translate(text, hints) for text in masked_texts]
+
+    async def translate_async(self, masked_text: str, hints: str = "") -> str:
+        """Dịch bất đồng bộ; mặc định chạy translate() trong thread pool"""
+        return await asyncio.to_thread(self.translate, masked_text, hints)
+
+    async def translate_batch_async(self, masked_texts: List[str], hints: str = "") -> List[str]:
+        """Dịch batch bất đồng bộ; mặc định chạy translate_batch() trong thread pool"""
+        return await asyncio.to_thread(self.translate_batch, masked_texts, hints)
+
+    def classify_error(self, error: Exception) -> str:
+        """Phân loại lỗi: ERROR_RATE_LIMIT (đổi key và thử lại) hoặc ERROR_FATAL"""
+        if isinstance(error, RateLimitError):
+            return ERROR_RATE_LIMIT
+        error_str = str(error).lower()
+        if "429" in error_str or "quota" in error_str or "rate limit" in error_str \
+                or "resource_exhausted" in error_str or "too many requests" in error_str:
+            return ERROR_RATE_LIMIT
+        return ERROR_FATAL
+
+class GeminiEngine(TranslationEngine):
+    name = 'gemini'
+    display_name = 'Gemini'
+    env_var = 'GEMINI_API_KEY'
+    max_key_cycles = 1000005
+    default_requests_per_minute = 30
+    model_name = 'gemini-2.0-flash-lite'
+    system_instruction = SYSTEM_INSTRUCTION
+
+    def __init__(self, api_key: str = None, timeout: float = None, **options):
+        super().__init__(api_key, **options)
+        self.timeout = timeout  # Giây; generate_content mặc định không có hạn chót
+        self._client = None
+        self._config = None
+        self._client_lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        try:
+            return importlib.util.find_spec('google.genai') is not None
+        except ModuleNotFoundError:  # Chưa có cả package google
+            return False
+
+    @property
+    def client(self):
+        """
+        Client google-genai cho API key này, chỉ import SDK và tạo client khi gọi API lần đầu
+
+        Mỗi engine giữ genai.Client riêng gắn với key của nó (kết nối được giữ mở và dùng lại giữa các
+        request) thay vì cấu hình key toàn cục, nên nhiều key chạy song song được.
+        """
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from google import genai
+                    from google.genai import types
+                    # HttpOptions.timeout tính bằng mili giây
+                    http_options = types.HttpOptions(timeout=int(self.timeout * 1000)) if self.timeout else None
+                    self._config = types.GenerateContentConfig(system_instruction=self.system_instruction)
+                    self._client = genai.Client(api_key=self.api_key, http_options=http_options)
+        return self._client
+
+    def _generate(self, request: str) -> str:
+        """Gửi phần thay đổi của request (system instruction nằm trong config) và ghi nhận token"""
+        client = self.client
+        response = client.models.generate_content(model=self.model_name, contents=request, config=self._config)
+        usage = getattr(response, 'usage_metadata', None)
+        if usage is not None:
+            self.record_usage(getattr(usage, 'prompt_token_count', 0),
+                              getattr(usage, 'cached_content_token_count', 0),
+                              getattr(usage, 'candidates_token_count', 0))
+        return response.text
+
+    def translate(self, masked_text: str, hints: str = "") -> str:
+        translation = strip_quotes(self._generate(self.build_request(masked_text, hints)).strip())
+
+        # Nếu translation vẫn chứa text gốc dạng "text -> bản dịch", chỉ lấy phần bản dịch
+        if translation.startswith(masked_text) and translation != masked_text:
+            remaining = translation[len(masked_text):].strip()
+            if remaining.startswith('" -> "') or remaining.startswith(' -> '):
+                translation = remaining.split('"')[-1] if '"' in remaining else remaining.split(' -> ')[-1]
+                translation = translation.strip().strip('"')
+
+        return translation
+
+    def translate_batch(self, masked_texts: List[str], hints: str = "") -> List[str]:
+        response_text = self._generate(self.build_batch_request(masked_texts, hints))
+        return parse_batch_response(response_text, len(masked_texts))
+
+class OpenAIEngine(TranslationEngine):
+    name = 'chatgpt'
+    display_name = 'ChatGPT'
+    env_var = 'OPENAI_API_KEY'
+    max_key_cycles = 5
+    default_requests_per_minute = 60
+    model_name = 'gpt-3.5-turbo'
+    system_instruction = SYSTEM_INSTRUCTION
+
+    def __init__(self, api_key: str = None, timeout: float = None, **options):
+        super().__init__(api_key, **options)
+        self.timeout = timeout
+        self._openai_client = None
+        self._client_lock = threading.Lock()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        return importlib.util.find_spec('openai') is not None
+
+    def _client(self):
+        """Client OpenAI của key này, tạo một lần rồi dùng lại (giữ kết nối HTTP keep-alive, an toàn đa luồng)"""
+        if self._openai_client is None:
+            with self._client_lock:
+                if self._openai_client is None:
+                    import openai
+                    options = {'timeout': self.timeout} if self.timeout else {}
+                    self._openai_client = openai.OpenAI(api_key=self.api_key, **options)
+        return self._openai_client
+
+    def _complete(self, request: str, max_tokens: int) -> str:
+        """System message cố định đứng đầu, user message chỉ chứa phần thay đổi"""
+        response = self._client().chat.completions.create(
+            model=self.model_name,
+            messages=[
+                {"role": "system", "content": self.system_instruction},
+                {"role": "user", "content": request}
+            ],
+            max_tokens=max_tokens,
+            temperature=0.3
+        )
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            details = getattr(usage, 'prompt_tokens_details', None)
+            self.record_usage(usage.prompt_tokens, getattr(details, 'cached_tokens', 0) if details else 0,
+                              usage.completion_tokens)
+        return response.choices[0].message.content.strip()
+
+    def translate(self, masked_text: str, hints: str = "") -> str:
+        translation = strip_quotes(self._complete(self.build_request(masked_text, hints), 500))
+
+        # Xử lý nếu ChatGPT trả về format "text gốc -> bản dịch"
+        if ' -> ' in translation:
+            translation = strip_quotes(translation.split(' -> ')[-1].strip())
+        elif '" -> "' in translation:
+            parts = translation.split('" -> "')
+            if len(parts) >= 2:
+                translation = parts[-1].rstrip('"')
+        elif translation.startswith(f'"{masked_text}"'):
+            translation = translation[len(f'"{masked_text}"'):].strip()
+            if translation.startswith(' -> '):
+                translation = translation[4:].strip()
+            translation = strip_quotes(translation)
+
+        return translation
+
+    def translate_batch(self, masked_texts: List[str], hints: str = "") -> List[str]:
+        request = self.build_batch_request(masked_texts, hints)
+        return parse_batch_response(self._complete(request, 500 * len(masked_texts)), len(masked_texts))
+
+class StubEngine(TranslationEngine):
+    """
+    Engine giả lập chạy trong process, không cần mạng hay API key
+
+    Bản dịch có dạng "[VI] <text>" (giữ nguyên placeholder), dùng để đo throughput của pipeline.
+
+    Options:
+        latency: thời gian trung bình mỗi request (giây)
+        latency_jitter: độ lệch ngẫu nhiên tối đa của latency (giây)
+        failure_rate: tỉ lệ request lỗi không thử lại được
+        rate_limit_rate: tỉ lệ request trả về 429
+        seed: seed cho bộ sinh ngẫu nhiên (kết quả lặp lại được)
+    """
+    name = 'stub'
+    display_name = 'Stub'
+    env_var = 'STUB_API_KEY'
+    requires_api_key = False
+    max_key_cycles = 5
+    default_requests_per_minute = 600
+    system_instruction = SYSTEM_INSTRUCTION
+
+    def __init__(self, api_key: str = None, latency: float = 0.0, latency_jitter: float = 0.0,
+                 failure_rate: float = 0.0, rate_limit_rate: float = 0.0, seed: int = 0, **options):
+        super().__init__(api_key, **options)
+        self.latency = latency
+        self.latency_jitter = latency_jitter
+        self.failure_rate = failure_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(f"{seed}:{api_key}")
+        self._lock = threading.Lock()
+
+    def _simulate_request(self):
+        """Chờ theo latency giả lập rồi có thể trả lỗi 429 hoặc lỗi fatal"""
+        with self._lock:
+            delay = max(0.0, self.latency + self._random.uniform(-self.latency_jitter, self.latency_jitter))
+            roll = self._random.random()
+        if delay:
+            time.sleep(delay)
+        if roll < self.rate_limit_rate:
+            raise RateLimitError(f"429 RESOURCE_EXHAUSTED (stub key {self.api_key})")
+        if roll < self.rate_limit_rate + self.failure_rate:
+            raise RuntimeError("stub: lỗi giả lập")
+
+    def _record_simulated_usage(self, request: str, response: str):
+        """
+        Token ước tính; từ request thứ hai system instruction chỉ được tính như tiền tố đã cache khi đủ
+        PROMPT_CACHE_MIN_TOKENS (như API thật), nếu không thì cached = 0
+        """
+        prefix_tokens = estimate_tokens(self.system_instruction)
+        cached = prefix_tokens if self.usage['requests'] and prefix_tokens >= PROMPT_CACHE_MIN_TOKENS else 0
+        self.record_usage(estimate_tokens(self.system_instruction + request), cached, estimate_tokens(response))
+
+    def translate(self, masked_text: str, hints: str = "") -> str:
+        self._simulate_request()
+        translation = f"[VI] {masked_text}"
+        self._record_simulated_usage(self.build_request(masked_text, hints), translation)
+        return translation
+
+    def translate_batch(self, masked_texts: List[str], hints: str = "") -> List[str]:
+        self._simulate_request()
+        translations = [f"[VI] {text}" for text in masked_texts]
+        self._record_simulated_usage(self.build_batch_request(masked_texts, hints),
+                                     json.dumps(translations, ensure_ascii=False))
+        return translations
+
+# Danh sách engine đã đăng ký: tên dùng cho --ai-engine -> class
+ENGINES: Dict[str, Type[TranslationEngine]] = {}
+
+def register_engine(engine_class: Type[TranslationEngine]) -> Type[TranslationEngine]:
+    """Đăng ký một engine plugin (có thể dùng làm decorator)"""
+    ENGINES[engine_class.name] = engine_class
+    return engine_class
+
+def get_engine_class(name: str) -> Type[TranslationEngine]:
+    """Lấy class engine theo tên, ValueError nếu chưa đăng ký"""
+    if name not in ENGINES:
+        raise ValueError(f"ai_engine phải là một trong: {', '.join(ENGINES)}")
+    return ENGINES[name]
+
+def create_engine(name: str, api_key: str = None, **options) -> TranslationEngine:
+    """Tạo instance engine cho một API key"""
+    return get_engine_class(name)(api_key, **options)
+
+for _engine_class in (GeminiEngine, OpenAIEngine, StubEngine):
+    register_engine(_engine_class)
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Translation Scheduler
+Sắp xếp chuỗi cần dịch theo giá trị và giới hạn ngân sách (số request, token, thời gian) cho một lần dịch
+"""
+
+import time
+import threading
+from typing import Callable, Dict, List, Optional
+
+# Cách ưu tiên: chuỗi xuất hiện nhiều nhất, chuỗi ngắn (UI) trước, hoặc theo trọng số file
+PRIORITY_MODES = ('frequency', 'short', 'file')
+
+class TranslationBudget:
+    def __init__(self, max_calls: int = None, max_tokens: int = None, max_seconds: float = None):
+        """
+        Giới hạn cứng cho một lần dịch; None là không giới hạn
+
+        Args:
+            max_calls: Số request tối đa gửi tới AI engine
+            max_tokens: Số token (vào + ra) tối đa
+            max_seconds: Thời gian chạy tối đa (giây), tính từ start()
+        """
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+        self.calls = 0
+        self.tokens = 0
+        self.exhausted_reason: Optional[str] = None
+        self._started_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def limited(self) -> bool:
+        return any(limit is not None for limit in (self.max_calls, self.max_tokens, self.max_seconds))
+
+    def start(self):
+        """Bắt đầu tính thời gian (gọi ngay trước khi gửi request đầu tiên)"""
+        with self._lock:
+            self._started_at = time.monotonic()
+
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started_at
+
+    def reserve(self, tokens: int, used_tokens: int = 0) -> bool:
+        """
+        Giữ chỗ cho một request trước khi gửi
+
+        Args:
+            tokens: Token ước tính của request (vào + ra)
+            used_tokens: Token thực tế đã dùng (theo usage metadata); lấy giá trị lớn hơn giữa
+                         số này và tổng ước tính đã giữ chỗ
+
+        Returns:
+            True nếu còn ngân sách; False nếu đã chạm giới hạn (từ đó mọi lần giữ chỗ đều bị từ chối)
+        """
+        with self._lock:
+            if self.exhausted_reason:
+                return False
+            if self.max_seconds is not None and self.elapsed() >= self.max_seconds:
+                self.exhausted_reason = 'time'
+            elif self.max_calls is not None and self.calls + 1 > self.max_calls:
+                self.exhausted_reason = 'calls'
+            elif self.max_tokens is not None and max(self.tokens, used_tokens) + tokens > self.max_tokens:
+                self.exhausted_reason = 'tokens'
+            else:
+                self.calls += 1
+                self.tokens = max(self.tokens, used_tokens) + tokens
+                return True
+            return False
+
+def prioritize_texts(texts: List[str], occurrence_files: Dict[str, Dict[str, int]], priority: str = 'frequency',
+                     file_weights: Dict[str, float] = None, group_key: Callable[[str], str] = None) -> List[str]:
+    """
+    Sắp xếp các chuỗi cần dịch để khi ngân sách hết, phần đã dịch có giá trị nhất
+
+    Giá trị của một nhóm (các chuỗi cùng template, chỉ tốn một request) là tổng số lần xuất hiện
+    của cả nhóm, nhân với trọng số của file chứa nó (mặc định 1).
+
+    Args:
+        texts: Các chuỗi cần dịch
+        occurrence_files: text -> {tên file: số lần xuất hiện}
+        priority: 'frequency' (giá trị cao trước), 'short' (chuỗi ngắn trước, cùng độ dài thì giá trị cao trước)
+                  hoặc 'file' (file có trọng số cao trước, sau đó theo giá trị)
+        file_weights: Tên file (có hoặc không có .json) -> trọng số
+        group_key: Hàm gom nhóm chuỗi (ví dụ template); các chuỗi cùng nhóm đứng liền nhau
+
+    Returns:
+        List: các chuỗi theo thứ tự nên dịch
+    """
+    if priority not in PRIORITY_MODES:
+        raise ValueError(f"Cách ưu tiên không hợp lệ: {priority} (chọn {', '.join(PRIORITY_MODES)})")
+
+    file_weights = file_weights or {}
+
+    def weight(json_file: str) -> float:
+        return file_weights.get(json_file, file_weights.get(json_file[:-5] if json_file.endswith('.json') else json_file, 1.0))
+
+    groups: Dict[str, List[str]] = {}
+    for text in texts:
+        groups.setdefault(group_key(text) if group_key else text, []).append(text)
+
+    def score(item):
+        key, members = item
+        files = [(json_file, count) for text in members for json_file, count in occurrence_files.get(text, {}).items()]
+        value = sum(weight(json_file) * count for json_file, count in files)
+        if priority == 'short':
+            return (len(key), -value)
+        if priority == 'file':
+            return (-max((weight(json_file) for json_file, _ in files), default=1.0), -value)
+        return (-value,)
+
+    ordered = sorted(groups.items(), key=score)  # sorted ổn định: cùng điểm thì giữ thứ tự file
+    return [text for _, members in ordered for text in members]
@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+UAsset Offset Relocation
+Cập nhật các offset tuyệt đối (package summary, export map, size field) sau khi thay text làm đổi kích thước file
+"""
+
+import struct
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple
+
+PACKAGE_FILE_TAG = 0x9E2A83C1
+PKG_FILTER_EDITOR_ONLY = 0x80000000
+
+# Mốc version (EUnrealEngineObjectUE4Version / UE5Version) làm thay đổi layout summary hoặc export map
+VER_UE4_WORLD_LEVEL_INFO = 224
+VER_UE4_ADDED_CHUNKID_TO_ASSETDATA_AND_UPACKAGE = 278
+VER_UE4_CHANGED_CHUNKID_TO_BE_AN_ARRAY_OF_CHUNKIDS = 326
+VER_UE4_ENGINE_VERSION_OBJECT = 336
+VER_UE4_LOAD_FOR_EDITOR_GAME = 365
+VER_UE4_ADD_STRING_ASSET_REFERENCES_MAP = 384
+VER_UE4_PACKAGE_SUMMARY_HAS_COMPATIBLE_ENGINE_VERSION = 444
+VER_UE4_SERIALIZE_TEXT_IN_PACKAGES = 459
+VER_UE4_COOKED_ASSETS_IN_EDITOR_SUPPORT = 485
+VER_UE4_PRELOAD_DEPENDENCIES_IN_COOKED_EXPORTS = 507
+VER_UE4_TEMPLATE_INDEX_IN_COOKED_EXPORTS = 508
+VER_UE4_ADDED_SEARCHABLE_NAMES = 510
+VER_UE4_64BIT_EXPORTMAP_SERIALSIZES = 511
+VER_UE4_ADDED_PACKAGE_SUMMARY_LOCALIZATION_ID = 516
+VER_UE4_ADDED_PACKAGE_OWNER = 518
+VER_UE4_NON_OUTER_PACKAGE_IMPORT = 520
+VER_UE4_LATEST = 522
+
+VER_UE5_NAMES_REFERENCED_FROM_EXPORT_DATA = 1001
+VER_UE5_PAYLOAD_TOC = 1002
+VER_UE5_OPTIONAL_RESOURCES = 1003
+VER_UE5_REMOVE_OBJECT_EXPORT_PACKAGE_GUID = 1005
+VER_UE5_TRACK_OBJECT_EXPORT_IS_INHERITED = 1006
+VER_UE5_ADD_SOFTOBJECTPATH_LIST = 1008
+VER_UE5_DATA_RESOURCES = 1009
+VER_UE5_SCRIPT_SERIALIZATION_OFFSET = 1010
+VER_UE5_SUPPORTED_MAX = 1013  # Từ METADATA_SERIALIZATION_OFFSET (1014) summary có thêm trường chưa hỗ trợ
+
+# Package cooked thường "unversioned" (version = 0): thử lần lượt các mốc, giữ layout đầu tiên khớp dữ liệu
+UNVERSIONED_UE4_CANDIDATES = (VER_UE4_LATEST, VER_UE4_ADDED_PACKAGE_OWNER, VER_UE4_ADDED_PACKAGE_SUMMARY_LOCALIZATION_ID,
+                              VER_UE4_64BIT_EXPORTMAP_SERIALSIZES, VER_UE4_ADDED_SEARCHABLE_NAMES,
+                              VER_UE4_TEMPLATE_INDEX_IN_COOKED_EXPORTS, VER_UE4_PRELOAD_DEPENDENCIES_IN_COOKED_EXPORTS,
+                              VER_UE4_COOKED_ASSETS_IN_EDITOR_SUPPORT, VER_UE4_SERIALIZE_TEXT_IN_PACKAGES)
+UNVERSIONED_UE5_CANDIDATES = (VER_UE5_SUPPORTED_MAX, VER_UE5_DATA_RESOURCES, VER_UE5_ADD_SOFTOBJECTPATH_LIST,
+                              VER_UE5_TRACK_OBJECT_EXPORT_IS_INHERITED, VER_UE5_REMOVE_OBJECT_EXPORT_PACKAGE_GUID,
+                              VER_UE5_OPTIONAL_RESOURCES, VER_UE5_PAYLOAD_TOC,
+                              VER_UE5_NAMES_REFERENCED_FROM_EXPORT_DATA, 1000)
+
+class DeltaTable:
+    def __init__(self, edits: List[Dict]):
+        """
+        Bảng cộng dồn thay đổi kích thước theo vị trí trong file gốc
+
+        Args:
+            edits: Các bản ghi đã thay, mỗi phần tử có 'position', 'old_length' (4 byte độ dài + text)
+                   và 'size_change'; bản ghi không đổi kích thước được bỏ qua
+        """
+        edits = sorted((e for e in edits if e['size_change']), key=lambda e: e['position'])
+        self.starts = [e['position'] for e in edits]
+        self.ends = [e['position'] + e['old_length'] for e in edits]
+        self.prefix = [0]
+        for edit in edits:
+            self.prefix.append(self.prefix[-1] + edit['size_change'])
+
+    @property
+    def total(self) -> int:
+        return self.prefix[-1]
+
+    def map(self, offset: int) -> Optional[int]:
+        """
+        Offset tương ứng trong file mới, O(log số bản ghi đã thay)
+
+        Offset trỏ đúng đầu một bản ghi đã thay giữ nguyên chỗ đó; offset nằm giữa bản ghi thì không
+        còn chỗ tương ứng và trả về None.
+        """
+        index = bisect_right(self.ends, offset)  # Số bản ghi kết thúc trước (hoặc tại) offset
+        if index < len(self.starts) and self.starts[index] < offset:
+            return None
+        return offset + self.prefix[index]
+
+class _Reader:
+    """Đọc tuần tự little-endian, ghi nhận vị trí của từng trường offset"""
+
+    def __init__(self, data: bytes, pos: int = 0):
+        self.data = data
+        self.pos = pos
+
+    def read(self, fmt: str) -> int:
+        value = struct.unpack_from(fmt, self.data, self.pos)[0]
+        self.pos += struct.calcsize(fmt)
+        return value
+
+    def skip(self, size: int):
+        if size < 0 or self.pos + size > len(self.data):
+            raise ValueError(f"vượt quá cuối file tại 0x{self.pos:X}")
+        self.pos += size
+
+    def skip_fstring(self):
+        length = self.read('<i')
+        if abs(length) > 1024:
+            raise ValueError(f"FString không hợp lệ tại 0x{self.pos - 4:X}")
+        self.skip(length * 2 if length < 0 else length)
+
+    def field(self, fields: List[Dict], name: str, fmt: str, kind: str = 'offset', base: int = 0) -> int:
+        position = self.pos
+        value = self.read(fmt)
+        fields.append({'name': name, 'position': position, 'format': fmt, 'value': value, 'kind': kind, 'base': base})
+        return value
+
+def _parse_summary(data: bytes, ue4: int, ue5: int) -> Tuple[List[Dict], Dict]:
+    """
+    Đọc FPackageFileSummary với version cho trước
+
+    Returns:
+        tuple: (các trường offset, thông tin khác: total_header_size, name_offset, export_count, export_offset, end)
+    """
+    reader = _Reader(data)
+    fields = []
+    info = {}
+
+    reader.read('<I')  # Tag
+    legacy_version = reader.read('<i')
+    if legacy_version != -4:
+        reader.read('<i')  # LegacyUE3Version
+    reader.read('<i')  # FileVersionUE4
+    if legacy_version <= -8:
+        reader.read('<i')  # FileVersionUE5
+    reader.read('<i')  # FileVersionLicenseeUE4
+    if legacy_version <= -2:
+        count = reader.read('<i')
+        if not 0 <= count <= 1024:
+            raise ValueError("số custom version không hợp lệ")
+        if legacy_version == -2:
+            reader.skip(count * 8)
+        elif legacy_version >= -5:
+            for _ in range(count):
+                reader.skip(20)
+                reader.skip_fstring()
+        else:
+            reader.skip(count * 20)
+
+    info['total_header_size'] = reader.field(fields, 'TotalHeaderSize', '<i')
+    reader.skip_fstring()  # FolderName
+    package_flags = reader.read('<I')
+    filter_editor_only = bool(package_flags & PKG_FILTER_EDITOR_ONLY)
+    info['name_count'] = reader.read('<i')
+    info['name_offset'] = reader.field(fields, 'NameOffset', '<i')
+    if ue5 >= VER_UE5_ADD_SOFTOBJECTPATH_LIST:
+        reader.read('<i')
+        reader.field(fields, 'SoftObjectPathsOffset', '<i')
+    if not filter_editor_only and ue4 >= VER_UE4_ADDED_PACKAGE_SUMMARY_LOCALIZATION_ID:
+        reader.skip_fstring()  # LocalizationId
+    if ue4 >= VER_UE4_SERIALIZE_TEXT_IN_PACKAGES:
+        reader.read('<i')
+        reader.field(fields, 'GatherableTextDataOffset', '<i')
+    info['export_count'] = reader.read('<i')
+    info['export_offset'] = reader.field(fields, 'ExportOffset', '<i')
+    reader.read('<i')
+    reader.field(fields, 'ImportOffset', '<i')
+    reader.field(fields, 'DependsOffset', '<i')
+    if ue4 >= VER_UE4_ADD_STRING_ASSET_REFERENCES_MAP:
+        reader.read('<i')
+        reader.field(fields, 'SoftPackageReferencesOffset', '<i')
+    if ue4 >= VER_UE4_ADDED_SEARCHABLE_NAMES:
+        reader.field(fields, 'SearchableNamesOffset', '<i')
+    reader.field(fields, 'ThumbnailTableOffset', '<i')
+    reader.skip(16)  # Guid
+    if not filter_editor_only:
+        if ue4 >= VER_UE4_ADDED_PACKAGE_OWNER:
+            reader.skip(16)  # PersistentGuid
+        if VER_UE4_ADDED_PACKAGE_OWNER <= ue4 < VER_UE4_NON_OUTER_PACKAGE_IMPORT:
+            reader.skip(16)  # OwnerPersistentGuid
+    generations = reader.read('<i')
+    if not 0 <= generations <= 1024:
+        raise ValueError("số generation không hợp lệ")
+    reader.skip(generations * 8)
+    engine_versions = 2 if ue4 >= VER_UE4_PACKAGE_SUMMARY_HAS_COMPATIBLE_ENGINE_VERSION else 1
+    if ue4 >= VER_UE4_ENGINE_VERSION_OBJECT:
+        for _ in range(engine_versions):
+            reader.skip(10)  # Major, Minor, Patch (u16), Changelist (u32)
+            reader.skip_fstring()  # Branch
+    else:
+        reader.read('<i')  # EngineChangelist
+        if engine_versions == 2:
+            reader.skip(10)
+            reader.skip_fstring()
+    reader.read('<I')  # CompressionFlags
+    if reader.read('<i') != 0:
+        raise ValueError("package nén (CompressedChunks) chưa được hỗ trợ")
+    reader.read('<I')  # PackageSource
+    for _ in range(reader.read('<i')):  # AdditionalPackagesToCook
+        reader.skip_fstring()
+    if legacy_version > -7:
+        reader.read('<i')  # NumTextureAllocations
+    reader.field(fields, 'AssetRegistryDataOffset', '<i')
+    reader.field(fields, 'BulkDataStartOffset', '<q')
+    if ue4 >= VER_UE4_WORLD_LEVEL_INFO:
+        reader.field(fields, 'WorldTileInfoDataOffset', '<i')
+    if ue4 >= VER_UE4_CHANGED_CHUNKID_TO_BE_AN_ARRAY_OF_CHUNKIDS:
+        count = reader.read('<i')
+        if not 0 <= count <= 1024:
+            raise ValueError("số ChunkID không hợp lệ")
+        reader.skip(count * 4)
+    elif ue4 >= VER_UE4_ADDED_CHUNKID_TO_ASSETDATA_AND_UPACKAGE:
+        reader.read('<i')
+    if ue4 >= VER_UE4_PRELOAD_DEPENDENCIES_IN_COOKED_EXPORTS:
+        reader.read('<i')
+        reader.field(fields, 'PreloadDependencyOffset', '<i')
+    if ue5 >= VER_UE5_NAMES_REFERENCED_FROM_EXPORT_DATA:
+        reader.read('<i')
+    if ue5 >= VER_UE5_PAYLOAD_TOC:
+        reader.field(fields, 'PayloadTocOffset', '<q')
+    if ue5 >= VER_UE5_DATA_RESOURCES:
+        reader.field(fields, 'DataResourceOffset', '<i')
+    info['end'] = reader.pos
+    return fields, info
+
+def _parse_exports(data: bytes, info: Dict, ue4: int, ue5: int) -> List[Dict]:
+    """Đọc SerialSize/SerialOffset (và offset script của UE5) của từng export trong export map"""
+    reader = _Reader(data, info['export_offset'])
+    serial_format = '<q' if ue4 >= VER_UE4_64BIT_EXPORTMAP_SERIALSIZES else '<i'
+    fields = []
+    for index in range(info['export_count']):
+        reader.skip(8 if ue4 < VER_UE4_TEMPLATE_INDEX_IN_COOKED_EXPORTS else 12)  # Class, Super, (Template)
+        reader.skip(16)  # OuterIndex, ObjectName, ObjectFlags
+        size_position = reader.pos
+        serial_size = reader.read(serial_format)
+        serial_offset = reader.field(fields, f'Export[{index}].SerialOffset', serial_format)
+        if not info['total_header_size'] <= serial_offset <= serial_offset + serial_size <= len(data) or serial_size < 0:
+            raise ValueError(f"export {index} nằm ngoài file (0x{serial_offset:X} + {serial_size})")
+        fields.append({'name': f'Export[{index}].SerialSize', 'position': size_position, 'format': serial_format,
+                       'value': serial_size, 'kind': 'span', 'base': serial_offset})
+        if ue5 >= VER_UE5_SCRIPT_SERIALIZATION_OFFSET:
+            # Hai offset tính từ đầu export
+            reader.field(fields, f'Export[{index}].ScriptSerializationStartOffset', '<q', 'span', serial_offset)
+            reader.field(fields, f'Export[{index}].ScriptSerializationEndOffset', '<q', 'span', serial_offset)
+        reader.skip(12)  # bForcedExport, bNotForClient, bNotForServer
+        if ue5 < VER_UE5_REMOVE_OBJECT_EXPORT_PACKAGE_GUID:
+            reader.skip(16)  # PackageGuid
+        if ue5 >= VER_UE5_TRACK_OBJECT_EXPORT_IS_INHERITED:
+            reader.skip(4)  # bIsInheritedInstance
+        reader.skip(4)  # PackageFlags
+        if ue4 >= VER_UE4_LOAD_FOR_EDITOR_GAME:
+            reader.skip(4)  # bNotAlwaysLoadedForEditorGame
+        if ue4 >= VER_UE4_COOKED_ASSETS_IN_EDITOR_SUPPORT:
+            reader.skip(4)  # bIsAsset
+        if ue5 >= VER_UE5_OPTIONAL_RESOURCES:
+            reader.skip(4)  # bGeneratePublicHash
+        if ue4 >= VER_UE4_PRELOAD_DEPENDENCIES_IN_COOKED_EXPORTS:
+            reader.skip(20)  # FirstExportDependency + 4 số dependency
+    if reader.pos > info['total_header_size']:
+        raise ValueError("export map vượt quá TotalHeaderSize")
+    return fields
+
+def parse_package_offsets(data: bytes) -> Tuple[List[Dict], Optional[str]]:
+    """
+    Tìm các trường offset tuyệt đối của package summary và export map (best-effort)
+
+    Returns:
+        tuple: (các trường, lý do nếu không nhận dạng được summary; khi đó danh sách rỗng)
+    """
+    if len(data) < 32 or struct.unpack_from('<I', data, 0)[0] != PACKAGE_FILE_TAG:
+        return [], "không có package tag ở đầu file"
+    legacy_version = struct.unpack_from('<i', data, 4)[0]
+    if not -8 <= legacy_version < 0:
+        return [], f"LegacyFileVersion {legacy_version} chưa được hỗ trợ"
+
+    version_position = 12 if legacy_version != -4 else 8
+    ue4 = struct.unpack_from('<i', data, version_position)[0]
+    ue5 = struct.unpack_from('<i', data, version_position + 4)[0] if legacy_version <= -8 else 0
+    if ue5 > VER_UE5_SUPPORTED_MAX:
+        return [], f"FileVersionUE5 {ue5} chưa được hỗ trợ"
+
+    if ue4 == 0 and ue5 == 0:
+        if legacy_version <= -8:
+            candidates = [(VER_UE4_LATEST, version) for version in UNVERSIONED_UE5_CANDIDATES]
+        else:
+            candidates = [(version, 0) for version in UNVERSIONED_UE4_CANDIDATES]
+    else:
+        candidates = [(ue4, ue5)]
+
+    reason = None
+    for ue4, ue5 in candidates:
+        try:
+            fields, info = _parse_summary(data, ue4, ue5)
+            header_size = info['total_header_size']
+            if not 0 < header_size <= len(data) or not 0 <= info['export_count'] <= 1_000_000:
+                raise ValueError(f"TotalHeaderSize {header_size} không hợp lệ")
+            # Name map nằm ngay sau summary: là dấu hiệu chắc chắn nhất để chọn layout khi không có version
+            if info['name_count'] and info['name_offset'] != info['end']:
+                raise ValueError(f"summary kết thúc tại 0x{info['end']:X}, NameOffset 0x{info['name_offset']:X}")
+            return fields + _parse_exports(data, info, ue4, ue5), None
+        except (ValueError, struct.error) as e:
+            reason = f"không đọc được summary (UE4 {ue4}, UE5 {ue5}): {e}"
+    return [], reason
+
+def relocated_value(field: Dict, table: DeltaTable, original_size: int) -> Optional[int]:
+    """
+    Giá trị mới của một trường offset, None nếu không xác định được
+
+    Trường 'offset' là vị trí tuyệt đối; trường 'span' là độ dài tính từ 'base' (SerialSize, offset
+    tương đối trong export).
+    """
+    value = field['value']
+    if field['kind'] == 'span':
+        start, end = table.map(field['base']), table.map(field['base'] + value)
+        return None if start is None or end is None else end - start
+    return table.map(value) if value <= original_size else None
+
+def relocate_offsets(original: bytes, new_data: bytearray, fields: List[Dict], table: DeltaTable) -> Tuple[int, List[str]]:
+    """
+    Ghi giá trị mới của các trường offset vào dữ liệu đã rebuild, O(số trường × log số bản ghi đã thay)
+
+    Giá trị 0 hoặc âm (trường không dùng) được giữ nguyên.
+
+    Returns:
+        tuple: (số trường đã đổi giá trị, các trường không xác định được vị trí/giá trị mới)
+    """
+    changed = 0
+    unclassified = []
+    for field in fields:
+        value = field['value']
+        if value <= 0:
+            continue
+        position = table.map(field['position'])
+        if position is None:
+            unclassified.append(f"{field['name']} tại 0x{field['position']:X}: trường nằm trong text đã thay")
+            continue
+        new_value = relocated_value(field, table, len(original))
+        if new_value is None:
+            unclassified.append(f"{field['name']} tại 0x{field['position']:X} = 0x{value:X}: "
+                                f"trỏ vào giữa text đã thay hoặc ra ngoài file")
+            continue
+        if new_value != value:
+            struct.pack_into(field['format'], new_data, position, new_value)
+            changed += 1
+    return changed, unclassified
@@ -8,19 +8,116 @@ Trích xuất và import lại text từ file .uasset của Unreal Engine
 import re
 import json
 import struct
-from typing import Dict, List, Tuple, Optional
+from typing import Dict, Iterator, List, Tuple, Optional
 import argparse
+import fnmatch
+import mmap
 import os
 
+from uasset_relocation import DeltaTable, parse_package_offsets, relocate_offsets, relocated_value
+
+SCAN_PROFILE_FILE = "scan_windows.json"
+
+# 4 byte độ dài có thể mở đầu một entry: UTF-8 2..200 (gồm null), UTF-16 -1..-199 ký tự (little-endian)
+TEXT_LENGTH_PREFIX = re.compile(rb'(?=[\x02-\xc8]\x00\x00\x00|[\x39-\xff]\xff\xff\xff)')
+
+SIZE_FIELD_OFFSET = 8  # Trường kích thước (u32) nằm tại size_offset_position + 8
+
+def parse_offset(value) -> Optional[int]:
+    """Offset dạng số nguyên hoặc chuỗi thập phân/hex ("116336", "0x1C670"); None giữ nguyên"""
+    if value is None or isinstance(value, int):
+        return value
+    return int(str(value).strip(), 0)
+
+def expected_size_field(file_size: int, size_field_position: int) -> int:
+    """Giá trị đúng của trường kích thước: số byte từ ngay sau trường đó (4 byte) đến cuối file, trừ 104"""
+    return file_size - (size_field_position + 4) - 104
+
+def read_size_info(data) -> Tuple[int, Optional[int]]:
+    """
+    Đọc size_offset_position tại 0x20 và kích thước mà trường kích thước (size_offset_position + 8) phải có
+    
+    Returns:
+        tuple: (size_offset_position, kích thước); kích thước None nếu vị trí không hợp lệ
+    """
+    if len(data) < 0x24:
+        return 0, None
+    size_offset_position = struct.unpack_from('<I', data, 0x20)[0]
+    if 0 < size_offset_position < len(data):
+        return size_offset_position, expected_size_field(len(data), size_offset_position + SIZE_FIELD_OFFSET)
+    return size_offset_position, None
+
 class UAssetTextExtractor:
-    def __init__(self):
+    def __init__(self, verbose: bool = False, scan_profile_file: str = SCAN_PROFILE_FILE):
+        self.verbose = verbose  # In chi tiết từng entry khi rebuild
+        self.scan_profiles = self.load_scan_profiles(scan_profile_file)
         self.text_entries = []
         self.original_data = b''
         self.original_file_size = 0
         self.size_offset_position = 0
+        self.relocation_notes = []  # Offset không xác định được ở lần build gần nhất
+        
+    def load_scan_profiles(self, profile_file: str) -> Dict[str, Dict]:
+        """
+        Tải vùng quét theo từng file hoặc nhóm file từ scan_windows.json
+        
+        Ví dụ: {"GDSMenuText": {"start": "0x1C670"}, "GDS*Text": {"start": 116336, "end": null}};
+        key là tên file (có hoặc không có .uasset) hoặc pattern kiểu glob, thiếu start thì tự dò, thiếu end là cuối file.
+        """
+        if profile_file and os.path.exists(profile_file):
+            try:
+                with open(profile_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"⚠️ Lỗi khi đọc {profile_file}: {e}")
+        return {}
+    
+    def resolve_scan_window(self, file_path: str, scan_start: int = None, scan_end: int = None,
+                            full_scan: bool = False) -> Dict:
+        """
+        Chọn vùng byte cần quét text, theo thứ tự ưu tiên: tham số -> profile -> tự dò -> cả file
+        
+        Tự dò: text nằm sau vùng size_offset_position (đọc từ 0x20), phần header/bảng phía trước
+        chỉ cho ra chuỗi rác nên bỏ qua. Cần gọi _read_file_size_info trước.
+        
+        Returns:
+            Dict: {'start', 'end', 'source'}
+        """
+        data_len = len(self.original_data)
+        source = 'manual' if scan_start is not None or scan_end is not None else None
+        if source is None and not full_scan:
+            name = os.path.basename(file_path)
+            stem = os.path.splitext(name)[0]
+            pattern = next((key for key in (name, stem) if key in self.scan_profiles), None) or next(
+                (key for key in self.scan_profiles if fnmatch.fnmatch(name, key) or fnmatch.fnmatch(stem, key)), None)
+            if pattern is not None:
+                try:
+                    scan_start = parse_offset(self.scan_profiles[pattern].get('start'))
+                    scan_end = parse_offset(self.scan_profiles[pattern].get('end'))
+                    source = f"profile:{pattern}"
+                except (AttributeError, ValueError) as e:
+                    print(f"⚠️ Vùng quét '{pattern}' trong {SCAN_PROFILE_FILE} không hợp lệ: {e}")
         
-    def extract_texts(self, file_path: str) -> Dict:
-        """Trích xuất text từ file .uasset"""
+        if scan_start is None and not full_scan and 0 < self.size_offset_position < data_len:
+            scan_start = self.size_offset_position
+            source = source or 'auto'
+        start = min(max(scan_start or 0, 0), data_len)
+        end = data_len if scan_end is None else min(max(scan_end, 0), data_len)
+        if start >= end:
+            print(f"⚠️ Vùng quét 0x{start:X}-0x{end:X} rỗng, quét cả file")
+            start, end, source = 0, data_len, None
+        return {'start': start, 'end': end, 'source': source or 'full'}
+    
+    def extract_texts(self, file_path: str, scan_start: int = None, scan_end: int = None,
+                      full_scan: bool = False) -> Dict:
+        """
+        Trích xuất text từ file .uasset
+        
+        Args:
+            file_path: File .uasset
+            scan_start, scan_end: Vùng byte cần quét (mặc định lấy theo profile hoặc tự dò)
+            full_scan: Quét cả file, bỏ qua profile và tự dò
+        """
         try:
             print(f"📂 Đang đọc file: {file_path}")
             with open(file_path, 'rb') as f:
@@ -29,17 +126,15 @@ class UAssetTextExtractor:
             file_size_mb = len(self.original_data) / (1024 * 1024)
             print(f"📊 Kích thước file: {file_size_mb:.2f} MB ({len(self.original_data):,} bytes)")
             
-            print("🔄 Đang chuyển đổi dữ liệu binary sang text...")
-            # Chuyển đổi sang string để tìm kiếm pattern
-            data_str = self.original_data.decode('utf-8', errors='ignore')
-            print(f"📝 Độ dài text sau chuyển đổi: {len(data_str):,} ký tự")
+            # Đọc thông tin kích thước file từ offset 0x20 (dùng để tự dò vùng quét)
+            size_info = self._read_file_size_info()
+            scan_window = self.resolve_scan_window(file_path, scan_start, scan_end, full_scan)
+            print(f"🔭 Vùng quét: 0x{scan_window['start']:X}-0x{scan_window['end']:X} "
+                  f"({scan_window['end'] - scan_window['start']:,} bytes, {scan_window['source']})")
             
             print("🚀 Bắt đầu phân tích và trích xuất text...")
             # Tìm các text entries
-            text_data = self._parse_text_entries(data_str)
-            
-            # Đọc thông tin kích thước file từ offset 0x20
-            size_info = self._read_file_size_info()
+            text_data = self._parse_text_entries(scan_window['start'], scan_window['end'])
             
             result = {
                 'file_info': {
@@ -47,7 +142,8 @@ class UAssetTextExtractor:
                     'file_size': len(self.original_data),
                     'total_entries': len(text_data),
                     'original_file_size': self.original_file_size,
-                    'size_offset_position': self.size_offset_position
+                    'size_offset_position': self.size_offset_position,
+                    'scan_window': scan_window
                 },
                 'text_entries': text_data
             }
@@ -59,111 +155,15 @@ class UAssetTextExtractor:
             print(f"❌ Lỗi khi đọc file: {e}")
             return {}
     
-    def _parse_text_entries(self, data_str: str) -> List[Dict]:
-        """Phân tích và trích xuất các text entries dựa trên cấu trúc file uasset."""
-        entries = []
-        entry_id = 0
-        processed_texts = set() # Để tránh trùng lặp
-        original_binary_data = self.original_data
-        data_len = len(original_binary_data)
-        idx = 0
-
+    def _parse_text_entries(self, start: int = 0, end: int = None) -> List[Dict]:
+        """Phân tích và trích xuất các text entries dựa trên cấu trúc file uasset, chỉ trong vùng [start, end)."""
         print("🚀 Bắt đầu phân tích file binary...")
-
-        while idx < data_len - 4: # Cần ít nhất 4 byte cho độ dài
-            try:
-                # Thử đọc UTF-8 string: <u32 len><string + 1>
-                # Độ dài được lưu là little-endian integer
-                str_len = struct.unpack('<i', original_binary_data[idx:idx+4])[0]
-                
-                # Kiểm tra độ dài hợp lệ và có null terminator
-                # Độ dài của chuỗi text thực tế (không bao gồm null terminator)
-                actual_str_len = str_len -1
-
-                if 0 < actual_str_len < 200: # Giới hạn độ dài hợp lý, tránh đọc sai dữ liệu
-                    if idx + 4 + str_len <= data_len:
-                        # Kiểm tra null terminator cho UTF-8
-                        if original_binary_data[idx + 4 + actual_str_len] == 0:
-                            text_bytes = original_binary_data[idx+4 : idx+4+actual_str_len]
-                            try:
-                                text = text_bytes.decode('utf-8')
-                                # Lọc các chuỗi không phải text (ví dụ: toàn ký tự đặc biệt, hoặc quá ngắn)
-                                if re.search(r'[a-zA-Z0-9]', text) and len(text.strip()) > 3 and text not in processed_texts:
-                                    if not any(c in text for c in ['\x00', '\x01', '\x02', '\x03', '\x04', '\x05', '\x06', '\x07', '\x08', '\x0b', '\x0c', '\x0e', '\x0f']): # Loại bỏ các ký tự control không mong muốn
-                                        entries.append({
-                                            'id': entry_id,
-                                            'key': f'utf8_entry_{entry_id}',
-                                            'original_text': text.strip(),
-                                            'translated_text': text.strip(),
-                                            'language': self._detect_language(text),
-                                            'position': idx,
-                                            'length': str_len
-                                        })
-                                        processed_texts.add(text)
-                                        entry_id += 1
-                                        # print(f"Found UTF-8: {text.strip()} at {idx}")
-                                        idx += 4 + str_len # Di chuyển con trỏ qua độ dài + chuỗi + null terminator
-                                        continue
-                            except UnicodeDecodeError:
-                                pass # Không phải UTF-8 hợp lệ
-                
-                # Thử đọc UTF-16 string: <u32 len^0xFF><(string + 1)/2>
-                # Độ dài được lưu là little-endian integer, XOR với 0xFFFFFFFF (hoặc -len nếu là số âm)
-                # Unreal Engine lưu độ dài âm cho UTF-16
-                str_len_utf16_encoded = struct.unpack('<i', original_binary_data[idx:idx+4])[0]
-                
-                if str_len_utf16_encoded < 0: # Độ dài âm là dấu hiệu của UTF-16
-                    actual_num_chars = -str_len_utf16_encoded
-                    byte_len_utf16 = actual_num_chars * 2 # Mỗi ký tự UTF-16 là 2 bytes
-
-                    if 0 < actual_num_chars < 200: # Giới hạn độ dài hợp lý
-                        if idx + 4 + byte_len_utf16 <= data_len:
-                             # Kiểm tra null terminator cho UTF-16 (2 bytes 00 00)
-                            if original_binary_data[idx + 4 + byte_len_utf16 - 2 : idx + 4 + byte_len_utf16] == b'\x00\x00':
-                                text_bytes = original_binary_data[idx+4 : idx+4+byte_len_utf16-2] # Bỏ qua 2 byte null terminator
-                                try:
-                                    text = text_bytes.decode('utf-16-le')
-                                    if re.search(r'[a-zA-Z0-9]', text) and len(text.strip()) > 3 and text not in processed_texts:
-                                        if not any(c in text for c in ['\x00', '\x01', '\x02', '\x03', '\x04', '\x05', '\x06', '\x07', '\x08', '\x0b', '\x0c', '\x0e', '\x0f']): # Loại bỏ các ký tự control không mong muốn
-                                            entries.append({
-                                                'id': entry_id,
-                                                'key': f'utf16_entry_{entry_id}',
-                                                'original_text': text.strip(),
-                                                'translated_text': text.strip(),
-                                                'language': self._detect_language(text),
-                                                'position': idx,
-                                                'length': byte_len_utf16
-                                            })
-                                            processed_texts.add(text)
-                                            entry_id += 1
-                                            # print(f"Found UTF-16: {text.strip()} at {idx}")
-                                            idx += 4 + byte_len_utf16 # Di chuyển con trỏ
-                                            continue
-                                except UnicodeDecodeError:
-                                    pass # Không phải UTF-16 hợp lệ
-
-            except struct.error:
-                # Không thể unpack 4 bytes, có thể đã đến cuối file hoặc dữ liệu không hợp lệ
-                pass
-            except Exception as e:
-                # print(f"Error parsing at {idx}: {e}")
-                pass # Bỏ qua lỗi và tiếp tục
-
-            idx += 1 # Di chuyển con trỏ một byte nếu không tìm thấy gì
-
+        entries = list(iter_text_entries(self.original_data, start, end))
         print(f"🎉 Phân tích binary hoàn tất! Tìm thấy {len(entries)} text entries.")
-        
-        # Lọc và sắp xếp lại nếu cần, hiện tại đã lọc trong vòng lặp
-        # Sắp xếp theo vị trí để đảm bảo thứ tự
-        entries.sort(key=lambda e: e['position'])
-        # Cập nhật lại ID sau khi sắp xếp
-        for i, entry in enumerate(entries):
-            entry['id'] = i
-            entry['key'] = f"{entry['key'].split('_')[0]}_entry_{i}" # Cập nhật key với id mới
-
         return entries
     
-    def _detect_language(self, text: str) -> str:
+    @staticmethod
+    def _detect_language(text: str) -> str:
         """Phát hiện ngôn ngữ của text"""
         text_lower = text.lower()
         words = text_lower.split()
@@ -253,14 +253,15 @@ class UAssetTextExtractor:
         try:
             if len(self.original_data) >= 0x24:  # Cần ít nhất 0x24 bytes
                 # Đọc 4 bytes tại offset 0x20 để lấy offset của vị trí lưu kích thước
-                self.size_offset_position = struct.unpack('<I', self.original_data[0x20:0x24])[0]
+                self.size_offset_position, original_file_size = read_size_info(self.original_data)
                 print(f"📍 Size offset position: {self.size_offset_position} (0x{self.size_offset_position:X})")
                 
-                if self.size_offset_position > 0 and self.size_offset_position < len(self.original_data):
-                    # Tính kích thước từ size_offset_position đến cuối file, trừ thêm 104
-                    self.original_file_size = len(self.original_data) - self.size_offset_position - 104
-                    print(f"📏 Original file size: {self.original_file_size} bytes (tính từ offset 0x{self.size_offset_position:X} đến cuối file, trừ 104)")
-                    print(f"📏 Công thức: {len(self.original_data)} - {self.size_offset_position} - 104 = {self.original_file_size}")
+                if original_file_size is not None:
+                    # Tính kích thước từ sau trường kích thước (size_offset_position + 12) đến cuối file, trừ thêm 104
+                    self.original_file_size = original_file_size
+                    data_start = self.size_offset_position + SIZE_FIELD_OFFSET + 4
+                    print(f"📏 Original file size: {self.original_file_size} bytes (tính từ offset 0x{data_start:X} đến cuối file, trừ 104)")
+                    print(f"📏 Công thức: {len(self.original_data)} - {data_start} - 104 = {self.original_file_size}")
                     return True
                 else:
                     print(f"⚠️ Size offset position không hợp lệ: {self.size_offset_position} (file size: {len(self.original_data)})")
@@ -270,39 +271,14 @@ class UAssetTextExtractor:
             self.size_offset_position = 0
         return False
     
-    def _insert_data_at_position(self, data: bytearray, position: int, new_data: bytes, old_length: int) -> tuple[bytearray, int]:
-        """Thay thế dữ liệu tại vị trí cụ thể với dynamic resizing
-        Returns: (updated_data, size_change)
-        """
-        try:
-            new_length = len(new_data)
-            size_change = new_length - old_length
-            
-            print(f"🔄 Thay thế tại 0x{position:X}: {old_length} -> {new_length} bytes (thay đổi: {size_change:+d})")
-            
-            # Bước 1: Xóa toàn bộ vùng cũ
-            del data[position:position + old_length]
-            print(f"🗑️ Đã xóa {old_length} bytes tại vị trí 0x{position:X}")
-            
-            # Bước 2: Chèn dữ liệu mới vào vị trí đó
-            data[position:position] = new_data
-            print(f"✏️ Đã chèn {new_length} bytes tại vị trí 0x{position:X}")
-            
-            return data, size_change
-            
-        except Exception as e:
-            print(f"❌ Lỗi khi thay thế dữ liệu: {e}")
-            import traceback
-            traceback.print_exc()
-            return data, 0
-    
     def _calculate_new_file_size(self, new_data: bytearray, size_offset_position: int = None) -> int:
         """Tính toán kích thước file mới từ size_offset_position đến cuối file, trừ thêm 104"""
         try:
             if size_offset_position is not None and size_offset_position > 0:
                 # Tính từ size_offset_position đến cuối file, trừ thêm 104
                 new_size = len(new_data) - size_offset_position - 104
-                print(f"📐 Tính toán kích thước mới từ offset 0x{size_offset_position:X}: {len(new_data)} - {size_offset_position} - 104 = {new_size}")
+                if self.verbose:
+                    print(f"📐 Tính toán kích thước mới từ offset 0x{size_offset_position:X}: {len(new_data)} - {size_offset_position} - 104 = {new_size}")
                 return new_size
             else:
                 # Fallback: tính theo cách cũ
@@ -327,92 +303,224 @@ class UAssetTextExtractor:
             print(f"❌ Lỗi khi tính toán kích thước mới: {e}")
             return len(new_data)
 
+    def load_uasset(self, file_path: str) -> bool:
+        """Đọc file .uasset gốc và thông tin kích thước để import, không phân tích lại text entries"""
+        try:
+            with open(file_path, 'rb') as f:
+                self.original_data = f.read()
+        except Exception as e:
+            print(f"❌ Lỗi khi đọc file: {e}")
+            return False
+        self._read_file_size_info()
+        return True
+    
+    def _encode_entry(self, entry: Dict) -> Optional[bytes]:
+        """Bản ghi mới (<i32 len><string + null>) của entry, None nếu giữ nguyên bản gốc"""
+        translated_text = entry['translated_text']
+        if entry['original_text'] == translated_text:
+            return None
+        
+        if entry['key'].startswith('utf8_entry'):
+            # <u32 len><string + 1>
+            new_bytes = translated_text.encode('utf-8') + b'\x00'
+            return struct.pack('<i', len(new_bytes)) + new_bytes
+        if entry['key'].startswith('utf16_entry'):
+            # <u32 len^0xFF><(string + 1)/2>, độ dài âm tính theo số ký tự UTF-16
+            new_bytes = translated_text.encode('utf-16-le') + b'\x00\x00'
+            return struct.pack('<i', -(len(new_bytes) // 2)) + new_bytes
+        return None
+    
+    def _size_field_position(self, json_data: Dict) -> int:
+        """Vị trí trường kích thước (size_offset_position + 8) trong file gốc, 0 nếu không có"""
+        size_offset_position = json_data.get('file_info', {}).get('size_offset_position', self.size_offset_position)
+        return size_offset_position + SIZE_FIELD_OFFSET if size_offset_position > 0 else 0
+    
+    def _offset_fields(self, json_data: Dict) -> Tuple[List[Dict], List[str]]:
+        """
+        Các trường offset tuyệt đối phải cập nhật khi text đổi độ dài
+        
+        Lấy từ package summary và export map nếu nhận dạng được; nếu không chỉ có con trỏ
+        size_offset_position tại 0x20. Trường kích thước (size_offset_position + 8) được tính riêng.
+        
+        Returns:
+            tuple: (các trường, ghi chú về phần không nhận dạng được)
+        """
+        fields, reason = parse_package_offsets(self.original_data)
+        notes = []
+        if reason:
+            notes.append(f"Không đọc được package summary ({reason}), chỉ cập nhật size_offset_position và trường kích thước")
+            if len(self.original_data) >= 0x24:
+                pointer = struct.unpack_from('<I', self.original_data, 0x20)[0]
+                if 0 < pointer < len(self.original_data):
+                    fields.append({'name': 'size_offset_position', 'position': 0x20, 'format': '<I',
+                                   'value': pointer, 'kind': 'offset', 'base': 0})
+        
+        size_position = self._size_field_position(json_data)
+        if size_position:
+            # Trường kích thước luôn được ghi theo công thức, bỏ trường summary trùng chỗ để không ghi đè lẫn nhau
+            overlapping = [f for f in fields
+                           if f['position'] < size_position + 4 and size_position < f['position'] + struct.calcsize(f['format'])]
+            for field in overlapping:
+                notes.append(f"{field['name']} tại 0x{field['position']:X} trùng trường kích thước, không cập nhật")
+            fields = [f for f in fields if f not in overlapping]
+        return fields, notes
+    
+    def build_uasset_data(self, json_data: Dict) -> tuple[bytearray, List[Dict]]:
+        """
+        Ghép dữ liệu .uasset mới trong một lượt duyệt theo position
+        
+        Mỗi entry đã dịch thay cho bản ghi gốc (4 byte độ dài + length byte text), các đoạn còn lại
+        giữ nguyên; không chèn/xóa giữa bytearray nên thời gian chỉ tỉ lệ với kích thước file.
+        Sau đó các offset tuyệt đối (summary, export map, size field) được dời theo bảng delta;
+        offset không xác định được ghi vào self.relocation_notes.
+        
+        Returns:
+            tuple: (dữ liệu mới, danh sách entries đã thay kèm size_change)
+        """
+        original = memoryview(self.original_data)
+        chunks = []
+        cursor = 0
+        processed_entries = []
+        
+        for entry in sorted(json_data.get('text_entries', []), key=lambda x: x['position']):
+            record = self._encode_entry(entry)
+            if record is None:
+                continue
+            
+            position = entry['position']
+            old_record_length = 4 + entry['length']  # length đã bao gồm cả null terminator
+            chunks.append(original[cursor:position])
+            chunks.append(record)
+            cursor = position + old_record_length
+            
+            size_change = len(record) - old_record_length
+            if self.verbose:
+                print(f"🔄 Thay thế tại 0x{position:X}: '{entry['original_text']}' -> '{entry['translated_text']}' "
+                      f"({size_change:+d} bytes)")
+            processed_entries.append({
+                'position': position,
+                'old_length': old_record_length,
+                'old_text': entry['original_text'],
+                'new_text': entry['translated_text'],
+                'size_change': size_change
+            })
+        chunks.append(original[cursor:])
+        new_data = bytearray(b''.join(chunks))
+        
+        # Dời các offset tuyệt đối theo bảng delta
+        table = DeltaTable(processed_entries)
+        fields, self.relocation_notes = self._offset_fields(json_data)
+        relocated, unclassified = relocate_offsets(self.original_data, new_data, fields, table)
+        self.relocation_notes += unclassified
+        if self.verbose:
+            print(f"🧭 Đã cập nhật {relocated}/{len(fields)} trường offset")
+        
+        # Cập nhật kích thước file mới tại vị trí đã dời của trường kích thước
+        size_position = self._size_field_position(json_data)
+        actual_size_position = table.map(size_position) if size_position else 0
+        if actual_size_position is None:
+            self.relocation_notes.append(f"Trường kích thước tại 0x{size_position:X} nằm trong text đã thay, không cập nhật")
+        elif actual_size_position:
+            if actual_size_position + 4 <= len(new_data):
+                # Kích thước tính từ ngay sau trường kích thước
+                new_file_size = self._calculate_new_file_size(new_data, actual_size_position + 4)
+                new_data[actual_size_position:actual_size_position+4] = struct.pack('<I', new_file_size)
+                if self.verbose:
+                    print(f"📝 Đã cập nhật kích thước file tại offset 0x{actual_size_position:X}: {new_file_size}")
+            else:
+                print(f"⚠️ Vị trí ghi kích thước không hợp lệ: 0x{actual_size_position:X} vượt quá kích thước file")
+        
+        return new_data, processed_entries
+    
+    def verify_uasset(self, new_data: bytes, json_data: Dict) -> List[str]:
+        """
+        Kiểm tra dữ liệu đã rebuild: mọi entry nằm đúng vị trí mới với đúng độ dài/text,
+        phần còn lại khớp file gốc, các offset đã dời đúng và trường kích thước đúng
+        
+        Returns:
+            List: các lỗi tìm thấy (rỗng nếu hợp lệ)
+        """
+        errors = []
+        original = memoryview(self.original_data)
+        entries = sorted(json_data.get('text_entries', []), key=lambda x: x['position'])
+        records = []
+        edits = []
+        for entry in entries:
+            old_record_length = 4 + entry['length']
+            record = self._encode_entry(entry)
+            if record is not None:
+                edits.append({'position': entry['position'], 'old_length': old_record_length,
+                              'size_change': len(record) - old_record_length})
+            records.append(record or bytes(original[entry['position']:entry['position'] + old_record_length]))
+        table = DeltaTable(edits)
+        
+        # Trường offset và trường kích thước được ghi lại, không so với bản gốc mà kiểm tra giá trị riêng
+        fields, _ = self._offset_fields(json_data)
+        size_position = self._size_field_position(json_data)
+        skipped = sorted([(f['position'], f['position'] + struct.calcsize(f['format'])) for f in fields] +
+                         ([(size_position, size_position + 4)] if size_position else []))
+        skip_index = 0
+        
+        def gap_changed(start: int, end: int, shift: int) -> bool:
+            nonlocal skip_index
+            while skip_index < len(skipped) and skipped[skip_index][1] <= start:
+                skip_index += 1
+            ranges = []
+            index = skip_index
+            while index < len(skipped) and skipped[index][0] < end:
+                ranges.append((start, max(start, skipped[index][0])))
+                start = max(start, skipped[index][1])
+                index += 1
+            ranges.append((start, end))
+            return any(new_data[a + shift:b + shift] != original[a:b] for a, b in ranges if a < b)
+        
+        shift = 0
+        cursor = 0
+        for entry, record in zip(entries, records):
+            position = entry['position']
+            old_record_length = 4 + entry['length']
+            
+            if gap_changed(cursor, position, shift):
+                errors.append(f"Dữ liệu giữa 0x{cursor:X} và 0x{position:X} bị thay đổi")
+            if new_data[position + shift:position + shift + len(record)] != record:
+                errors.append(f"Entry {entry.get('id')} tại 0x{position:X} (mới: 0x{position + shift:X}) không khớp")
+            
+            shift += len(record) - old_record_length
+            cursor = position + old_record_length
+        if gap_changed(cursor, len(self.original_data), shift):
+            errors.append(f"Dữ liệu sau 0x{cursor:X} bị thay đổi")
+        
+        if len(new_data) != len(self.original_data) + shift:
+            errors.append(f"Kích thước file {len(new_data)} khác dự kiến {len(self.original_data) + shift}")
+        
+        for field in fields:
+            position = table.map(field['position'])
+            expected = relocated_value(field, table, len(self.original_data)) if field['value'] > 0 else field['value']
+            if position is None or expected is None:
+                continue  # Đã báo trong relocation_notes khi build
+            stored = struct.unpack_from(field['format'], new_data, position)[0]
+            if stored != expected:
+                errors.append(f"{field['name']} tại 0x{position:X} = 0x{stored:X}, dự kiến 0x{expected:X}")
+        
+        actual_size_position = table.map(size_position) if size_position else 0
+        if actual_size_position and actual_size_position + 4 <= len(new_data):
+            stored = struct.unpack('<I', bytes(new_data[actual_size_position:actual_size_position + 4]))[0]
+            expected = expected_size_field(len(new_data), actual_size_position)
+            if stored != expected:
+                errors.append(f"Trường kích thước tại 0x{actual_size_position:X} = {stored}, dự kiến {expected}")
+        
+        return errors
+    
     def rebuild_uasset(self, json_data: Dict, output_file: str):
         """Tái tạo file .uasset với text đã chỉnh sửa, cập nhật đúng len và size tổng cho UTF-8/UTF-16 với dynamic resizing"""
         try:
-            # Bắt đầu với dữ liệu gốc
-            new_data = bytearray(self.original_data)
-            
-            # Lấy thông tin kích thước từ JSON nếu có
-            file_info = json_data.get('file_info', {})
-            original_file_size = file_info.get('original_file_size', self.original_file_size)
-            size_offset_position = file_info.get('size_offset_position', self.size_offset_position)
-            
-            # Theo dõi tổng thay đổi kích thước để cập nhật các offset sau
-            total_size_change = 0
-            processed_entries = []
-            
-            # Sắp xếp entries theo position để xử lý từ cuối lên đầu (tránh ảnh hưởng offset)
-            sorted_entries = sorted(json_data.get('text_entries', []), key=lambda x: x['position'], reverse=True)
-            
-            for entry in sorted_entries:
-                original_text = entry['original_text']
-                translated_text = entry['translated_text']
-                position = entry['position']
-                length = entry['length']
-                key = entry['key']
-                
-                if original_text == translated_text:
-                    continue
-                    
-                print(f"\n🔄 Xử lý entry tại 0x{position:X}: '{original_text}' -> '{translated_text}'")
-                
-                if key.startswith('utf8_entry'):
-                    # <u32 len><string + 1>
-                    new_bytes = translated_text.encode('utf-8') + b'\x00'
-                    new_len = len(new_bytes)
-                    # length đã bao gồm cả null terminator, vậy old_text_length = length
-                    old_text_length = length
-                    
-                    # Cập nhật length field
-                    new_data[position:position+4] = struct.pack('<i', new_len)
-                    
-                    # Sử dụng dynamic resizing cho text data
-                    new_data, size_change = self._insert_data_at_position(
-                        new_data, position + 4, new_bytes, old_text_length
-                    )
-                    total_size_change += size_change
-                    
-                elif key.startswith('utf16_entry'):
-                    # <u32 len^0xFF><(string + 1)/2>
-                    new_bytes = translated_text.encode('utf-16-le') + b'\x00\x00'
-                    new_len = len(new_bytes) // 2
-                    # length đã bao gồm cả null terminator, vậy old_text_length = length
-                    old_text_length = length
-                    
-                    # Cập nhật length field (âm, little-endian)
-                    new_data[position:position+4] = struct.pack('<i', -new_len)
-                    
-                    # Sử dụng dynamic resizing cho text data
-                    new_data, size_change = self._insert_data_at_position(
-                        new_data, position + 4, new_bytes, old_text_length
-                    )
-                    total_size_change += size_change
-                
-                processed_entries.append({
-                    'position': position,
-                    'old_text': original_text,
-                    'new_text': translated_text,
-                    'size_change': size_change if 'size_change' in locals() else 0
-                })
+            new_data, processed_entries = self.build_uasset_data(json_data)
+            total_size_change = len(new_data) - len(self.original_data)
             
             print(f"\n📊 Tổng kết thay đổi kích thước: {total_size_change} bytes")
             print(f"📏 Kích thước file: {len(self.original_data)} -> {len(new_data)} bytes")
-            
-            # Cập nhật kích thước file mới với dynamic sizing
-            if size_offset_position > 0:
-                # Tính vị trí thực tế để ghi kích thước (offset + 8)
-                actual_size_position = size_offset_position + 8
-                if actual_size_position + 4 <= len(new_data):
-                    # Tính vị trí bắt đầu tính toán kích thước (actual_size_position + 4)
-                    start_calc_position = actual_size_position + 4
-                    new_file_size = self._calculate_new_file_size(new_data, start_calc_position)
-                    new_data[actual_size_position:actual_size_position+4] = struct.pack('<I', new_file_size)
-                    print(f"📝 Đã cập nhật kích thước file tại offset 0x{actual_size_position:X} (0x{size_offset_position:X} + 8): {original_file_size} -> {new_file_size}")
-                    print(f"📏 Tính kích thước từ vị trí: 0x{start_calc_position:X}")
-                    print(f"🔄 Thay đổi tổng cộng: {total_size_change} bytes")
-                else:
-                    print(f"⚠️ Vị trí ghi kích thước không hợp lệ: 0x{actual_size_position:X} vượt quá kích thước file")
+            for note in self.relocation_notes:
+                print(f"⚠️ {note}")
             
             # Ghi file output với kích thước mới
             with open(output_file, 'wb') as f:
@@ -434,8 +542,158 @@ class UAssetTextExtractor:
             import traceback
             traceback.print_exc()
 
-def batch_extract_all():
-    """Trích xuất tất cả file .uasset trong folder hiện tại và folder 'original' ra folder 'extract'"""
+def iter_text_entries(data, start: int = 0, end: int = None) -> Iterator[Dict]:
+    """
+    Quét dữ liệu .uasset và trả về lần lượt từng text entry ngay khi tìm thấy
+    
+    Không giữ trạng thái ngoài generator nên gọi song song được (mỗi lời gọi một bộ lọc trùng lặp riêng);
+    entry ra theo thứ tự position với id/key giống extract_texts. Dừng sớm bằng break hoặc next().
+    
+    Args:
+        data: bytes, bytearray hoặc mmap của file
+        start, end: Vùng quét [start, end), entry phải nằm trọn trong vùng
+    """
+    entry_id = 0
+    processed_texts = set() # Để tránh trùng lặp
+    original_binary_data = data
+    data_len = len(original_binary_data) if end is None else end
+    skip_to = start
+
+    # Chỉ thử tại các vị trí có 4 byte độ dài hợp lệ (chỗ khác vòng quét cũ cũng chỉ bước qua), cần ít nhất 4 byte
+    for match in TEXT_LENGTH_PREFIX.finditer(original_binary_data, start, max(start, data_len - 1)):
+        idx = match.start()
+        if idx < skip_to:
+            continue # Nằm trong entry vừa đọc
+        try:
+            # Thử đọc UTF-8 string: <u32 len><string + 1>
+            # Độ dài được lưu là little-endian integer
+            str_len = struct.unpack('<i', original_binary_data[idx:idx+4])[0]
+            
+            # Kiểm tra độ dài hợp lệ và có null terminator
+            # Độ dài của chuỗi text thực tế (không bao gồm null terminator)
+            actual_str_len = str_len -1
+
+            if 0 < actual_str_len < 200: # Giới hạn độ dài hợp lý, tránh đọc sai dữ liệu
+                if idx + 4 + str_len <= data_len:
+                    # Kiểm tra null terminator cho UTF-8
+                    if original_binary_data[idx + 4 + actual_str_len] == 0:
+                        text_bytes = original_binary_data[idx+4 : idx+4+actual_str_len]
+                        text = text_bytes.decode('utf-8')
+                        # Lọc các chuỗi không phải text (ví dụ: toàn ký tự đặc biệt, hoặc quá ngắn)
+                        if re.search(r'[a-zA-Z0-9]', text) and len(text.strip()) > 3 and text not in processed_texts:
+                            if not any(c in text for c in ['\x00', '\x01', '\x02', '\x03', '\x04', '\x05', '\x06', '\x07', '\x08', '\x0b', '\x0c', '\x0e', '\x0f']): # Loại bỏ các ký tự control không mong muốn
+                                entry = {
+                                    'id': entry_id,
+                                    'key': f'utf8_entry_{entry_id}',
+                                    'original_text': text.strip(),
+                                    'translated_text': text.strip(),
+                                    'language': UAssetTextExtractor._detect_language(text),
+                                    'position': idx,
+                                    'length': str_len
+                                }
+                                processed_texts.add(text)
+                                entry_id += 1
+                                skip_to = idx + 4 + str_len # Di chuyển con trỏ qua độ dài + chuỗi + null terminator
+                                yield entry
+                                continue
+            
+            # Thử đọc UTF-16 string: <u32 len^0xFF><(string + 1)/2>
+            # Độ dài được lưu là little-endian integer, XOR với 0xFFFFFFFF (hoặc -len nếu là số âm)
+            # Unreal Engine lưu độ dài âm cho UTF-16
+            str_len_utf16_encoded = struct.unpack('<i', original_binary_data[idx:idx+4])[0]
+            
+            if str_len_utf16_encoded < 0: # Độ dài âm là dấu hiệu của UTF-16
+                actual_num_chars = -str_len_utf16_encoded
+                byte_len_utf16 = actual_num_chars * 2 # Mỗi ký tự UTF-16 là 2 bytes
+
+                if 0 < actual_num_chars < 200: # Giới hạn độ dài hợp lý
+                    if idx + 4 + byte_len_utf16 <= data_len:
+                         # Kiểm tra null terminator cho UTF-16 (2 bytes 00 00)
+                        if original_binary_data[idx + 4 + byte_len_utf16 - 2 : idx + 4 + byte_len_utf16] == b'\x00\x00':
+                            text_bytes = original_binary_data[idx+4 : idx+4+byte_len_utf16-2] # Bỏ qua 2 byte null terminator
+                            text = text_bytes.decode('utf-16-le')
+                            if re.search(r'[a-zA-Z0-9]', text) and len(text.strip()) > 3 and text not in processed_texts:
+                                if not any(c in text for c in ['\x00', '\x01', '\x02', '\x03', '\x04', '\x05', '\x06', '\x07', '\x08', '\x0b', '\x0c', '\x0e', '\x0f']): # Loại bỏ các ký tự control không mong muốn
+                                    entry = {
+                                        'id': entry_id,
+                                        'key': f'utf16_entry_{entry_id}',
+                                        'original_text': text.strip(),
+                                        'translated_text': text.strip(),
+                                        'language': UAssetTextExtractor._detect_language(text),
+                                        'position': idx,
+                                        'length': byte_len_utf16
+                                    }
+                                    processed_texts.add(text)
+                                    entry_id += 1
+                                    skip_to = idx + 4 + byte_len_utf16 # Di chuyển con trỏ
+                                    yield entry
+                                    continue
+
+        except (struct.error, UnicodeDecodeError, IndexError):
+            # Không đọc được 4 byte độ dài (cuối dữ liệu), chuỗi không decode được hoặc vượt quá dữ liệu: bỏ qua vị trí này
+            pass
+
+class UAssetHandle:
+    """
+    File .uasset mở chỉ đọc qua mmap cùng thông tin header, không giữ trạng thái quét
+    
+    Nhiều thread có thể quét cùng một handle (hoặc mỗi thread một handle) mà không ảnh hưởng nhau:
+    
+        with UAssetHandle('GDSMenuText.uasset') as asset:
+            first = next((e for e in asset.iter_text_entries() if 'Quest' in e['original_text']), None)
+    """
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self.size = os.fstat(self._file.fileno()).st_size
+            # File rỗng không mmap được
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b''
+        except Exception:
+            self._file.close()
+            raise
+        self.size_offset_position, self.original_file_size = read_size_info(self.data)
+    
+    def scan_window(self, start: int = None, end: int = None, full_scan: bool = False) -> Tuple[int, int]:
+        """Vùng quét [start, end): mặc định từ size_offset_position (nếu hợp lệ) đến cuối file"""
+        if start is None:
+            start = self.size_offset_position if not full_scan and self.original_file_size is not None else 0
+        return max(start, 0), self.size if end is None else min(end, self.size)
+    
+    def iter_text_entries(self, start: int = None, end: int = None, full_scan: bool = False) -> Iterator[Dict]:
+        """Trả về lần lượt các text entry trong vùng quét (xem iter_text_entries)"""
+        return iter_text_entries(self.data, *self.scan_window(start, end, full_scan))
+    
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self._file.close()
+    
+    def __enter__(self) -> 'UAssetHandle':
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+
+def find_uasset_files(folder: str = '.') -> List[str]:
+    """Các file .uasset trong folder và trong folder con 'original' (nếu có)"""
+    uasset_files = [os.path.join(folder, f) if folder != '.' else f
+                    for f in os.listdir(folder) if f.endswith('.uasset')]
+    
+    original_folder = os.path.join(folder, "original") if folder != '.' else "original"
+    if os.path.exists(original_folder):
+        original_files = [os.path.join(original_folder, f) for f in os.listdir(original_folder) if f.endswith('.uasset')]
+        uasset_files.extend(original_files)
+        print(f"📁 Tìm thấy thêm {len(original_files)} file trong folder original")
+    return uasset_files
+
+def batch_extract_all(scan_start: int = None, scan_end: int = None, full_scan: bool = False, index_path: str = None):
+    """
+    Trích xuất tất cả file .uasset trong folder hiện tại và folder 'original' ra folder 'extract'
+    
+    Nếu có index_path (chỉ mục của action survey), chỉ trích xuất các file trong chỉ mục có text.
+    """
     import time
     
     extractor = UAssetTextExtractor()
@@ -446,15 +704,14 @@ def batch_extract_all():
         os.makedirs(extract_folder)
         print(f"📁 Đã tạo folder: {extract_folder}")
     
-    # Tìm tất cả file .uasset trong folder hiện tại
-    uasset_files = [f for f in os.listdir('.') if f.endswith('.uasset')]
-    
-    # Tìm thêm file .uasset trong folder "original" nếu có
-    original_folder = "original"
-    if os.path.exists(original_folder):
-        original_files = [os.path.join(original_folder, f) for f in os.listdir(original_folder) if f.endswith('.uasset')]
-        uasset_files.extend(original_files)
-        print(f"📁 Tìm thấy thêm {len(original_files)} file trong folder original")
+    # Tìm tất cả file .uasset trong folder hiện tại và folder "original"
+    if index_path:
+        from asset_survey import AssetIndex
+        index = AssetIndex(index_path)
+        uasset_files = [path for path in index.text_assets() if os.path.exists(path)]
+        index.close()
+    else:
+        uasset_files = find_uasset_files()
     
     if not uasset_files:
         print("❌ Không tìm thấy file .uasset nào trong folder hiện tại và folder original")
@@ -478,7 +735,7 @@ def batch_extract_all():
             print(f"\n📁 [{i}/{len(uasset_files)}] Đang xử lý: {uasset_file}")
             
             # Trích xuất text
-            extracted_data = extractor.extract_texts(uasset_file)
+            extracted_data = extractor.extract_texts(uasset_file, scan_start, scan_end, full_scan)
             
             if extracted_data and extracted_data.get('text_entries'):
                 # Tạo tên file JSON trong folder extract
@@ -524,9 +781,9 @@ def batch_extract_all():
         failed_count = len(uasset_files) - success_count
         print(f"  ⚠️  {failed_count} file không thể xử lý - kiểm tra log ở trên để biết chi tiết")
 
-def batch_import_all():
+def batch_import_all(verbose: bool = False):
     """Import tất cả file JSON từ folder 'extract' và tạo file .uasset mới trong folder 'import'"""
-    extractor = UAssetTextExtractor()
+    extractor = UAssetTextExtractor(verbose=verbose)
     
     extract_folder = "extract"
     import_folder = "import"
@@ -573,8 +830,9 @@ def batch_import_all():
                 print(f"  ❌ Không tìm thấy file .uasset gốc cho {json_file}")
                 continue
             
-            # Đọc lại file gốc
-            extractor.extract_texts(original_uasset)
+            # Đọc lại file gốc (chỉ cần bytes và thông tin kích thước, không phân tích lại)
+            if not extractor.load_uasset(original_uasset):
+                continue
             
             # Tạo tên file .uasset mới trong folder import
             original_filename = os.path.basename(original_uasset)
@@ -595,22 +853,57 @@ def batch_import_all():
 
 def main():
     parser = argparse.ArgumentParser(description='UAsset Text Extractor and Importer')
-    parser.add_argument('action', choices=['extract', 'import', 'batch-extract', 'batch-import'], 
-                       help='Hành động: extract, import, batch-extract, batch-import')
-    parser.add_argument('input_file', nargs='?', help='File đầu vào (.uasset hoặc .json) - không cần cho batch operations')
+    parser.add_argument('action', choices=['extract', 'import', 'batch-extract', 'batch-import', 'survey'], 
+                       help='Hành động: extract, import, batch-extract, batch-import, survey')
+    parser.add_argument('input_file', nargs='?', help='File đầu vào (.uasset hoặc .json) - không cần cho batch operations; '
+                                                      'với survey là thư mục hoặc file danh sách (mặc định: .)')
     parser.add_argument('-o', '--output', help='File đầu ra')
+    parser.add_argument('-v', '--verbose', action='store_true', help='In chi tiết từng entry khi import')
+    parser.add_argument('--scan-start', type=parse_offset,
+                        help='Offset bắt đầu quét text khi extract (số hoặc hex, mặc định tự dò từ size_offset_position)')
+    parser.add_argument('--scan-end', type=parse_offset, help='Offset kết thúc quét text (mặc định cuối file)')
+    parser.add_argument('--full-scan', action='store_true',
+                        help=f'Quét cả file, bỏ qua tự dò và {SCAN_PROFILE_FILE}')
+    parser.add_argument('--index', help='File chỉ mục SQLite: survey ghi vào (mặc định asset_index.sqlite), '
+                                        'batch-extract chỉ trích xuất file có text trong chỉ mục')
+    parser.add_argument('--workers', type=int, default=16, help='Số thread đọc file khi survey (mặc định: 16)')
+    parser.add_argument('--root', help='Thư mục gốc cho đường dẫn tương đối trong file danh sách (survey)')
+    parser.add_argument('--force', action='store_true', help='Survey lại cả file không đổi')
+    parser.add_argument('--list', action='store_true', help='Sau survey in đường dẫn các file có text')
     
     args = parser.parse_args()
     
-    extractor = UAssetTextExtractor()
+    extractor = UAssetTextExtractor(verbose=args.verbose)
     
     if args.action == 'batch-extract':
         # Trích xuất tất cả file .uasset trong folder hiện tại
-        batch_extract_all()
+        batch_extract_all(args.scan_start, args.scan_end, args.full_scan, args.index)
+    
+    elif args.action == 'survey':
+        # Import muộn: asset_survey dùng lại iter_text_entries của module này
+        from asset_survey import INDEX_FILE, AssetIndex, survey
+        source = args.input_file or '.'
+        if not os.path.exists(source):
+            print(f"❌ Không tìm thấy: {source}")
+            return
+        index_path = args.index or INDEX_FILE
+        result = survey(source, index_path, workers=args.workers, root=args.root, force=args.force)
+        print(f"🔎 Đã survey {result['files']} file trong {result['seconds']:.2f}s "
+              f"(đọc mới: {result['surveyed']}, không đổi: {result['reused']})")
+        if result['missing']:
+            print(f"⚠️ {result['missing']} file trong danh sách không tìm thấy")
+        for record in result['errors'][:10]:
+            print(f"❌ {record['path']}: {record['error']}")
+        print(f"📝 File có text trong chỉ mục: {result['with_text']} -> {index_path}")
+        if args.list:
+            index = AssetIndex(index_path)
+            for path in index.text_assets():
+                print(path)
+            index.close()
         
     elif args.action == 'batch-import':
         # Import tất cả file từ folder extract
-        batch_import_all()
+        batch_import_all(verbose=args.verbose)
         
     elif args.action == 'extract':
         # Trích xuất text từ .uasset
@@ -625,7 +918,7 @@ def main():
         output_file = args.output or args.input_file.replace('.uasset', '_texts.json')
         
         print(f"Đang trích xuất text từ: {args.input_file}")
-        extracted_data = extractor.extract_texts(args.input_file)
+        extracted_data = extractor.extract_texts(args.input_file, args.scan_start, args.scan_end, args.full_scan)
         
         if extracted_data:
             extractor.export_to_json(extracted_data, output_file)
@@ -653,8 +946,9 @@ def main():
             print("Không tìm thấy file .uasset gốc")
             return
         
-        # Đọc lại file gốc
-        extractor.extract_texts(original_uasset)
+        # Đọc lại file gốc (chỉ cần bytes và thông tin kích thước, không phân tích lại)
+        if not extractor.load_uasset(original_uasset):
+            return
         
         output_file = args.output or original_uasset.replace('.uasset', '_translated.uasset')
         